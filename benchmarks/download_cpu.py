@@ -0,0 +1,126 @@
+"""
+CPU cost of serving local downloads through gunicorn: generator streaming vs. wsgi.file_wrapper, with and without
+sendfile. A file is ingested into a throwaway local backend, then downloaded in full and in large ranges with curl, while
+the CPU time of the (single) gunicorn worker is measured.
+
+Requires gunicorn and curl; Linux only (CPU times are read from /proc.) Run from the repository root:
+
+    python benchmarks/download_cpu.py [--size-mb 512] [--repeat 4]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+PORT = 5055
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+# WSGI entrypoints, written to the scratch directory: one hides wsgi.file_wrapper, forcing the generator path
+NO_FILE_WRAPPER_APP = """
+from chord_drs.app import application as _application
+
+
+def application(environ, start_response):
+    environ = {k: v for k, v in environ.items() if k != "wsgi.file_wrapper"}
+    return _application(environ, start_response)
+"""
+FILE_WRAPPER_APP = "from chord_drs.app import application\n"
+
+
+def cpu_seconds(pid: int) -> float:
+    # utime + stime, fields 14 and 15 of /proc/<pid>/stat (counted after the parenthesized command name)
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def wait_for_server(url: str) -> None:
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+def curl(url: str, *args: str) -> None:
+    subprocess.run(["curl", "-sf", "-o", os.devnull, *args, url], check=True)
+
+
+def run(label: str, module: str, gunicorn_args: list[str], scratch: Path, env: dict, object_id: str, args) -> None:
+    size = args.size_mb << 20
+    proc = subprocess.Popen(
+        [
+            *(sys.executable, "-m", "gunicorn", f"{module}:application"),
+            *("-w", "1", "--threads", "4", "-b", f"127.0.0.1:{PORT}"),
+            *("--chdir", str(scratch), "--pythonpath", os.getcwd()),
+            *gunicorn_args,
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"{BASE_URL}/objects/{object_id}/download"
+        wait_for_server(f"{BASE_URL}/service-info")
+        worker = int(Path(f"/proc/{proc.pid}/task/{proc.pid}/children").read_text().split()[0])
+
+        cpu_start, wall_start = cpu_seconds(worker), time.perf_counter()
+        for _ in range(args.repeat):
+            curl(url)
+            curl(url, "-H", f"Range: bytes=1000-{size // 2}")
+        cpu, wall = cpu_seconds(worker) - cpu_start, time.perf_counter() - wall_start
+
+        gb = args.repeat * (size + size // 2 - 999) / (1 << 30)
+        print(f"{label:30s} cpu/GB: {cpu / gb:6.3f} s   wall/GB: {wall / gb:6.3f} s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512, help="Size of the downloaded file, in MiB.")
+    parser.add_argument("--repeat", type=int, default=4, help="Number of full and of ranged downloads per setup.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = Path(tmp)
+        (scratch / "data").mkdir()
+        (scratch / "no_file_wrapper.py").write_text(NO_FILE_WRAPPER_APP)
+        (scratch / "file_wrapper.py").write_text(FILE_WRAPPER_APP)
+
+        src = scratch / "object.bin"
+        with open(src, "wb") as fh:
+            fh.writelines(os.urandom(1 << 20) for _ in range(args.size_mb))
+
+        env = {
+            **os.environ,
+            "DATA": str(scratch / "data"),
+            "DATABASE": str(scratch),
+            "AUTHZ_ENABLED": "false",
+            "SERVICE_BASE_URL": BASE_URL,
+        }
+        os.environ.update(env)
+
+        # Set up the database and ingest the file in this process, before any server is started
+        from flask_migrate import upgrade
+
+        from chord_drs.app import application
+
+        with application.app_context():
+            upgrade()
+        object_id = application.test_client().post("/ingest", data={"path": str(src)}).get_json()["id"]
+
+        run("generator (no file_wrapper)", "no_file_wrapper", [], scratch, env, object_id, args)
+        run("file_wrapper, --no-sendfile", "file_wrapper", ["--no-sendfile"], scratch, env, object_id, args)
+        run("file_wrapper + sendfile", "file_wrapper", [], scratch, env, object_id, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Throughput of hashing a file (drs_file_checksums, as used during ingests) with read buffers of different sizes, with
+SHA-256 alone and with an extra MD5 checksum. Each figure is the best of three runs, with the file in the page cache.
+
+Run from the repository root:
+
+    python benchmarks/hash_chunk_size.py [--size-mb 512]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from chord_drs.utils import drs_file_checksums
+
+CHUNK_SIZES = (16 << 10, 64 << 10, 128 << 10, 256 << 10, 1 << 20, 4 << 20)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512, help="Size of the hashed file, in MiB.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "object.bin")
+        with open(path, "wb") as fh:
+            fh.writelines(os.urandom(1 << 20) for _ in range(args.size_mb))
+
+        drs_file_checksums(path)  # warm the page cache
+
+        for algorithms in ((), ("md5",)):
+            for cs in CHUNK_SIZES:
+                best = float("inf")
+                for _ in range(3):
+                    start = time.perf_counter()
+                    drs_file_checksums(path, algorithms, chunk_size=cs)
+                    best = min(best, time.perf_counter() - start)
+                label = "+".join(("sha-256", *algorithms))
+                print(f"{label:12s} chunk={cs >> 10:5d} KiB {args.size_mb / best:7.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Throughput of a single S3 download with and without parallel read-ahead (S3_DOWNLOAD_CONCURRENCY and
+S3_DOWNLOAD_PART_SIZE.) Reads go through a proxy in front of moto_server which limits each TCP connection to --rate
+bytes/s and adds --latency seconds before each response, emulating the per-connection bandwidth cap of a distant object
+store. Without it, moto serves from memory and read-ahead only adds overhead.
+
+Requires moto[server]. Run from the repository root:
+
+    python benchmarks/s3_readahead.py [--size-mb 64] [--rate-mb 25] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from s3_server import BUCKET, moto_server, s3_backend_config
+
+from chord_drs.backends.s3 import S3Backend, close_s3_clients
+
+MOTO_PORT = 5099
+PROXY_PORT = 5100
+
+# (S3_DOWNLOAD_CONCURRENCY, S3_DOWNLOAD_PART_SIZE) pairs to compare; concurrency 1 is a single GET
+CONFIGURATIONS = (
+    (1, 8 << 20),
+    (2, 8 << 20),
+    (4, 8 << 20),
+    (8, 4 << 20),
+    (8, 8 << 20),
+)
+
+
+async def _forward_requests(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request_sent: asyncio.Event
+) -> None:
+    try:
+        while data := await reader.read(256 * 1024):
+            request_sent.set()
+            writer.write(data)
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _forward_responses(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    request_sent: asyncio.Event,
+    rate: float,
+    latency: float,
+) -> None:
+    try:
+        while data := await reader.read(256 * 1024):
+            delay = len(data) / rate
+            if request_sent.is_set():  # first bytes of a response
+                request_sent.clear()
+                delay += latency
+            await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+def start_throttling_proxy(upstream_port: int, port: int, rate: float, latency: float) -> None:
+    """
+    Starts a TCP proxy to upstream_port in a daemon thread, throttling responses (upstream to client) on each connection.
+    """
+
+    async def handle(client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", upstream_port)
+        request_sent = asyncio.Event()
+        await asyncio.gather(
+            _forward_requests(client_reader, upstream_writer, request_sent),
+            _forward_responses(upstream_reader, client_writer, request_sent, rate, latency),
+            return_exceptions=True,
+        )
+
+    async def serve() -> None:
+        async with await asyncio.start_server(handle, "127.0.0.1", port) as server:
+            await server.serve_forever()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64, help="Size of the downloaded object, in MiB.")
+    parser.add_argument("--rate-mb", type=float, default=25, help="Bandwidth of each connection, in MiB/s.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Delay before each response, in seconds.")
+    args = parser.parse_args()
+
+    size = args.size_mb << 20
+    logger = logging.getLogger("benchmark")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with moto_server(MOTO_PORT) as endpoint:
+        start_throttling_proxy(MOTO_PORT, PROXY_PORT, args.rate_mb * (1 << 20), args.latency)
+        try:
+            backend = S3Backend(s3_backend_config(endpoint), logger)
+            asyncio.run(backend._init_bucket_if_required())
+            backend.get_sync_s3_client().put_object(Bucket=BUCKET, Key="object", Body=os.urandom(size))
+
+            for concurrency, part_size in CONFIGURATIONS:
+                backend = S3Backend(
+                    s3_backend_config(
+                        f"127.0.0.1:{PROXY_PORT}",
+                        S3_DOWNLOAD_CONCURRENCY=concurrency,
+                        S3_DOWNLOAD_PART_SIZE=part_size,
+                    ),
+                    logger,
+                )
+                start = time.perf_counter()
+                n = sum(len(c) for c in asyncio.run(backend.get_stream_generator(f"s3://{BUCKET}/object", size=size)))
+                elapsed = time.perf_counter() - start
+                assert n == size
+                print(
+                    f"concurrency={concurrency} part={part_size >> 20:2d} MiB: {size / elapsed / (1 << 20):7.1f} MiB/s"
+                )
+        finally:
+            close_s3_clients()
+
+
+if __name__ == "__main__":
+    main()
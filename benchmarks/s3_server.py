@@ -0,0 +1,57 @@
+import shutil
+import subprocess
+import time
+import urllib.request
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+__all__ = [
+    "BUCKET",
+    "moto_server",
+    "s3_backend_config",
+]
+
+BUCKET = "bench"
+
+
+@contextmanager
+def moto_server(port: int) -> Iterator[str]:
+    """
+    Runs moto_server (from moto[server]) on a local port for the duration of the block, yielding its host:port.
+    """
+
+    moto_server_path = shutil.which("moto_server")
+    if moto_server_path is None:
+        raise RuntimeError("moto_server not found; install moto[server]")
+
+    endpoint = f"127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [moto_server_path, "-H", "127.0.0.1", "-p", str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(60):
+            try:
+                urllib.request.urlopen(f"http://{endpoint}")
+                break
+            except OSError:
+                time.sleep(0.5)
+        else:
+            raise RuntimeError("moto_server did not come up")
+        yield endpoint
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def s3_backend_config(endpoint: str, **extra) -> dict:
+    return {
+        "S3_ENDPOINT": endpoint,
+        "S3_ACCESS_KEY": "benchmark",
+        "S3_SECRET_KEY": "benchmark",
+        "S3_BUCKET": BUCKET,
+        "S3_REGION_NAME": "us-east-1",
+        "S3_USE_HTTPS": False,
+        "S3_VALIDATE_SSL": False,
+        "LOG_LEVEL": "warning",
+        **extra,
+    }
@@ -0,0 +1,84 @@
+"""
+Throughput and CPU cost of streaming an object in chunks of different sizes, through the same async generator bridge
+(sync_generator_stream) as downloads, from the local backend and from S3 (moto_server.) The chunk size of each run is
+forced by setting both DRS_STREAM_MIN_CHUNK_SIZE and the backend's maximum chunk size to it. Each figure is the best of
+three runs; the local file is read from the page cache.
+
+Requires moto[server] for the S3 runs (skipped with --local-only.) Run from the repository root:
+
+    python benchmarks/stream_chunk_size.py [--size-mb 512] [--local-only]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections.abc import AsyncGenerator, Callable
+from pathlib import Path
+
+from s3_server import BUCKET, moto_server, s3_backend_config
+
+from chord_drs.backends.local import LocalBackend
+from chord_drs.backends.s3 import S3Backend, close_s3_clients
+from chord_drs.utils import sync_generator_stream
+
+MOTO_PORT = 5097
+
+CHUNK_SIZES = (64 << 10, 128 << 10, 256 << 10, 1 << 20, 4 << 20)
+
+logger = logging.getLogger("benchmark")
+
+
+def measure(label: str, size: int, stream: Callable[[], AsyncGenerator[bytes, None]]) -> None:
+    best_wall, best_cpu = float("inf"), float("inf")
+    for _ in range(3):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        n = sum(len(chunk) for chunk in sync_generator_stream(stream(), logger))
+        best_wall = min(best_wall, time.perf_counter() - wall_start)
+        best_cpu = min(best_cpu, time.process_time() - cpu_start)
+        assert n == size
+    print(f"{label:24s} {size / best_wall / (1 << 20):7.1f} MiB/s   cpu/GB: {best_cpu / (size / (1 << 30)):.3f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=512, help="Size of the streamed object, in MiB.")
+    parser.add_argument("--local-only", action="store_true", help="Skip the S3 runs.")
+    args = parser.parse_args()
+
+    size = args.size_mb << 20
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "object.bin"
+        with open(path, "wb") as fh:
+            fh.writelines(os.urandom(1 << 20) for _ in range(args.size_mb))
+
+        for cs in CHUNK_SIZES:
+            config = {"SERVICE_DATA": tmp, "DRS_STREAM_MIN_CHUNK_SIZE": cs, "DRS_LOCAL_STREAM_MAX_CHUNK_SIZE": cs}
+            backend = LocalBackend(config, logger)
+            measure(f"local chunk={cs >> 10:5d} KiB", size, lambda b=backend: b.stream(str(path), size=size))
+
+        if args.local_only:
+            return
+
+        with moto_server(MOTO_PORT) as endpoint:
+            try:
+                backend = S3Backend(s3_backend_config(endpoint), logger)
+                asyncio.run(backend._init_bucket_if_required())
+                with open(path, "rb") as fh:
+                    backend.get_sync_s3_client().put_object(Bucket=BUCKET, Key="object", Body=fh)
+                location = f"s3://{BUCKET}/object"
+
+                for cs in CHUNK_SIZES:
+                    config = s3_backend_config(endpoint, DRS_STREAM_MIN_CHUNK_SIZE=cs, S3_STREAM_MAX_CHUNK_SIZE=cs)
+                    backend = S3Backend(config, logger)
+                    measure(f"s3    chunk={cs >> 10:5d} KiB", size, lambda b=backend: b.stream(location, size=size))
+            finally:
+                close_s3_clients()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,9 +11,12 @@ from .backend import close_backend
 from .commands import ingest
 from .config import APP_DIR, Config
 from .db import db
+from .jobs import configure_ingest_jobs, resume_ingest_jobs
 from .metrics import metrics
 from .request import DrsRequest
 from .routes import drs_service
+from .uploads import expire_upload_sessions
+from .utils import configure_io_executor, validate_checksum_algorithms
 
 MIGRATION_DIR = os.path.join(APP_DIR, "migrations")
 
@@ -76,6 +79,20 @@ application.register_error_handler(
 db.init_app(application)
 migrate = Migrate(application, db, directory=MIGRATION_DIR, render_as_batch=True)
 
+# Fail early if any of the additional checksum algorithms is not supported
+validate_checksum_algorithms(application.config["DRS_CHECKSUM_ALGORITHMS"])
+
+# Set up the thread pool for blocking file work done during requests
+configure_io_executor(application.config["DRS_IO_WORKERS"])
+
+# Set up the thread pool for background ingest jobs, and pick up any jobs left over from a previous run once the first
+# request comes in (by then, the database has been migrated.)
+configure_ingest_jobs(application.config["DRS_INGEST_JOB_WORKERS"])
+application.before_request(resume_ingest_jobs)
+
+# Periodically clean up upload sessions which were abandoned before being finalized
+application.before_request(expire_upload_sessions)
+
 # Register routes
 application.register_blueprint(drs_service)
 
@@ -1,26 +1,116 @@
 from abc import ABC, abstractmethod
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Callable, Generator
 from logging import Logger
+from typing import BinaryIO
 
-__all__ = ["Backend"]
+from chord_drs.constants import CHUNK_SIZE
+from chord_drs.utils import sync_generator_stream
+
+from .block_cache import BlockCache
+
+__all__ = [
+    "STREAM_TARGET_CHUNKS",
+    "Backend",
+]
+
+# Transfers are streamed in at least this many chunks, unless capped by the backend's maximum chunk size
+STREAM_TARGET_CHUNKS = 16
 
 
 # noinspection PyUnusedLocal
 class Backend(ABC):
+    # Process-wide cache of blocks of files' bytes, for small ranged reads (see stream_cached), if enabled
+    block_cache: BlockCache | None = None
+
+    # Bounds on the size of the chunks which files are streamed in (see chunk_size)
+    min_chunk_size: int = CHUNK_SIZE
+    max_chunk_size: int = CHUNK_SIZE
+
     @abstractmethod
     def __init__(self, config: dict, logger: Logger):  # pragma: no cover
         pass
 
+    # If move is True, the file at current_location is a temporary file which the backend is free to consume.
+    # If passed, checksum is the SHA-256 checksum of the file, which backends can use to address the saved file.
+    # If passed, progress is called with the number of bytes saved since it was last called, as the file is saved.
     @abstractmethod
-    async def save(self, current_location: str, filename: str) -> str:  # pragma: no cover
+    async def save(
+        self,
+        current_location: str,
+        filename: str,
+        move: bool = False,
+        checksum: str | None = None,
+        progress: Callable[[int], None] | None = None,
+    ) -> str:  # pragma: no cover
         pass
 
+    # If passed, checksum is the SHA-256 checksum of the file, which backends must use to remove any cached copies of it.
     @abstractmethod
-    async def delete(self, location: str) -> None:  # pragma: no cover
+    async def delete(self, location: str, checksum: str | None = None) -> None:  # pragma: no cover
         pass
 
+    # Returns the location to record for a file which is registered in place, i.e. without being copied into the
+    # backend. Raises ValueError if the backend doesn't support this, or if the file can't be registered in place.
+    def in_place_location(self, path: str) -> str:
+        raise ValueError("Registering files in place is not supported by this backend")
+
+    # Returns headers instructing the reverse proxy in front of the service to serve the file at a location itself
+    # (e.g., X-Accel-Redirect), or None if the file must be streamed through the service.
+    def offload_headers(self, location: str) -> dict[str, str] | None:
+        return None
+
+    # Returns a file-like object over the bytes (in the range, inclusive, if given) of the file at a location, which the
+    # WSGI server's wsgi.file_wrapper can send using sendfile, or None if the backend's files cannot be opened directly.
+    def open_file(self, location: str, range: tuple[int, int] | None = None) -> BinaryIO | None:
+        return None
+
+    # Returns the size of the chunks to stream a transfer of length bytes (or of unknown length, if None) in. Large
+    # transfers are streamed in large chunks, cutting the number of per-chunk iterations and event loop hops, while small
+    # (e.g., ranged) ones don't allocate more than they need.
+    def chunk_size(self, length: int | None) -> int:
+        if length is None:
+            return self.max_chunk_size
+        target = 1 << (max(length // STREAM_TARGET_CHUNKS, 1) - 1).bit_length()  # rounded up to a power of two
+        return max(min(max(target, self.min_chunk_size), self.max_chunk_size, length), 1)
+
+    # Returns an async generator over the bytes (in the range, inclusive, if given) of the file at a location.
+    # If passed, checksum is the SHA-256 checksum of the whole file, which backends may use to cache its bytes.
+    # If passed, size is the size of the whole file, which backends may use to split reading it into parts.
     @abstractmethod
-    async def get_stream_generator(
-        self, location: str, range: tuple[int, int] | None = None
-    ) -> Generator[bytes, None, None]:  # pragma: no cover
+    def stream(
+        self,
+        location: str,
+        range: tuple[int, int] | None = None,
+        checksum: str | None = None,
+        size: int | None = None,
+    ) -> AsyncGenerator[bytes, None]:  # pragma: no cover
         pass
+
+    # Like stream, except that small ranges of files whose checksum and size are known are assembled from blocks in the
+    # block cache (if enabled), with only the missing blocks being read from the backend.
+    def stream_cached(
+        self,
+        location: str,
+        range: tuple[int, int] | None = None,
+        checksum: str | None = None,
+        size: int | None = None,
+    ) -> AsyncGenerator[bytes, None]:
+        if (
+            self.block_cache is not None
+            and checksum is not None
+            and size is not None
+            and self.block_cache.applies(range)
+        ):
+            return self.block_cache.stream(
+                location, checksum, size, range, lambda r: self.stream(location, r, checksum, size)
+            )
+        return self.stream(location, range, checksum, size)
+
+    async def get_stream_generator(
+        self,
+        location: str,
+        range: tuple[int, int] | None = None,
+        checksum: str | None = None,
+        size: int | None = None,
+    ) -> Generator[bytes, None, None]:
+        return sync_generator_stream(self.stream_cached(location, range, checksum, size), self.logger)
@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Callable
+from contextlib import aclosing
+
+from chord_drs.metrics import block_cache_bytes, block_cache_hits, block_cache_misses
+
+__all__ = [
+    "DEFAULT_BLOCK_SIZE",
+    "DEFAULT_MAX_RANGE",
+    "BlockCache",
+    "get_block_cache",
+]
+
+DEFAULT_BLOCK_SIZE = 64 * 1024  # 64 KB
+DEFAULT_MAX_RANGE = 1024 * 1024  # 1 MB
+
+BlockKey = tuple[str, str, int]  # location, checksum, block index
+
+_block_cache: "BlockCache | None" = None
+_block_cache_lock = threading.Lock()
+
+
+class BlockCache:
+    """
+    Bounded, least-recently-used cache of fixed-size, aligned blocks of objects' bytes, kept in memory and shared by all
+    requests (and event loops) in a process. Blocks are keyed by location and SHA-256 checksum, so that a block is never
+    served for different bytes. Only small ranges are read through the cache; larger ones would just evict the blocks
+    that interactive clients keep coming back to (headers, indices, nearby regions.)
+    """
+
+    def __init__(self, block_size: int, capacity: int, max_range: int):
+        self.block_size = block_size
+        self.capacity = capacity
+        self.max_range = max_range
+        self._blocks: OrderedDict[BlockKey, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def applies(self, range: tuple[int, int] | None) -> bool:
+        return range is not None and range[1] + 1 - range[0] <= self.max_range
+
+    def _get(self, key: BlockKey) -> bytes | None:
+        with self._lock:
+            if (block := self._blocks.get(key)) is not None:
+                self._blocks.move_to_end(key)
+            return block
+
+    def _put(self, key: BlockKey, block: bytes) -> None:
+        with self._lock:
+            if (old_block := self._blocks.pop(key, None)) is not None:
+                self._size -= len(old_block)
+            self._blocks[key] = block
+            self._size += len(block)
+            while self._size > self.capacity:
+                _, evicted = self._blocks.popitem(last=False)
+                self._size -= len(evicted)
+            block_cache_bytes.set(self._size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+            self._size = 0
+            block_cache_bytes.set(0)
+
+    async def stream(
+        self,
+        location: str,
+        checksum: str,
+        size: int,
+        range: tuple[int, int],
+        fetch: Callable[[tuple[int, int]], AsyncGenerator[bytes, None]],
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Streams the bytes in the (inclusive) range of an object of the given size from cached blocks, fetching any runs
+        of missing blocks with one fetch(range) call each and caching them along the way.
+        """
+
+        bs = self.block_size
+        start, end = range
+        first_block, last_block = start // bs, end // bs
+
+        def _trim(i: int, block: bytes) -> bytes:
+            # Slice of block i which falls within the requested range
+            return block[max(start - i * bs, 0) : end + 1 - i * bs]
+
+        i = first_block
+        while i <= last_block:
+            if (block := self._get((location, checksum, i))) is not None:
+                block_cache_hits.inc()
+                yield _trim(i, block)
+                i += 1
+                continue
+
+            # Fetch the whole run of missing blocks starting here, as a single (block-aligned) range
+            run_end = i + 1
+            while run_end <= last_block and self._get((location, checksum, run_end)) is None:
+                run_end += 1
+            block_cache_misses.inc(run_end - i)
+
+            buf = bytearray()
+            async with aclosing(fetch((i * bs, min(run_end * bs, size) - 1))) as fetched:
+                async for chunk in fetched:
+                    buf += chunk
+                    while len(buf) >= bs or (buf and i * bs + len(buf) >= size):
+                        block = bytes(buf[:bs])
+                        del buf[:bs]
+                        self._put((location, checksum, i), block)
+                        yield _trim(i, block)
+                        i += 1
+
+            if i < run_end:  # pragma: no cover
+                raise ValueError(f"Object at {location} is shorter than its recorded size ({size} bytes)")
+
+
+def get_block_cache(config: dict) -> BlockCache | None:
+    """
+    Returns the process-wide block cache, or None if it is disabled (DRS_BLOCK_CACHE_SIZE is 0.) The cache is replaced
+    (and its contents dropped) if the configured block size or capacity change.
+    """
+
+    global _block_cache
+
+    capacity: int = config.get("DRS_BLOCK_CACHE_SIZE", 0)
+    if capacity <= 0:
+        return None
+
+    block_size: int = config.get("DRS_BLOCK_CACHE_BLOCK_SIZE", DEFAULT_BLOCK_SIZE)
+    max_range: int = config.get("DRS_BLOCK_CACHE_MAX_RANGE", DEFAULT_MAX_RANGE)
+
+    with _block_cache_lock:
+        if _block_cache is None or (_block_cache.block_size, _block_cache.capacity) != (block_size, capacity):
+            _block_cache = BlockCache(block_size, capacity, max_range)
+        _block_cache.max_range = max_range
+        return _block_cache
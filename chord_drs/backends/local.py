@@ -1,16 +1,80 @@
-from collections.abc import Generator
+import fcntl
+import io
+import os
+import time
+from collections.abc import AsyncGenerator, Callable
 from logging import Logger
 from pathlib import Path
 from shutil import copy
+from urllib.parse import quote
+from uuid import uuid4
 
 from bento_lib.streaming.file import stream_file
 
-from chord_drs.constants import CHUNK_SIZE
-from chord_drs.utils import sync_generator_stream
+from chord_drs.constants import DEFAULT_LOCAL_MAX_CHUNK_SIZE, DEFAULT_MIN_CHUNK_SIZE
+from chord_drs.metrics import ingest_bytes, ingest_duration
+from chord_drs.utils import run_blocking
 
 from .base import Backend
+from .block_cache import get_block_cache
 
-__all__ = ["LocalBackend"]
+__all__ = [
+    "OFFLOAD_X_ACCEL_REDIRECT",
+    "OFFLOAD_X_SENDFILE",
+    "FileRange",
+    "LocalBackend",
+]
+
+# Top-level directory for content-addressed files in the backend directory; named after the hash algorithm used.
+CONTENT_ADDRESSED_DIR = "sha256"
+
+# ioctl request number for cloning a file's extents into another file on copy-on-write filesystems (btrfs, XFS, ...)
+# See https://man7.org/linux/man-pages/man2/ioctl_ficlone.2.html
+FICLONE = 0x40049409
+
+# Ways of offloading downloads to the reverse proxy in front of the service (see LocalBackend.offload_headers)
+OFFLOAD_X_ACCEL_REDIRECT = "x-accel-redirect"
+OFFLOAD_X_SENDFILE = "x-sendfile"
+
+
+def _reflink(current_location: Path, new_location: Path) -> None:
+    with open(current_location, "rb") as src, open(new_location, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            new_location.unlink()
+            raise
+
+
+class FileRange:
+    """
+    Read-only view of a byte range of a file, positioned at the start of the range. It is unbuffered, so that WSGI
+    servers sending it with sendfile (e.g., gunicorn) start at the right offset, given the response's Content-Length;
+    servers which read it instead get no bytes past the end of the range.
+    """
+
+    def __init__(self, path: str | Path, start: int = 0, stop: int | None = None):
+        self._file = io.FileIO(path, "rb")
+        self._stop = os.fstat(self._file.fileno()).st_size if stop is None else stop
+        self._file.seek(start)
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self._stop - self._file.tell()
+        if remaining <= 0:
+            return b""
+        return self._file.read(remaining if size < 0 else min(size, remaining))
+
+    def close(self) -> None:
+        self._file.close()
 
 
 class LocalBackend(Backend):
@@ -24,23 +88,153 @@ class LocalBackend(Backend):
         self.base_location = Path(config["SERVICE_DATA"])
         # We can use mkdir, since resolve has been called in config.py
         self.base_location.mkdir(parents=True, exist_ok=True)
+        self.hardlink_ingest: bool = config.get("DRS_LOCAL_HARDLINK_INGEST", False)
+        self.content_addressed: bool = config.get("DRS_LOCAL_CONTENT_ADDRESSED", False)
+        # Directories whose files can be registered as objects in place, i.e. without being copied into the backend.
+        # These files are not owned by the service, so they are never deleted by it.
+        self.in_place_roots: tuple[Path, ...] = tuple(Path(r) for r in config.get("DRS_LOCAL_IN_PLACE_ROOTS", ()))
+        self.offload: str = config.get("DRS_LOCAL_OFFLOAD", "")
+        self.offload_prefix: str = config.get("DRS_LOCAL_OFFLOAD_PREFIX", "/drs-data/")
+        if self.offload not in ("", OFFLOAD_X_ACCEL_REDIRECT, OFFLOAD_X_SENDFILE):
+            raise ValueError(f"Invalid download offload mode: {self.offload}")
+        self.min_chunk_size: int = config.get("DRS_STREAM_MIN_CHUNK_SIZE", DEFAULT_MIN_CHUNK_SIZE)
+        self.max_chunk_size: int = config.get("DRS_LOCAL_STREAM_MAX_CHUNK_SIZE", DEFAULT_LOCAL_MAX_CHUNK_SIZE)
+        self.block_cache = get_block_cache(config)
         self.logger = logger
 
-    async def save(self, current_location: str | Path, filename: str) -> str:
-        new_location = self.base_location / filename
+    def _place(self, current_location: Path, new_location: Path, move: bool) -> None:
+        start_time = time.perf_counter()
+        self._place_file(current_location, new_location, move)
+        ingest_bytes.labels(backend="local").inc(new_location.stat().st_size)
+        ingest_duration.labels(backend="local").observe(time.perf_counter() - start_time)
+
+    def _place_file(self, current_location: Path, new_location: Path, move: bool) -> None:
+        """
+        Places the file at current_location at new_location, avoiding copying bytes if possible:
+         - if the source file can be consumed, it is renamed into place;
+         - otherwise, it is reflinked (on copy-on-write filesystems) or, if enabled, hard-linked into place.
+        All of these only work within a single filesystem; a regular copy is the fallback.
+        """
+
+        if move:
+            try:
+                os.rename(current_location, new_location)
+                return
+            except OSError as e:
+                self.logger.debug("could not rename %s to %s (%s); falling back", current_location, new_location, e)
+
+        try:
+            _reflink(current_location, new_location)
+            return
+        except OSError as e:
+            self.logger.debug("could not reflink %s to %s (%s); falling back", current_location, new_location, e)
+
+        if self.hardlink_ingest:
+            try:
+                os.link(current_location, new_location)
+                return
+            except OSError as e:
+                self.logger.debug("could not hard-link %s to %s (%s); falling back", current_location, new_location, e)
+
         copy(current_location, new_location)
-        return str(new_location.resolve())
 
-    async def delete(self, location: str | Path) -> None:
+    def _in_place_root(self, location: Path) -> Path | None:
+        return next((r for r in self.in_place_roots if r == location or r in location.parents), None)
+
+    def in_place_location(self, path: str) -> str:
+        """
+        Validates that the file at a path can be registered in place, returning the location to record for it. Raises
+        FileNotFoundError if the file does not exist, or ValueError if it is not a regular file inside one of the
+        allowed roots (after resolving any symlinks.)
+        """
+
+        location = Path(path).resolve(strict=True)
+        if self._in_place_root(location) is None:
+            raise ValueError(f"Path {path} is not inside a directory allowed for in-place registration")
+        if not location.is_file():
+            raise ValueError(f"Path {path} is not a regular file")
+        return str(location)
+
+    def content_addressed_path(self, checksum: str) -> Path:
+        # Two levels of fan-out (256 * 256 directories) keep the number of entries per directory bounded
+        return self.base_location / CONTENT_ADDRESSED_DIR / checksum[:2] / checksum[2:4] / checksum
+
+    async def save(
+        self,
+        current_location: str | Path,
+        filename: str,
+        move: bool = False,
+        checksum: str | None = None,
+        progress: Callable[[int], None] | None = None,
+    ) -> str:
+        # Placing a file may mean copying many GBs, so don't block the event loop while doing it
+        location = await run_blocking(self._save, Path(current_location), filename, move, checksum)
+        if progress:  # Files are placed in one go (a rename, reflink, link or copy), so report all bytes at once
+            progress(await run_blocking(os.path.getsize, location))
+        return location
+
+    def _save(self, current_location: Path, filename: str, move: bool, checksum: str | None) -> str:
+        if not self.content_addressed:
+            new_location = self.base_location / filename
+            self._place(current_location, new_location, move)
+            return str(new_location.resolve())
+
+        if checksum is None:
+            raise ValueError("A checksum is required to save files with a content-addressed layout")
+
+        new_location = self.content_addressed_path(checksum)
+
+        if new_location.exists():
+            # Identical bytes are already stored - nothing to do
+            self.logger.info("content-addressed file %s already exists; not saving %s", new_location, current_location)
+            return str(new_location)
+
+        new_location.parent.mkdir(parents=True, exist_ok=True)
+
+        # Place the file under a temporary name first, and then atomically rename it into place, so a partially written
+        # file is never visible at its content address.
+        tmp_location = new_location.with_name(f".{checksum}.{uuid4()}")
+        try:
+            self._place(current_location, tmp_location, move)
+            os.replace(tmp_location, new_location)
+        finally:
+            tmp_location.unlink(missing_ok=True)
+
+        return str(new_location)
+
+    async def delete(self, location: str | Path, checksum: str | None = None) -> None:
         loc = location if isinstance(location, Path) else Path(location)
         if self.base_location in loc.parents:
-            loc.unlink()
+            await run_blocking(loc.unlink)
             return
         raise ValueError(f"Location {loc} is not a subpath of backend base location {self.base_location}")
 
-    async def get_stream_generator(
-        self, location: str, range: tuple[int, int] | None = None
-    ) -> Generator[bytes, None, None]:
-        location_path = Path(location)
-        generator = stream_file(location_path, range, CHUNK_SIZE)
-        return sync_generator_stream(generator, self.logger)
+    def offload_headers(self, location: str) -> dict[str, str] | None:
+        if self.offload == OFFLOAD_X_SENDFILE:
+            return {"X-Sendfile": str(Path(location).absolute())}
+
+        if self.offload == OFFLOAD_X_ACCEL_REDIRECT:
+            loc = Path(location)
+            if self.base_location not in loc.parents:
+                # The internal proxy location only maps the data directory; files registered in place elsewhere
+                # are streamed as usual.
+                return None
+            return {
+                "X-Accel-Redirect": self.offload_prefix.rstrip("/")
+                + "/"
+                + quote(str(loc.relative_to(self.base_location)))
+            }
+
+        return None
+
+    def open_file(self, location: str, range: tuple[int, int] | None = None) -> FileRange:
+        return FileRange(location, *((range[0], range[1] + 1) if range else ()))
+
+    def stream(
+        self,
+        location: str,
+        range: tuple[int, int] | None = None,
+        checksum: str | None = None,
+        size: int | None = None,
+    ) -> AsyncGenerator[bytes, None]:
+        return stream_file(Path(location), range, self.chunk_size(range[1] + 1 - range[0] if range else size))
@@ -1,25 +1,278 @@
+import asyncio
 import logging
-from collections.abc import AsyncGenerator, Generator
-from typing import TypedDict
+import math
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncGenerator, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AsyncExitStack, aclosing
+from typing import Any, TypedDict
 
 import aioboto3
+import boto3
 import botocore
+import botocore.config
+from aiobotocore.config import AioConfig
 from bento_lib.logging import log_level_from_str
 from boto3.s3.transfer import S3TransferConfig
 
-from chord_drs.constants import CHUNK_SIZE
-from chord_drs.utils import sync_generator_stream
+from chord_drs.constants import CHUNK_SIZE, DEFAULT_MIN_CHUNK_SIZE, DEFAULT_S3_MAX_CHUNK_SIZE
+from chord_drs.metrics import (
+    ingest_bytes,
+    ingest_duration,
+    s3_clients_created,
+    s3_download_parts,
+    s3_pool_in_use,
+    s3_pool_size,
+    s3_upload_parts,
+)
+from chord_drs.utils import IncrementalChecksum, _get_stream_loop, run_blocking, run_on_stream_loop
 
 from .base import Backend
+from .block_cache import get_block_cache
+from .s3_cache import DEFAULT_S3_CACHE_MAX_SIZE, S3DiskCache
 
-__all__ = ["S3ObjectGenerator", "S3Backend"]
+__all__ = [
+    "MIN_MULTIPART_CHUNK_SIZE",
+    "MAX_MULTIPART_CHUNK_SIZE",
+    "DEFAULT_MULTIPART_CHUNK_SIZE",
+    "DEFAULT_MAX_CONCURRENCY",
+    "DEFAULT_MAX_POOL_CONNECTIONS",
+    "DEFAULT_CONNECT_TIMEOUT",
+    "DEFAULT_READ_TIMEOUT",
+    "DEFAULT_KEEPALIVE_TIMEOUT",
+    "DEFAULT_DOWNLOAD_CONCURRENCY",
+    "DEFAULT_DOWNLOAD_PART_SIZE",
+    "multipart_chunk_size",
+    "close_s3_clients",
+    "S3BodyStream",
+    "S3ObjectGenerator",
+    "S3UploadStream",
+    "S3Backend",
+]
+
+MIN_MULTIPART_CHUNK_SIZE = 5 * 1024 * 1024  # 5MB chunk size, the minimum S3 allows for all but the last part
+MAX_MULTIPART_CHUNK_SIZE = 5 * 1024 * 1024 * 1024  # 5GB chunk size, the maximum S3 allows for any part
+DEFAULT_MULTIPART_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 8
+MAX_PARTS = 10000  # S3 allows at most 10,000 parts per multipart upload
+
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_KEEPALIVE_TIMEOUT = 60.0
+
+DEFAULT_DOWNLOAD_CONCURRENCY = 1
+DEFAULT_DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+
+# Process-wide S3 clients, keyed by the settings they were created with (see S3Backend._client_key). Async clients are
+# only ever accessed from the shared stream loop, which they are bound to; sync clients are thread-safe.
+_async_clients: dict[tuple, asyncio.Future] = {}
+_sync_clients: dict[tuple, Any] = {}
+_sync_clients_lock = threading.Lock()
+
+
+def multipart_chunk_size(file_size: int | None, chunk_size: int = DEFAULT_MULTIPART_CHUNK_SIZE) -> int:
+    """
+    Picks a multipart upload part size for a file of the given size (if known): the configured chunk size, unless the
+    file is so large that this would result in more than MAX_PARTS parts, in which case the part size is increased (in
+    whole MBs) to fit the file into MAX_PARTS parts.
+    """
+    chunk_size = max(chunk_size, MIN_MULTIPART_CHUNK_SIZE)
+    if file_size is None or file_size <= chunk_size * MAX_PARTS:
+        return chunk_size
+    mb = 1024 * 1024
+    return math.ceil(file_size / MAX_PARTS / mb) * mb
+
+
+def close_s3_clients() -> None:
+    """
+    Closes the process-wide S3 clients and their connection pools, e.g. on shutdown. They are re-created when next used.
+    Must not be called from the shared stream loop itself.
+    """
+
+    async def close_async_clients():
+        client_futures = list(_async_clients.values())
+        _async_clients.clear()
+        for client_future in client_futures:
+            if client_future.done() and not client_future.cancelled() and client_future.exception() is None:
+                _, exit_stack = client_future.result()
+                await exit_stack.aclose()
+
+    asyncio.run_coroutine_threadsafe(close_async_clients(), _get_stream_loop()).result()
+
+    with _sync_clients_lock:
+        for client in _sync_clients.values():
+            client.close()
+        _sync_clients.clear()
+
+
+class S3BodyStream:
+    """
+    Async iterator over the body of an S3 GET response, which returns the response's pooled connection (and decrements
+    the in-use gauge) once exhausted or closed. Unlike an async generator's finally block, aclose releases the body even
+    if it is called before the first chunk is read.
+    """
+
+    def __init__(self, body, chunk_size: int = CHUNK_SIZE):
+        self._body = body
+        self._chunk_size = chunk_size
+        self._released = False
+
+    def __aiter__(self) -> "S3BodyStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._released:
+            raise StopAsyncIteration
+        try:
+            # The body is bound to the shared loop along with the client; reads are run there, wherever this is iterated
+            chunk = await run_on_stream_loop(self._body.read(self._chunk_size))
+        except BaseException:
+            await self.aclose()
+            raise
+        if not chunk:
+            await self.aclose()
+            raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self) -> None:
+        if self._released:
+            return
+        self._released = True
+
+        async def close_body() -> None:
+            # Returns the connection to the pool if the body was read in full; otherwise, it cannot be reused.
+            self._body.close()
+
+        try:
+            await run_on_stream_loop(close_body())
+        finally:
+            s3_pool_in_use.labels(client="async").dec()
 
 
 class S3ObjectGenerator(TypedDict):
-    generator: AsyncGenerator[bytes, None]
+    generator: S3BodyStream
     headers: dict[str, str]
 
 
+class S3UploadStream:
+    """
+    Write-only file stream which pipes the bytes written to it directly into an S3 object, using a multipart upload
+    once more than one part's worth of bytes has been written, while computing the SHA-256 checksum and size of the
+    object incrementally. This lets uploads be ingested without first being written to local disk.
+    Since the stream is written to synchronously (e.g., by Werkzeug's form parser), it uses the process-wide synchronous
+    S3 client; parts are uploaded by a pool of threads, with at most max_concurrency parts buffered in memory at once.
+    """
+
+    def __init__(
+        self,
+        backend: "S3Backend",
+        object_key: str,
+        part_size: int = DEFAULT_MULTIPART_CHUNK_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        self._client = backend.get_sync_s3_client()  # shared by all streams and threads; not closed with the stream
+        self._bucket = backend.bucket_name
+        self._key = object_key
+        self._part_size = part_size
+        self._max_concurrency = max_concurrency
+        self._logger = backend.logger
+
+        self._buffer = bytearray()
+        self._checksum = IncrementalChecksum(backend.checksum_algorithms)
+        self._upload_id: str | None = None
+        self._n_parts: int = 0
+        self._parts: list[dict] = []
+        self._pending_parts: deque[Future[dict]] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="drs-s3-upload")
+        self._completed: bool = False
+        self._start_time = time.perf_counter()
+
+        self.location: str = backend._build_s3_location(object_key)
+
+    @property
+    def checksum(self) -> str:
+        return self._checksum.hexdigest()
+
+    @property
+    def extra_checksums(self) -> dict[str, str]:
+        return self._checksum.extra_hexdigests()
+
+    @property
+    def size(self) -> int:
+        return self._checksum.size
+
+    def _s3_call(self, operation: str, **kwargs):
+        with s3_pool_in_use.labels(client="sync").track_inprogress():
+            return getattr(self._client, operation)(Bucket=self._bucket, Key=self._key, **kwargs)
+
+    def _put_part(self, part_number: int, data: bytes) -> dict:
+        res = self._s3_call("upload_part", PartNumber=part_number, UploadId=self._upload_id, Body=data)
+        return {"ETag": res["ETag"], "PartNumber": part_number}
+
+    def _wait_for_parts(self, max_pending: int = 0) -> None:
+        while len(self._pending_parts) > max_pending:
+            self._parts.append(self._pending_parts.popleft().result())
+
+    def _upload_part(self, data: bytes) -> None:
+        if self._upload_id is None:
+            res = self._s3_call("create_multipart_upload")
+            self._upload_id = res["UploadId"]
+            self._logger.debug("started multipart upload %s for %s", self._upload_id, self.location)
+
+        # Bound the number of parts (and thus bytes) in flight before submitting another one
+        self._wait_for_parts(self._max_concurrency - 1)
+        self._n_parts += 1
+        self._pending_parts.append(self._executor.submit(self._put_part, self._n_parts, data))
+
+    def write(self, data: bytes) -> int:
+        self._checksum.update(data)
+        self._buffer += data
+        while len(self._buffer) >= self._part_size:
+            self._upload_part(bytes(self._buffer[: self._part_size]))
+            del self._buffer[: self._part_size]
+        return len(data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # Werkzeug rewinds file streams once it's done writing to them; we cannot (and do not need to) read this one.
+        return 0
+
+    def finish(self) -> None:
+        """
+        Uploads any remaining buffered bytes and completes the upload, making the object available at self.location.
+        """
+
+        if self._upload_id is None:
+            # Small enough to fit in a single part - upload it as a regular object instead.
+            self._s3_call("put_object", Body=bytes(self._buffer))
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self._wait_for_parts()
+            self._s3_call(
+                "complete_multipart_upload",
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": sorted(self._parts, key=lambda p: p["PartNumber"])},
+            )
+
+        self._buffer.clear()
+        self._completed = True
+
+        s3_upload_parts.observe(max(self._n_parts, 1))
+        ingest_bytes.labels(backend="s3").inc(self.size)
+        ingest_duration.labels(backend="s3").observe(time.perf_counter() - self._start_time)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        # If the upload was never finished (e.g., the request failed part-way through), don't leave parts lying around
+        if self._upload_id is not None and not self._completed:
+            self._logger.info("aborting unfinished multipart upload %s for %s", self._upload_id, self.location)
+            self._s3_call("abort_multipart_upload", UploadId=self._upload_id)
+
+
 class S3Backend(Backend):
     def __init__(
         self,
@@ -39,86 +292,352 @@ class S3Backend(Backend):
         self.region_name = config["S3_REGION_NAME"]
         self.bucket_name = config["S3_BUCKET"]
 
-        self.session = aioboto3.Session()
+        # Multipart transfer tuning; chunk size is a minimum and is increased for very large files (see above)
+        self.multipart_chunk_size: int = config.get("S3_MULTIPART_CHUNK_SIZE", DEFAULT_MULTIPART_CHUNK_SIZE)
+        self.max_concurrency: int = config.get("S3_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+
+        # Connection pool tuning for the process-wide clients shared by all backend instances with the same settings
+        self.max_pool_connections: int = config.get("S3_MAX_POOL_CONNECTIONS", DEFAULT_MAX_POOL_CONNECTIONS)
+        self.connect_timeout: float = config.get("S3_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)
+        self.read_timeout: float = config.get("S3_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)
+        self.keepalive_timeout: float = config.get("S3_KEEPALIVE_TIMEOUT", DEFAULT_KEEPALIVE_TIMEOUT)
+
+        # Optional local disk cache, which reads of objects with a known checksum go through
+        self.cache: S3DiskCache | None = None
+        if cache_dir := config.get("S3_CACHE_DIR"):
+            self.cache = S3DiskCache(cache_dir, config.get("S3_CACHE_MAX_SIZE", DEFAULT_S3_CACHE_MAX_SIZE), logger)
+
+        # Parallel read-ahead for large downloads: the number of ranged GETs in flight per download (1 disables it), and
+        # the size of the part each one fetches.
+        self.download_concurrency: int = config.get("S3_DOWNLOAD_CONCURRENCY", DEFAULT_DOWNLOAD_CONCURRENCY)
+        self.download_part_size: int = config.get("S3_DOWNLOAD_PART_SIZE", DEFAULT_DOWNLOAD_PART_SIZE)
+
+        self.min_chunk_size: int = config.get("DRS_STREAM_MIN_CHUNK_SIZE", DEFAULT_MIN_CHUNK_SIZE)
+        self.max_chunk_size: int = config.get("S3_STREAM_MAX_CHUNK_SIZE", DEFAULT_S3_MAX_CHUNK_SIZE)
+
+        self.block_cache = get_block_cache(config)
+
+        # Additional checksum algorithms to compute for uploads streamed directly into the bucket
+        self.checksum_algorithms: tuple[str, ...] = config.get("DRS_CHECKSUM_ALGORITHMS", ())
 
         self.logger = logger
 
-    async def _create_s3_client(self):
-        return self.session.client(
-            "s3",
-            endpoint_url=self._s3_url,
-            aws_access_key_id=self.s3_access_key_id,
-            aws_secret_access_key=self.s3_secret_access_key,
-            region_name=self.region_name,
-            verify=False,
+    def _client_key(self) -> tuple:
+        # Clients are not shared with forked processes, since their connections would be
+        return (
+            os.getpid(),
+            self._s3_url,
+            self.s3_access_key_id,
+            self.s3_secret_access_key,
+            self.region_name,
+            self.max_pool_connections,
+            self.connect_timeout,
+            self.read_timeout,
+            self.keepalive_timeout,
+        )
+
+    def _client_kwargs(self) -> dict:
+        return {
+            "endpoint_url": self._s3_url,
+            "aws_access_key_id": self.s3_access_key_id,
+            "aws_secret_access_key": self.s3_secret_access_key,
+            "region_name": self.region_name,
+            "verify": False,
+        }
+
+    async def _open_s3_client(self) -> tuple[Any, AsyncExitStack]:
+        exit_stack = AsyncExitStack()
+        client = await exit_stack.enter_async_context(
+            aioboto3.Session().client(
+                "s3",
+                **self._client_kwargs(),
+                config=AioConfig(
+                    max_pool_connections=self.max_pool_connections,
+                    connect_timeout=self.connect_timeout,
+                    read_timeout=self.read_timeout,
+                    tcp_keepalive=True,
+                    connector_args={"keepalive_timeout": self.keepalive_timeout},
+                ),
+            )
+        )
+        s3_clients_created.labels(client="async").inc()
+        s3_pool_size.labels(client="async").set(self.max_pool_connections)
+        return client, exit_stack
+
+    async def _get_s3_client(self):
+        """
+        Returns the process-wide async S3 client for this backend's settings, creating it on first use. Since the client
+        (and its connection pool) is bound to the event loop it was created on, this must run on the shared stream loop;
+        see _s3_call.
+        """
+
+        key = self._client_key()
+        if (client_future := _async_clients.get(key)) is None:
+            client_future = _async_clients[key] = asyncio.ensure_future(self._open_s3_client())
+        try:
+            # Shielded, since other calls may be waiting on the same client being created
+            client, _ = await asyncio.shield(client_future)
+        except Exception:
+            if _async_clients.get(key) is client_future:  # Try again next time
+                del _async_clients[key]
+            raise
+        return client
+
+    async def _s3_call(self, operation: str, **kwargs):
+        """
+        Calls an S3 client method using the process-wide, pooled async client, from any event loop.
+        """
+
+        async def call():
+            s3_client = await self._get_s3_client()
+            with s3_pool_in_use.labels(client="async").track_inprogress():
+                return await getattr(s3_client, operation)(**kwargs)
+
+        return await run_on_stream_loop(call())
+
+    def get_sync_s3_client(self):
+        """
+        Returns the process-wide synchronous S3 client for this backend's settings, creating it on first use.
+        Unlike the async client, it can be used directly from any thread.
+        """
+
+        key = self._client_key()
+        with _sync_clients_lock:
+            if (client := _sync_clients.get(key)) is None:
+                client = _sync_clients[key] = boto3.client(
+                    "s3",
+                    **self._client_kwargs(),
+                    config=botocore.config.Config(
+                        max_pool_connections=self.max_pool_connections,
+                        connect_timeout=self.connect_timeout,
+                        read_timeout=self.read_timeout,
+                        tcp_keepalive=True,
+                    ),
+                )
+                s3_clients_created.labels(client="sync").inc()
+                s3_pool_size.labels(client="sync").set(self.max_pool_connections)
+        return client
+
+    def open_upload_stream(self, object_key: str, size: int | None = None) -> S3UploadStream:
+        return S3UploadStream(
+            self,
+            object_key,
+            part_size=multipart_chunk_size(size, self.multipart_chunk_size),
+            max_concurrency=self.max_concurrency,
         )
 
     async def _init_bucket_if_required(self):
         # Mostly for tests with S3 mocks
-        async with await self._create_s3_client() as s3_client:
-            try:
-                # Raises ClientError 404 if the bucket is missing
-                return await s3_client.head_bucket(Bucket=self.bucket_name)
-            except botocore.exceptions.ClientError as err:
-                if err.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
-                    return await s3_client.create_bucket(Bucket=self.bucket_name)
+        try:
+            # Raises ClientError 404 if the bucket is missing
+            return await self._s3_call("head_bucket", Bucket=self.bucket_name)
+        except botocore.exceptions.ClientError as err:
+            if err.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
+                return await self._s3_call("create_bucket", Bucket=self.bucket_name)
 
     def _build_s3_location(self, object_key: str):
         return f"s3://{self.bucket_name}/{object_key}"
 
-    async def _retrieve_headers(self, object_key: str):
-        async with await self._create_s3_client() as s3:
-            head = await s3.head_object(Bucket=self.bucket_name, Key=object_key)
-        return {
-            "Content-Length": str(head["ContentLength"]),
-            "Content-Type": head["ContentType"],
-            "ETag": head["ETag"],
-            "Last-Modified": str(head["LastModified"]),
-        }
+    async def _get_object(self, object_key: str, bytes_range: tuple[int, int] | None = None) -> dict:
+        """
+        Sends a single GET (for a byte range, if one is given) for an object. The response's body holds a pooled
+        connection until it is streamed and closed with an S3BodyStream.
+        """
 
-    async def get_s3_object_dict(self, location: str, bytes_range: tuple[int, int] | None = None) -> S3ObjectGenerator:
-        object_key = self._location_to_object_key(location)
-        headers = await self._retrieve_headers(object_key)
-
-        async def stream_object() -> AsyncGenerator[bytes, None]:
-            async with await self._create_s3_client() as s3_client:
-                response = await s3_client.get_object(
-                    Bucket=self.bucket_name,
-                    Key=object_key,
-                    # if a byte range is set, pass a Range: bytes=... header to boto3
-                    **({"Range": f"bytes={bytes_range[0]}-{bytes_range[1]}"} if bytes_range else {}),
-                )
-                body_stream = response["Body"]
-                while chunk := await body_stream.read(CHUNK_SIZE):
+        response = await self._s3_call(
+            "get_object",
+            Bucket=self.bucket_name,
+            Key=object_key,
+            # if a byte range is set, pass a Range: bytes=... header to boto3
+            **({"Range": f"bytes={bytes_range[0]}-{bytes_range[1]}"} if bytes_range else {}),
+        )
+        s3_pool_in_use.labels(client="async").inc()
+        return response
+
+    async def _stream_object(
+        self, object_key: str, bytes_range: tuple[int, int] | None = None, chunk_size: int = CHUNK_SIZE
+    ) -> AsyncGenerator[bytes, None]:
+        response = await self._get_object(object_key, bytes_range)
+        async with aclosing(S3BodyStream(response["Body"], chunk_size)) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    async def _read_part(self, object_key: str, bytes_range: tuple[int, int], chunk_size: int) -> list[bytes]:
+        response = await self._get_object(object_key, bytes_range)
+        async with aclosing(S3BodyStream(response["Body"], chunk_size)) as chunks:
+            return [chunk async for chunk in chunks]
+
+    async def _stream_object_parts(
+        self, object_key: str, bytes_range: tuple[int, int], chunk_size: int = CHUNK_SIZE
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Streams a byte range of an object by splitting it into parts of download_part_size bytes, which are fetched
+        with up to download_concurrency ranged GETs in parallel and yielded in order. At most download_concurrency
+        parts (including the one being yielded) are held in memory at once.
+        """
+
+        start, end = bytes_range
+        part_ranges = deque(
+            (part_start, min(part_start + self.download_part_size, end + 1) - 1)
+            for part_start in range(start, end + 1, self.download_part_size)
+        )
+        s3_download_parts.observe(len(part_ranges))
+
+        pending: deque[asyncio.Task[list[bytes]]] = deque()
+
+        def fill() -> None:
+            while part_ranges and len(pending) < self.download_concurrency:
+                pending.append(asyncio.create_task(self._read_part(object_key, part_ranges.popleft(), chunk_size)))
+
+        try:
+            fill()
+            while pending:
+                for chunk in await pending[0]:
                     yield chunk
+                # Only fetch the next part once this one has been handed off, to bound the memory used
+                pending.popleft()
+                fill()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
+    async def get_s3_object_dict(self, location: str, bytes_range: tuple[int, int] | None = None) -> S3ObjectGenerator:
+        """
+        Fetches an object (or a byte range of it), returning its headers (taken from the GET response; no separate HEAD
+        request is made) and a stream over its bytes, which must be exhausted or closed (even if it is never iterated) to
+        release the connection.
+        """
+
+        response = await self._get_object(self._location_to_object_key(location), bytes_range)
         return {
-            "generator": stream_object(),
-            "headers": headers,
+            "generator": S3BodyStream(response["Body"], self.chunk_size(response["ContentLength"])),
+            "headers": {
+                "Content-Length": str(response["ContentLength"]),
+                "Content-Type": response["ContentType"],
+                "ETag": response["ETag"],
+                "Last-Modified": str(response["LastModified"]),
+            },
         }
 
-    async def save(self, current_location: str, filename: str) -> str:
-        async with await self._create_s3_client() as s3_client:
-            transfer_config = S3TransferConfig(
-                multipart_threshold=5 * 1024 * 1024,  # 5MB threshold for multipart
-                multipart_chunksize=5 * 1024 * 1024,  # 5MB chunk size
-            )
-            await s3_client.upload_file(
-                Bucket=self.bucket_name, Key=filename, Filename=current_location, Config=transfer_config
-            )
-            location = self._build_s3_location(filename)
-            return location
+    async def generate_presigned_url(
+        self,
+        location: str,
+        expires_in: int,
+        content_disposition: str | None = None,
+        content_type: str | None = None,
+    ) -> str:
+        """
+        Generates a URL which can be used to GET the object at a location (or byte ranges of it) directly from S3,
+        without further authentication, for the next expires_in seconds. S3 serves the object with the given
+        Content-Disposition and Content-Type headers, if set.
+        """
+
+        params = {"Bucket": self.bucket_name, "Key": self._location_to_object_key(location)}
+        if content_disposition:
+            params["ResponseContentDisposition"] = content_disposition
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return await self._s3_call(
+            "generate_presigned_url", ClientMethod="get_object", Params=params, ExpiresIn=expires_in
+        )
+
+    async def save(
+        self,
+        current_location: str,
+        filename: str,
+        move: bool = False,
+        checksum: str | None = None,
+        progress: Callable[[int], None] | None = None,
+    ) -> str:
+        size = await run_blocking(os.path.getsize, current_location)
+        chunk_size = multipart_chunk_size(size, self.multipart_chunk_size)
+        start_time = time.perf_counter()
+
+        transfer_config = S3TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            # Upload up to max_concurrency parts in parallel, buffering no more parts than that in memory
+            max_request_concurrency=self.max_concurrency,
+            max_io_queue_size=self.max_concurrency,
+        )
+        await self._s3_call(
+            "upload_file",
+            Bucket=self.bucket_name,
+            Key=filename,
+            Filename=current_location,
+            Config=transfer_config,
+            Callback=progress,  # called with the number of bytes sent as each part is uploaded
+        )
+        location = self._build_s3_location(filename)
+
+        s3_upload_parts.observe(max(math.ceil(size / chunk_size), 1))
+        ingest_bytes.labels(backend="s3").inc(size)
+        ingest_duration.labels(backend="s3").observe(time.perf_counter() - start_time)
+
+        return location
 
-    async def delete(self, location: str) -> None:
+    async def create_multipart_upload(self, location: str) -> str:
         object_key = self._location_to_object_key(location)
-        async with await self._create_s3_client() as s3_client:
-            await s3_client.delete_object(Bucket=self.bucket_name, Key=object_key)
-
-    async def get_stream_generator(
-        self, location: str, bytes_range: tuple[int, int] | None = None
-    ) -> Generator[bytes, None, None]:
-        s3_dict = await self.get_s3_object_dict(location, bytes_range)
-        return sync_generator_stream(s3_dict["generator"], self.logger)
+        res = await self._s3_call("create_multipart_upload", Bucket=self.bucket_name, Key=object_key)
+        return res["UploadId"]
+
+    async def upload_part(self, location: str, upload_id: str, part_number: int, data: bytes) -> str:
+        object_key = self._location_to_object_key(location)
+        res = await self._s3_call(
+            "upload_part",
+            Bucket=self.bucket_name,
+            Key=object_key,
+            PartNumber=part_number,
+            UploadId=upload_id,
+            Body=data,
+        )
+        return res["ETag"]
+
+    async def complete_multipart_upload(self, location: str, upload_id: str, etags: list[str]) -> None:
+        # etags must be the ETags of parts 1, 2, ..., in order
+        object_key = self._location_to_object_key(location)
+        await self._s3_call(
+            "complete_multipart_upload",
+            Bucket=self.bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [{"ETag": etag, "PartNumber": i} for i, etag in enumerate(etags, 1)]},
+        )
+
+    async def abort_multipart_upload(self, location: str, upload_id: str) -> None:
+        object_key = self._location_to_object_key(location)
+        await self._s3_call("abort_multipart_upload", Bucket=self.bucket_name, Key=object_key, UploadId=upload_id)
+
+    async def delete(self, location: str, checksum: str | None = None) -> None:
+        object_key = self._location_to_object_key(location)
+        await self._s3_call("delete_object", Bucket=self.bucket_name, Key=object_key)
+        if self.cache is not None and checksum is not None:
+            await run_blocking(self.cache.remove, location, checksum)
+
+    def stream(
+        self,
+        location: str,
+        range: tuple[int, int] | None = None,
+        checksum: str | None = None,
+        size: int | None = None,
+    ) -> AsyncGenerator[bytes, None]:
+        # Downloads already know the object's size and type from its DRS record, so no headers are needed: the stream
+        # issues just the (ranged) GET(s), once it is first iterated.
+        object_key = self._location_to_object_key(location)
+        chunk_size = self.chunk_size(range[1] + 1 - range[0] if range else size)
+
+        def fetch(bytes_range: tuple[int, int] | None) -> AsyncGenerator[bytes, None]:
+            # Large reads of known length are split into parts which are fetched in parallel, if enabled
+            span = bytes_range or ((0, size - 1) if size else None)
+            if self.download_concurrency > 1 and span and span[1] + 1 - span[0] > self.download_part_size:
+                return self._stream_object_parts(object_key, span, chunk_size)
+            return self._stream_object(object_key, bytes_range, chunk_size)
+
+        if self.cache is not None and checksum is not None:
+            return self.cache.stream(location, checksum, range, fetch, chunk_size)
+
+        return fetch(range)
 
     def _location_to_object_key(self, location: str) -> str:
         if location.startswith(f"s3://{self.bucket_name}"):
@@ -0,0 +1,160 @@
+import fcntl
+import hashlib
+import io
+import os
+import re
+import time
+from collections.abc import AsyncGenerator, Callable
+from contextlib import suppress
+from logging import Logger
+from pathlib import Path
+from uuid import uuid4
+
+from chord_drs.constants import CHUNK_SIZE
+from chord_drs.metrics import (
+    s3_cache_bytes_saved,
+    s3_cache_evictions,
+    s3_cache_hits,
+    s3_cache_misses,
+)
+from chord_drs.utils import IncrementalChecksum, run_blocking
+
+from .local import FileRange
+
+__all__ = [
+    "DEFAULT_S3_CACHE_MAX_SIZE",
+    "S3DiskCache",
+]
+
+DEFAULT_S3_CACHE_MAX_SIZE = 10 * 1024 * 1024 * 1024  # 10 GB
+
+RE_CACHE_ENTRY = re.compile(r"^[0-9a-f]{64}$")
+
+# Partially-written entries older than this (in seconds) were left behind by a process which stopped mid-stream
+STALE_TMP_AFTER = 24 * 60 * 60
+
+
+class S3DiskCache:
+    """
+    Read-through cache of S3 objects' bytes in a local directory, shared by all processes using the directory. Entries
+    are keyed by location and SHA-256 checksum, and are written while an object is streamed from S3 in full, only being
+    added to the cache if the bytes match the checksum. Any (full or ranged) reads of a cached object are then served
+    from disk. Once the cache exceeds its maximum size, the least recently used entries are evicted; each entry's
+    modification time is its last use.
+    """
+
+    def __init__(self, directory: str | Path, max_size: int, logger: Logger):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.logger = logger
+
+    def _entry_path(self, location: str, checksum: str) -> Path:
+        return self.directory / hashlib.sha256(f"{location}\0{checksum}".encode()).hexdigest()
+
+    def _open_entry(self, location: str, checksum: str, range: tuple[int, int] | None) -> FileRange | None:
+        path = self._entry_path(location, checksum)
+        try:
+            fh = FileRange(path, *((range[0], range[1] + 1) if range else ()))
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mark as recently used
+        return fh
+
+    def remove(self, location: str, checksum: str) -> None:
+        """
+        Removes the cached copy of an object, if any, e.g. once the object itself is deleted from S3.
+        """
+
+        self._entry_path(location, checksum).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        # Lock the cache directory, so that processes evicting at the same time don't each remove too much
+        with open(self.directory / ".lock", "w") as lock_fh:
+            fcntl.flock(lock_fh, fcntl.LOCK_EX)
+
+            entries: list[tuple[os.stat_result, Path]] = []
+            for entry in os.scandir(self.directory):
+                with suppress(FileNotFoundError):
+                    if RE_CACHE_ENTRY.match(entry.name):
+                        entries.append((entry.stat(), Path(entry.path)))
+                    elif entry.name.startswith("tmp-") and entry.stat().st_mtime < time.time() - STALE_TMP_AFTER:
+                        os.unlink(entry.path)
+
+            total_size = sum(st.st_size for st, _ in entries)
+            for st, path in sorted(entries, key=lambda e: e[0].st_mtime):
+                if total_size <= self.max_size:
+                    break
+                self.logger.info("evicting cached S3 object %s (%d bytes)", path.name, st.st_size)
+                path.unlink(missing_ok=True)
+                total_size -= st.st_size
+                s3_cache_evictions.inc()
+
+    async def stream(
+        self,
+        location: str,
+        checksum: str,
+        range: tuple[int, int] | None,
+        fetch: Callable[[tuple[int, int] | None], AsyncGenerator[bytes, None]],
+        chunk_size: int = CHUNK_SIZE,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Streams the bytes (in the range, inclusive, if given) of the object at a location, from the cache if possible,
+        in chunks of chunk_size bytes. Otherwise, they are streamed from fetch(range), and if the whole object is being
+        read, cached along the way.
+        """
+
+        if (fh := await run_blocking(self._open_entry, location, checksum, range)) is not None:
+            s3_cache_hits.inc()
+            try:
+                while chunk := await run_blocking(fh.read, chunk_size):
+                    s3_cache_bytes_saved.inc(len(chunk))
+                    yield chunk
+            finally:
+                fh.close()
+            return
+
+        s3_cache_misses.inc()
+
+        if range is not None:
+            # Only full reads fill the cache; a range alone is not enough to verify the object's checksum against.
+            async for chunk in fetch(range):
+                yield chunk
+            return
+
+        entry_path = self._entry_path(location, checksum)
+        tmp_path = self.directory / f"tmp-{uuid4()}"
+        tmp_fh = io.FileIO(tmp_path, "wb")
+        written = IncrementalChecksum()
+
+        def write(data: bytes) -> None:
+            tmp_fh.write(data)
+            written.update(data)
+
+        filling = True
+        try:
+            async for chunk in fetch(None):
+                if filling:
+                    if written.size + len(chunk) > self.max_size:  # Too large to ever fit in the cache
+                        filling = False
+                    else:
+                        await run_blocking(write, chunk)
+                yield chunk
+
+            tmp_fh.close()
+
+            if filling:
+                if written.hexdigest() == checksum:
+                    os.rename(tmp_path, entry_path)
+                    self.logger.debug("cached S3 object %s (%d bytes) at %s", location, written.size, entry_path)
+                    await run_blocking(self._evict)
+                else:
+                    self.logger.warning(
+                        "not caching S3 object %s: checksum mismatch (expected %s, got %s)",
+                        location,
+                        checksum,
+                        written.hexdigest(),
+                    )
+        finally:
+            tmp_fh.close()
+            tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,106 @@
+import asyncio
+import re
+from collections.abc import AsyncGenerator, Sequence
+from contextlib import suppress
+
+from bento_lib.streaming.exceptions import StreamingBadRange
+from bento_lib.streaming.range import parse_range_header
+
+from .exceptions import TooManyRanges
+
+__all__ = [
+    "parse_byte_ranges",
+    "multipart_byteranges_length",
+    "stream_multipart_byteranges",
+]
+
+BYTE_RANGE_SPLIT = re.compile(r",\s*")
+
+
+def parse_byte_ranges(
+    range_header: str, content_length: int, max_ranges: int | None = None
+) -> tuple[tuple[int, int], ...]:
+    """
+    Parses a Range header into sorted, start/end-inclusive byte intervals, like bento_lib's parse_range_header, except
+    that overlapping and adjacent intervals are coalesced rather than rejected, so that every byte is sent at most once.
+    Raises a StreamingException subclass if any interval is invalid or not satisfiable, or TooManyRanges (before parsing
+    any of them) if the header lists more than max_ranges intervals.
+    """
+
+    if not range_header.startswith("bytes="):
+        raise StreamingBadRange("only bytes range headers are supported")
+
+    specs = BYTE_RANGE_SPLIT.split(range_header.removeprefix("bytes="))
+    if max_ranges is not None and len(specs) > max_ranges:
+        raise TooManyRanges(f"too many ranges requested ({len(specs)} > {max_ranges})")
+
+    intervals = sorted(parse_range_header(f"bytes={iv}", content_length)[0] for iv in specs)
+
+    coalesced: list[tuple[int, int]] = [intervals[0]]
+    for start, end in intervals[1:]:
+        last_start, last_end = coalesced[-1]
+        if start <= last_end + 1:
+            coalesced[-1] = (last_start, max(last_end, end))
+        else:
+            coalesced.append((start, end))
+
+    return tuple(coalesced)
+
+
+def _part_header(boundary: str, content_type: str, interval: tuple[int, int], content_length: int) -> bytes:
+    start, end = interval
+    return (
+        f"\r\n--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {start}-{end}/{content_length}\r\n\r\n"
+    ).encode("ascii")
+
+
+def _closing_delimiter(boundary: str) -> bytes:
+    return f"\r\n--{boundary}--\r\n".encode("ascii")
+
+
+def multipart_byteranges_length(
+    intervals: Sequence[tuple[int, int]], boundary: str, content_type: str, content_length: int
+) -> int:
+    """
+    Returns the exact length of the multipart/byteranges body generated by stream_multipart_byteranges.
+    """
+    return sum(
+        len(_part_header(boundary, content_type, iv, content_length)) + iv[1] + 1 - iv[0] for iv in intervals
+    ) + len(_closing_delimiter(boundary))
+
+
+async def stream_multipart_byteranges(
+    streams: Sequence[AsyncGenerator[bytes, None]],
+    intervals: Sequence[tuple[int, int]],
+    boundary: str,
+    content_type: str,
+    content_length: int,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Generates a multipart/byteranges body (RFC 9110, section 14.6) from one stream of bytes per interval. While a part
+    is being sent, the first chunk of the next part is already fetched, so that (e.g.) the next S3 GET is in flight.
+    All streams are closed once the body has been generated, or if generating it is interrupted.
+    """
+
+    prefetched: asyncio.Future | None = None
+
+    try:
+        for i, (stream, interval) in enumerate(zip(streams, intervals, strict=True)):
+            first_chunk = await (prefetched if prefetched is not None else anext(stream, b""))
+            prefetched = asyncio.ensure_future(anext(streams[i + 1], b"")) if i + 1 < len(streams) else None
+
+            yield _part_header(boundary, content_type, interval, content_length)
+            if first_chunk:
+                yield first_chunk
+            async for chunk in stream:
+                yield chunk
+
+        yield _closing_delimiter(boundary)
+
+    finally:
+        if prefetched is not None:
+            prefetched.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration):
+                await prefetched
+        for stream in streams:
+            await stream.aclose()
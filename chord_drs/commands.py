@@ -1,13 +1,17 @@
 import asyncio
+import fnmatch
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import wraps
 
 import click
 from click import ClickException
-from flask import current_app
+from flask import Flask, current_app
 from flask.cli import with_appcontext
 
+from .backend import get_backend
 from .db import db
 from .models import DrsBlob
 
@@ -20,21 +24,42 @@ def async_wrapper(f):
     return wrapper
 
 
-async def create_drs_blob(
-    location: str,
-    project_id: str | None = None,
-    dataset_id: str | None = None,
-    data_type: str | None = None,
-) -> None:
-    drs_blob = await DrsBlob.create(
-        location=location,
-        project_id=project_id,
-        dataset_id=dataset_id,
-        data_type=data_type,
-    )
-    db.session.add(drs_blob)
+def _create_drs_blob_in_thread(app: Flask, location: str, size: int, in_place: bool = False, **kwargs) -> DrsBlob:
+    # Each worker thread needs its own application context (and thus its own backend instance.) The new blob is only
+    # added to the database session by the main thread.
+    with app.app_context():
+        if in_place:
+            location = get_backend().in_place_location(location)
+        return asyncio.run(
+            DrsBlob.create(location=location, size=size, in_place=in_place, registered_in_place=in_place, **kwargs)
+        )
+
+
+def _matches(rel_path: str, patterns: tuple[str, ...]) -> bool:
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(os.path.basename(rel_path), p) for p in patterns)
+
+
+def find_files(source: str, include: tuple[str, ...] = (), exclude: tuple[str, ...] = ()) -> list[str]:
+    """
+    Lists the files to ingest from a source path: the file itself, or all files under a directory (recursively) which
+    match at least one of the include globs (if any are given) and none of the exclude globs. Globs are matched against
+    both the file's path relative to the source directory and its name.
+    """
+
+    if os.path.isfile(source):
+        return [source]
 
-    current_app.logger.info(f"Created a new blob, filename: {drs_blob.location} ID : {drs_blob.id}")
+    files: list[str] = []
+    for dir_path, dir_names, file_names in os.walk(source):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            path = os.path.join(dir_path, file_name)
+            rel_path = os.path.relpath(path, source)
+            if (include and not _matches(rel_path, include)) or _matches(rel_path, exclude):
+                continue
+            files.append(path)
+
+    return files
 
 
 @click.command("ingest")
@@ -42,28 +67,125 @@ async def create_drs_blob(
 @click.option("--project", default="", help="Project ID this object is attached to.")
 @click.option("--dataset", default="", help="Dataset ID this object is attached to.")
 @click.option("--data-type", default="", help="Data type this object is attached to.")
+@click.option("--include", multiple=True, help="Only ingest files matching this glob (can be repeated.)")
+@click.option("--exclude", multiple=True, help="Skip files matching this glob (can be repeated.)")
+@click.option("--workers", default=4, show_default=True, help="Number of files to hash and save in parallel.")
+@click.option("--batch-size", default=500, show_default=True, help="Number of objects to insert per transaction.")
+@click.option(
+    "--in-place",
+    is_flag=True,
+    help="Register files where they are instead of copying them (they must be in DRS_LOCAL_IN_PLACE_ROOTS.)",
+)
 @async_wrapper
 @with_appcontext
-async def ingest(source: str, project: str, dataset: str, data_type: str) -> None:
+async def ingest(
+    source: str,
+    project: str,
+    dataset: str,
+    data_type: str,
+    include: tuple[str, ...],
+    exclude: tuple[str, ...],
+    workers: int,
+    batch_size: int,
+    in_place: bool,
+) -> None:
     """
     When provided with a file or a directory, this command will add these
     to our list of objects, to be served by the application.
 
-    Should we go through the directories recursively?
+    Directories are ingested recursively. Files which have already been
+    ingested from the same path, with the same size and modification time,
+    are skipped, so an interrupted ingest can simply be re-run.
+
+    With --in-place, files are hashed but not copied: their current paths
+    are recorded as the objects' locations, and they are never deleted by
+    the service.
     """
 
-    current_app.logger.setLevel(logging.INFO)
+    logger = current_app.logger
+    logger.setLevel(logging.INFO)
     # TODO: ingestion for remote files or archives
 
     if not os.path.exists(source):
         raise ClickException("Path provided does not exist")
 
+    if workers < 1 or batch_size < 1:
+        raise ClickException("Worker count and batch size must be positive")
+
     source = os.path.abspath(source)
 
     perms_kwargs = {"project_id": project or None, "dataset_id": dataset or None, "data_type": data_type or None}
 
-    if not os.path.isfile(source):
-        raise ClickException("Directories cannot be ingested")
+    # Skip files which were already ingested from the same path and haven't changed since
+    ingested: set[tuple[str, int, int]] = set(
+        db.session.query(DrsBlob.source_path, DrsBlob.size, DrsBlob.source_mtime_ns).filter(
+            DrsBlob.source_path.isnot(None)
+        )
+    )
+
+    to_ingest: list[tuple[str, os.stat_result]] = []
+    n_skipped = 0
+    for path in find_files(source, include, exclude):
+        st = os.stat(path)
+        if (path, st.st_size, st.st_mtime_ns) in ingested:
+            n_skipped += 1
+        else:
+            to_ingest.append((path, st))
+
+    total_bytes = sum(st.st_size for _, st in to_ingest)
+    logger.info(
+        f"Ingesting {len(to_ingest)} files ({total_bytes} bytes) with {workers} workers; skipping {n_skipped} files "
+        f"which were already ingested"
+    )
+
+    app = current_app._get_current_object()
+    n_ingested = 0
+    n_failed = 0
+    ingested_bytes = 0
+    batch: list[DrsBlob] = []
+    start_time = time.perf_counter()
+
+    def _commit_batch():
+        db.session.add_all(batch)
+        db.session.commit()
+        batch.clear()
+
+    with (
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="drs-ingest") as executor,
+        click.progressbar(length=total_bytes, label="Ingesting", show_pos=True) as progress,
+    ):
+        futures = {
+            executor.submit(_create_drs_blob_in_thread, app, path, st.st_size, in_place, **perms_kwargs): (path, st)
+            for path, st in to_ingest
+        }
+
+        for future in as_completed(futures):
+            path, st = futures[future]
+            progress.update(st.st_size)
+
+            try:
+                drs_blob = future.result()
+            except Exception as e:
+                logger.exception(f"Could not ingest {path}", exc_info=e)
+                n_failed += 1
+                continue
+
+            drs_blob.source_path = path
+            drs_blob.source_mtime_ns = st.st_mtime_ns
+            batch.append(drs_blob)
+            n_ingested += 1
+            ingested_bytes += st.st_size
+
+            if len(batch) >= batch_size:
+                _commit_batch()
+
+        _commit_batch()
+
+    elapsed = max(time.perf_counter() - start_time, 1e-6)
+    logger.info(
+        f"Ingested {n_ingested} files ({ingested_bytes} bytes) in {elapsed:.1f}s "
+        f"({n_ingested / elapsed:.1f} files/s, {ingested_bytes / 1024 / 1024 / elapsed:.1f} MB/s)"
+    )
 
-    await create_drs_blob(source, **perms_kwargs)
-    db.session.commit()
+    if n_failed:
+        raise ClickException(f"{n_failed} files could not be ingested")
@@ -72,6 +72,36 @@ class Config:
     S3_REGION_NAME: str | None = os.environ.get("S3_REGION_NAME")
     S3_VALIDATE_SSL: bool = str_to_bool(os.environ.get("S3_VALIDATE_SSL", "false"))
     S3_USE_HTTPS: bool = str_to_bool(os.environ.get("S3_USE_HTTPS", "true"))
+    # Whether uploaded files should be streamed directly into S3 as they are received, rather than being written to
+    # a temporary file in DRS_INGEST_TMP_DIR first. Deduplication then happens after the upload to S3 has finished.
+    S3_STREAM_INGEST: bool = str_to_bool(os.environ.get("S3_STREAM_INGEST", "false"))
+    # Multipart upload tuning: part size (in bytes; automatically increased for files too large to fit in 10,000 parts)
+    # and the number of parts uploaded in parallel, which also bounds the number of parts buffered in memory.
+    S3_MULTIPART_CHUNK_SIZE: int = int(os.environ.get("S3_MULTIPART_CHUNK_SIZE", str(16 * 1024 * 1024)))
+    S3_MAX_CONCURRENCY: int = int(os.environ.get("S3_MAX_CONCURRENCY", "8"))
+    # Parallel read-ahead for downloads: reads larger than S3_DOWNLOAD_PART_SIZE bytes are split into parts, of which
+    # up to S3_DOWNLOAD_CONCURRENCY are fetched at once with ranged GETs and buffered in memory. 1 (the default) disables
+    # read-ahead, so that each download is a single GET.
+    S3_DOWNLOAD_CONCURRENCY: int = int(os.environ.get("S3_DOWNLOAD_CONCURRENCY", "1"))
+    S3_DOWNLOAD_PART_SIZE: int = int(os.environ.get("S3_DOWNLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+    # Connection pooling: each worker process shares long-lived S3 clients between all requests, each keeping up to
+    # S3_MAX_POOL_CONNECTIONS connections open, and reusing idle ones for up to S3_KEEPALIVE_TIMEOUT seconds.
+    # Timeouts are in seconds.
+    S3_MAX_POOL_CONNECTIONS: int = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", "50"))
+    S3_CONNECT_TIMEOUT: float = float(os.environ.get("S3_CONNECT_TIMEOUT", "10"))
+    S3_READ_TIMEOUT: float = float(os.environ.get("S3_READ_TIMEOUT", "60"))
+    S3_KEEPALIVE_TIMEOUT: float = float(os.environ.get("S3_KEEPALIVE_TIMEOUT", "60"))
+    # Optional read-through cache of S3 objects on local disk: objects read in full are stored in S3_CACHE_DIR (if set)
+    # once their checksum has been verified, and later reads are served from there. The least recently used objects
+    # are evicted once the cache grows past S3_CACHE_MAX_SIZE bytes (10 GB by default.)
+    S3_CACHE_DIR: str | None = os.environ.get("S3_CACHE_DIR", "").strip() or None
+    S3_CACHE_MAX_SIZE: int = int(os.environ.get("S3_CACHE_MAX_SIZE", str(10 * 1024 * 1024 * 1024)))
+    # Presigned URLs let clients fetch objects directly from S3 rather than through this service. If enabled, objects
+    # get an access ID which can be exchanged for a URL valid for S3_PRESIGNED_URL_EXPIRY seconds, and if
+    # S3_DOWNLOAD_REDIRECT is also set, downloads are redirected to such a URL.
+    S3_PRESIGNED_URLS: bool = str_to_bool(os.environ.get("S3_PRESIGNED_URLS", "false"))
+    S3_PRESIGNED_URL_EXPIRY: int = int(os.environ.get("S3_PRESIGNED_URL_EXPIRY", "300"))
+    S3_DOWNLOAD_REDIRECT: bool = str_to_bool(os.environ.get("S3_DOWNLOAD_REDIRECT", "false"))
     BENTO_DEBUG: bool = BENTO_DEBUG
     BENTO_VALIDATE_SSL: bool = BENTO_VALIDATE_SSL
     BENTO_CONTAINER_LOCAL: bool = str_to_bool(os.environ.get("BENTO_CONTAINER_LOCAL", "false"))
@@ -80,6 +110,66 @@ class Config:
     # choose to write temporary files to a volume bound to a host directory with sufficient space for ingesting large
     # files such as reference genomes.
     DRS_INGEST_TMP_DIR: str | None = os.environ.get("DRS_INGEST_TMP_DIR", "").strip() or None
+    # Whether the local backend may hard-link files ingested by path into the data directory when they cannot be
+    # reflinked. This avoids a copy if they're on the same filesystem, but the object's bytes will then change if the
+    # original file is modified in place, so this is off by default. Uploaded files are always moved into place
+    # without copying if DRS_INGEST_TMP_DIR is on the same filesystem as the data directory.
+    DRS_LOCAL_HARDLINK_INGEST: bool = str_to_bool(os.environ.get("DRS_LOCAL_HARDLINK_INGEST", "false"))
+    # Whether the local backend should store new files at content-addressed paths (sha256/ab/cd/<SHA-256 checksum>)
+    # instead of directly in the data directory. Identical bytes are then only ever stored once, and the number of
+    # entries per directory stays bounded. Objects stored with the flat layout remain accessible either way.
+    DRS_LOCAL_CONTENT_ADDRESSED: bool = str_to_bool(os.environ.get("DRS_LOCAL_CONTENT_ADDRESSED", "false"))
+    # Directories (separated by the OS path separator, e.g. :) containing files which may be registered as objects in
+    # place, i.e. recorded at their current path instead of being copied into the data directory. Registered files are
+    # never deleted by the service. Only supported with the local backend; empty (disabled) by default.
+    DRS_LOCAL_IN_PLACE_ROOTS: tuple[str, ...] = tuple(
+        str(Path(r).expanduser().resolve())
+        for r in os.environ.get("DRS_LOCAL_IN_PLACE_ROOTS", "").split(os.pathsep)
+        if r
+    )
+    # Whether downloads from the local backend should be served by the reverse proxy in front of the service, rather
+    # than streamed through it: "x-accel-redirect" (nginx) responds with an X-Accel-Redirect header pointing to the
+    # file's path under DRS_LOCAL_OFFLOAD_PREFIX, an internal proxy location mapped to the data directory; "x-sendfile"
+    # (Apache, lighttpd, ...) responds with an X-Sendfile header containing the file's absolute path. Empty (disabled)
+    # by default.
+    DRS_LOCAL_OFFLOAD: str = os.environ.get("DRS_LOCAL_OFFLOAD", "").strip().lower()
+    DRS_LOCAL_OFFLOAD_PREFIX: str = os.environ.get("DRS_LOCAL_OFFLOAD_PREFIX", "/drs-data/")
+    # Checksum algorithms to compute for new objects in addition to SHA-256, in the same pass over their bytes; any of
+    # md5, sha-1, sha-512, blake2b or crc32c (which requires the crc32c package), separated by commas.
+    DRS_CHECKSUM_ALGORITHMS: tuple[str, ...] = tuple(
+        a for a in map(str.strip, os.environ.get("DRS_CHECKSUM_ALGORITHMS", "").lower().split(",")) if a
+    )
+    # Maximum number of threads used for blocking file work (hashing, copying, ...) during ingests, which bounds how many
+    # files are processed at once without requests blocking each other's event loops.
+    DRS_IO_WORKERS: int = int(os.environ.get("DRS_IO_WORKERS", "8"))
+    # Maximum number of asynchronous ingest jobs (see the async parameter of /ingest) run at once by each process.
+    DRS_INGEST_JOB_WORKERS: int = int(os.environ.get("DRS_INGEST_JOB_WORKERS", "2"))
+    # Directory which uploads are kept in until their asynchronous ingest job has finished. It must persist across
+    # restarts (like the database, which it defaults to being next to) so that interrupted jobs can be resumed.
+    DRS_INGEST_JOB_DIR: str = os.environ.get("DRS_INGEST_JOB_DIR", "").strip() or os.path.join(BASEDIR, "ingest_jobs")
+    # Maximum number of ranges accepted in a download's Range header. Requests for more are answered with the whole
+    # object, as if no Range header had been sent.
+    DRS_MAX_RANGES: int = int(os.environ.get("DRS_MAX_RANGES", "50"))
+    # Optional in-memory cache of fixed-size blocks of objects' bytes, shared by all requests in a process, which small
+    # ranged downloads (of at most DRS_BLOCK_CACHE_MAX_RANGE bytes) are assembled from. Holds up to DRS_BLOCK_CACHE_SIZE
+    # bytes of blocks (0, the default, disables it), evicting the least recently used ones first.
+    DRS_BLOCK_CACHE_SIZE: int = int(os.environ.get("DRS_BLOCK_CACHE_SIZE", "0"))
+    DRS_BLOCK_CACHE_BLOCK_SIZE: int = int(os.environ.get("DRS_BLOCK_CACHE_BLOCK_SIZE", str(64 * 1024)))
+    DRS_BLOCK_CACHE_MAX_RANGE: int = int(os.environ.get("DRS_BLOCK_CACHE_MAX_RANGE", str(1024 * 1024)))
+    # Bounds on the size of the chunks which downloads are streamed in: each transfer is split into chunks of at least
+    # DRS_STREAM_MIN_CHUNK_SIZE bytes (unless smaller), growing with its length up to the backend's maximum chunk size.
+    DRS_STREAM_MIN_CHUNK_SIZE: int = int(os.environ.get("DRS_STREAM_MIN_CHUNK_SIZE", str(64 * 1024)))
+    DRS_LOCAL_STREAM_MAX_CHUNK_SIZE: int = int(os.environ.get("DRS_LOCAL_STREAM_MAX_CHUNK_SIZE", str(1024 * 1024)))
+    S3_STREAM_MAX_CHUNK_SIZE: int = int(os.environ.get("S3_STREAM_MAX_CHUNK_SIZE", str(1024 * 1024)))
+    # Default chunk size (in bytes) for resumable upload sessions, if the client doesn't request one. With the S3
+    # backend, chunks are multipart upload parts, so the chunk size is raised to S3's minimum part size if needed.
+    DRS_UPLOAD_CHUNK_SIZE: int = int(os.environ.get("DRS_UPLOAD_CHUNK_SIZE", str(16 * 1024 * 1024)))
+    # Largest chunk size (in bytes) an upload session may use. With the S3 backend, each chunk is buffered in memory
+    # while it is received, so this bounds the memory used by a chunk upload request.
+    DRS_UPLOAD_MAX_CHUNK_SIZE: int = int(os.environ.get("DRS_UPLOAD_MAX_CHUNK_SIZE", str(128 * 1024 * 1024)))
+    # Upload sessions which have not been finalized this many seconds (7 days, by default) after being created are
+    # discarded, along with their temporary files or S3 multipart uploads.
+    DRS_UPLOAD_SESSION_TTL: int = int(os.environ.get("DRS_UPLOAD_SESSION_TTL", str(7 * 24 * 60 * 60)))
 
     # CORS
     CORS_ORIGINS: list[str] | str = [x for x in os.environ.get("CORS_ORIGINS", "").split(";") if x] or "*"
@@ -11,6 +11,14 @@ __all__ = [
     "RE_INGESTABLE_MIME_TYPE",
     "MIME_OCTET_STREAM",
     "CHUNK_SIZE",
+    "DEFAULT_MIN_CHUNK_SIZE",
+    "DEFAULT_LOCAL_MAX_CHUNK_SIZE",
+    "DEFAULT_S3_MAX_CHUNK_SIZE",
+    "ACCESS_ID_S3_PRESIGNED",
+    "INGEST_JOB_QUEUED",
+    "INGEST_JOB_RUNNING",
+    "INGEST_JOB_SUCCEEDED",
+    "INGEST_JOB_FAILED",
 ]
 
 BENTO_SERVICE_KIND = "drs"
@@ -30,4 +38,19 @@ RE_INGESTABLE_MIME_TYPE = re.compile(
     r"(;\s?[a-zA-Z0-9\-_.]+=\"?[a-zA-Z0-9\-_./+ ]*\"?)?$"
 )
 MIME_OCTET_STREAM = "application/octet-stream"
-CHUNK_SIZE = 1024 * 128  # Read 128 KB at a time
+CHUNK_SIZE = 1024 * 128  # Read 128 KB at a time (by default; backends choose streaming chunk sizes per transfer)
+
+# Bounds on backends' streaming chunk sizes (see Backend.chunk_size and the DRS_STREAM_MIN_CHUNK_SIZE,
+# DRS_LOCAL_STREAM_MAX_CHUNK_SIZE and S3_STREAM_MAX_CHUNK_SIZE config options)
+DEFAULT_MIN_CHUNK_SIZE = 1024 * 64  # 64 KB
+DEFAULT_LOCAL_MAX_CHUNK_SIZE = 1024 * 1024  # 1 MB
+DEFAULT_S3_MAX_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Access ID which can be exchanged for a presigned S3 URL (see the S3_PRESIGNED_URLS config option)
+ACCESS_ID_S3_PRESIGNED = "s3-presigned"
+
+# Ingest job statuses
+INGEST_JOB_QUEUED = "queued"
+INGEST_JOB_RUNNING = "running"
+INGEST_JOB_SUCCEEDED = "succeeded"
+INGEST_JOB_FAILED = "failed"
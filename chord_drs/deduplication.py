@@ -0,0 +1,63 @@
+import logging
+
+from .models import DrsBlob
+
+__all__ = [
+    "find_duplicate_object",
+]
+
+
+def _same_resource(
+    drs_obj: DrsBlob, project_id: str | None, dataset_id: str | None, data_type: str | None, public: bool
+) -> bool:
+    return (
+        drs_obj.project_id == project_id
+        and drs_obj.dataset_id == dataset_id
+        and drs_obj.data_type == data_type
+        and drs_obj.public == public
+    )
+
+
+def find_duplicate_object(
+    checksum: str,
+    project_id: str | None,
+    dataset_id: str | None,
+    data_type: str | None,
+    public: bool,
+    logger: logging.Logger,
+    candidates: list[DrsBlob] | None = None,
+) -> tuple[DrsBlob | None, DrsBlob | None]:
+    """
+    Looks for an existing DRS object with the given checksum. Returns a tuple of (object to fully reuse, object whose
+    bytes can be reused), at most one of which is set. If candidates (objects with this checksum) are passed, they are
+    used instead of querying the database, and one with a matching resource is preferred.
+    """
+
+    # Currently, we require exact permissions compatibility for deduplication of IDs.
+    # It might be possible to relax this a bit, but we can't fully relax this for two reasons:
+    #  - we would need to keep track of sets of permissions for each DRS object
+    #  - certain attacks may be performable by creating a second project/dataset in a semi-public instance
+    #    and seeing which files are DRS ID duplicates.
+    # However, we can actually deduplicate the files on the filesystem as these are more opaque.
+
+    if candidates is None:
+        candidate_drs_object: DrsBlob | None = DrsBlob.query.filter_by(checksum=checksum).first()
+        candidates = [candidate_drs_object] if candidate_drs_object is not None else []
+
+    if not candidates:
+        return None, None
+
+    for candidate_drs_object in candidates:
+        if _same_resource(candidate_drs_object, project_id, dataset_id, data_type, public):
+            logger.info(f"Found duplicate DRS object via checksum (will fully deduplicate): {candidate_drs_object}")
+            return candidate_drs_object, None
+
+    candidate_drs_object = candidates[0]
+    logger.info(
+        f"Found duplicate DRS object via checksum (will deduplicate JUST bytes; req resource: "
+        f"({project_id}, {dataset_id}, {data_type}, {public}) vs existing resource: "
+        f"({candidate_drs_object.project_id}, {candidate_drs_object.dataset_id}, {candidate_drs_object.data_type}, "
+        f"{candidate_drs_object.public})): "
+        f"{candidate_drs_object}"
+    )
+    return None, candidate_drs_object
@@ -1,5 +1,12 @@
-__all__ = ["DrsBlobSaveError"]
+__all__ = [
+    "DrsBlobSaveError",
+    "TooManyRanges",
+]
 
 
 class DrsBlobSaveError(Exception):
     pass
+
+
+class TooManyRanges(Exception):
+    pass
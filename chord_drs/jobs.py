@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+from flask import Flask, current_app
+from sqlalchemy import update
+
+from .backend import get_backend
+from .constants import INGEST_JOB_FAILED, INGEST_JOB_QUEUED, INGEST_JOB_RUNNING, INGEST_JOB_SUCCEEDED
+from .db import db
+from .deduplication import find_duplicate_object
+from .models import DrsBlob, IngestJob
+from .utils import ConfigurableExecutor, drs_file_checksums, run_blocking
+
+__all__ = [
+    "DEFAULT_INGEST_JOB_WORKERS",
+    "configure_ingest_jobs",
+    "create_ingest_job",
+    "submit_ingest_job",
+    "resume_ingest_jobs",
+]
+
+DEFAULT_INGEST_JOB_WORKERS = 2
+
+# How often (in seconds) the progress of a running job is saved. Each save is a database write, so this is kept coarse;
+# it doubles as the job's heartbeat: a job which is marked as running, but whose heartbeat is older than
+# JOB_STALE_AFTER seconds, was interrupted (e.g., by a restart.)
+PROGRESS_INTERVAL = 10.0
+JOB_STALE_AFTER = 60
+# How often (in seconds) each process looks for interrupted jobs to pick up again
+JOB_SWEEP_INTERVAL = 60
+
+_job_executor = ConfigurableExecutor(DEFAULT_INGEST_JOB_WORKERS, "drs-ingest-job")
+_jobs_swept_at: float | None = None
+_jobs_sweep_lock = threading.Lock()
+
+
+def configure_ingest_jobs(max_workers: int = DEFAULT_INGEST_JOB_WORKERS) -> None:
+    """
+    (Re-)creates the process-wide thread pool which ingest jobs are run in, with the given maximum number of threads.
+    Any jobs already submitted to a previous pool are left to finish.
+    """
+
+    _job_executor.configure(max_workers)
+
+
+async def create_ingest_job(location: str, job_dir: str, owned: bool = False, **kwargs) -> IngestJob:
+    """
+    Creates (but does not save or submit) an ingest job for the file at a location. If owned is set and the location is
+    a temporary file holding an upload, the file is moved into job_dir, so that it outlives the request which received
+    it (and the process, if it is restarted before the job is done.) Keyword arguments are the other properties of the
+    job.
+    """
+
+    job = IngestJob(id=str(uuid4()), status=INGEST_JOB_QUEUED, owned=owned, **kwargs)
+
+    if owned and not job.in_place:
+        # The request's file stream removes its temporary file when the request is torn down
+        job.location = os.path.join(job_dir, f"ingest-job-{job.id}")
+        await run_blocking(os.makedirs, job_dir, exist_ok=True)
+        await run_blocking(shutil.move, location, job.location)
+    else:
+        job.location = location
+
+    return job
+
+
+def submit_ingest_job(job_id: str) -> None:
+    """
+    Schedules a saved ingest job to run in the background, in this process's job thread pool.
+    """
+    _job_executor.get().submit(_run_ingest_job, current_app._get_current_object(), job_id)
+
+
+def _stale_before() -> datetime:
+    # Timestamps are generated by the database (CURRENT_TIMESTAMP), i.e. in UTC
+    return datetime.now(UTC).replace(tzinfo=None) - timedelta(seconds=JOB_STALE_AFTER)
+
+
+def resume_ingest_jobs() -> None:
+    """
+    Run before requests, at most once every JOB_SWEEP_INTERVAL seconds per process. Re-queues and submits jobs which are
+    marked as running, but whose heartbeat has stopped (e.g., they were interrupted by a restart), and, the first time
+    around, any jobs which were left queued. A job which several processes try to run at once is only ever run by one
+    of them - see _claim_ingest_job.
+    """
+
+    global _jobs_swept_at
+    now = time.monotonic()
+    with _jobs_sweep_lock:
+        if _jobs_swept_at is not None and now - _jobs_swept_at < JOB_SWEEP_INTERVAL:
+            return
+        first_sweep = _jobs_swept_at is None
+        _jobs_swept_at = now
+
+    stale_before = _stale_before()
+    stale_ids = [
+        job_id
+        for (job_id,) in db.session.query(IngestJob.id).filter(
+            IngestJob.status == INGEST_JOB_RUNNING, IngestJob.updated < stale_before
+        )
+    ]
+
+    requeued_ids: list[str] = []
+    for job_id in stale_ids:
+        # Only re-queue the job if no other process has done so (or its heartbeat has resumed) in the meantime
+        res = db.session.execute(
+            update(IngestJob)
+            .where(IngestJob.id == job_id, IngestJob.status == INGEST_JOB_RUNNING, IngestJob.updated < stale_before)
+            .values(status=INGEST_JOB_QUEUED)
+        )
+        if res.rowcount == 1:
+            requeued_ids.append(job_id)
+    db.session.commit()
+
+    if first_sweep:
+        job_ids = [job_id for (job_id,) in db.session.query(IngestJob.id).filter(IngestJob.status == INGEST_JOB_QUEUED)]
+    else:
+        job_ids = requeued_ids
+
+    for job_id in job_ids:
+        current_app.logger.info("resuming ingest job %s", job_id)
+        submit_ingest_job(job_id)
+
+
+def _claim_ingest_job(job_id: str) -> bool:
+    res = db.session.execute(
+        update(IngestJob)
+        .where(IngestJob.id == job_id, IngestJob.status == INGEST_JOB_QUEUED)
+        .values(status=INGEST_JOB_RUNNING, bytes_hashed=0, bytes_uploaded=0)
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def _run_ingest_job(app: Flask, job_id: str) -> None:
+    # Each job thread needs its own application context (and thus its own database session and backend instance.)
+    with app.app_context():
+        try:
+            if not _claim_ingest_job(job_id):
+                return  # Already picked up by another thread or process
+            asyncio.run(_process_ingest_job(db.session.get(IngestJob, job_id), app.logger))
+        except Exception as e:
+            app.logger.exception("encountered exception while running ingest job %s", job_id, exc_info=e)
+
+
+class _JobProgress:
+    def __init__(self):
+        self.bytes_hashed = 0
+        self.bytes_uploaded = 0
+
+    def hashed(self, n: int) -> None:
+        self.bytes_hashed += n
+
+    def uploaded(self, n: int) -> None:
+        self.bytes_uploaded += n
+
+
+async def _save_progress(job_id: str, progress: _JobProgress) -> None:
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL)
+        db.session.execute(
+            update(IngestJob)
+            .where(IngestJob.id == job_id)
+            .values(bytes_hashed=progress.bytes_hashed, bytes_uploaded=progress.bytes_uploaded)
+        )
+        db.session.commit()
+
+
+async def _process_ingest_job(job: IngestJob, logger: logging.Logger) -> None:
+    logger.info("running ingest job: %s", job)
+
+    progress = _JobProgress()
+    progress_task = asyncio.create_task(_save_progress(job.id, progress))
+
+    # Set if the bytes were streamed into the object store while being uploaded, in which case they must be removed if
+    # they end up unused.
+    uploaded_location: str | None = job.location if job.owned and job.in_place else None
+    tmp_location: str | None = job.location if job.owned and not job.in_place else None
+
+    try:
+        checksum: str | None = job.checksum
+        extra_checksums: dict[str, str] | None = job.extra_checksums
+        if checksum is None:
+            checksum, extra_checksums = await run_blocking(
+                drs_file_checksums,
+                job.location,
+                current_app.config["DRS_CHECKSUM_ALGORITHMS"],
+                progress=progress.hashed,
+            )
+        else:  # Already hashed while being uploaded
+            progress.hashed(job.size)
+
+        drs_object: DrsBlob | None = None  # either the new object, or the object to fully reuse
+        object_to_copy: DrsBlob | None = None
+
+        if job.deduplicate:
+            drs_object, object_to_copy = find_duplicate_object(
+                checksum, job.project_id, job.dataset_id, job.data_type, job.public, logger
+            )
+
+        if uploaded_location and (drs_object or object_to_copy):
+            logger.info("ingest job %s - deleting duplicate upload at %s", job.id, uploaded_location)
+            await get_backend().delete(uploaded_location)
+            uploaded_location = None
+
+        if not drs_object:
+            if object_to_copy:
+                create_kwargs = {"object_to_copy": object_to_copy}
+            else:
+                create_kwargs = {
+                    "location": job.location,
+                    "checksum": checksum,
+                    "extra_checksums": extra_checksums,
+                    "size": job.size,
+                    "progress": progress.uploaded,
+                }
+                if job.in_place:
+                    # Files which aren't owned by the job (i.e., not uploaded) are being registered in place
+                    create_kwargs.update(in_place=True, registered_in_place=not job.owned)
+                else:
+                    create_kwargs["move"] = job.owned
+
+            drs_object = await DrsBlob.create(
+                **create_kwargs,
+                filename=job.name,
+                mime_type=job.mime_type,
+                project_id=job.project_id,
+                dataset_id=job.dataset_id,
+                data_type=job.data_type,
+                public=job.public,
+            )
+    except Exception as e:
+        if isinstance(e, (ValueError, FileNotFoundError)):
+            error = str(e)
+        else:
+            logger.exception("encountered exception during ingest job %s", job.id, exc_info=e)
+            error = "Error while creating the object"
+        job.status = INGEST_JOB_FAILED
+        job.error = error[:1000]
+    else:
+        db.session.add(drs_object)
+        job.status = INGEST_JOB_SUCCEEDED
+        job.object = drs_object
+        uploaded_location = None  # Now in use by the new object
+    finally:
+        progress_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await progress_task
+
+        if uploaded_location:  # Don't leave an object without a DRS record behind in the backend
+            await get_backend().delete(uploaded_location)
+        if tmp_location:
+            with suppress(FileNotFoundError):  # File may have been moved into place by the backend already
+                os.remove(tmp_location)
+
+    job.bytes_hashed = progress.bytes_hashed
+    job.bytes_uploaded = progress.bytes_uploaded
+    db.session.commit()
+
+    logger.info("ingest job %s - %s", job.id, job.status)
@@ -1,5 +1,60 @@
+from prometheus_client import Counter, Gauge, Histogram
 from prometheus_flask_exporter import PrometheusMetrics
 
-__all__ = ["metrics"]
+__all__ = [
+    "metrics",
+    "ingest_bytes",
+    "ingest_duration",
+    "s3_upload_parts",
+    "s3_download_parts",
+    "s3_clients_created",
+    "s3_pool_size",
+    "s3_pool_in_use",
+    "s3_cache_hits",
+    "s3_cache_misses",
+    "s3_cache_evictions",
+    "s3_cache_bytes_saved",
+    "block_cache_hits",
+    "block_cache_misses",
+    "block_cache_bytes",
+]
 
 metrics = PrometheusMetrics.for_app_factory()
+
+# Ingest throughput: rate(drs_ingest_bytes_total) / rate(drs_ingest_duration_seconds_sum), per backend
+ingest_bytes = Counter("drs_ingest_bytes", "Bytes saved to the storage backend during ingest", ["backend"])
+ingest_duration = Histogram(
+    "drs_ingest_duration_seconds",
+    "Time spent saving ingested files to the storage backend",
+    ["backend"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600),
+)
+s3_upload_parts = Histogram(
+    "drs_s3_upload_parts",
+    "Number of parts per file uploaded to S3",
+    buckets=(1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+s3_download_parts = Histogram(
+    "drs_s3_download_parts",
+    "Number of parts per S3 download fetched with parallel read-ahead",
+    buckets=(2, 5, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+
+# S3 connection pool utilization: drs_s3_pool_in_use / drs_s3_pool_size, per client type (async: requests and
+# downloads, sync: uploads streamed into S3.) Clients are long-lived, so drs_s3_clients_created_total should stay flat.
+s3_clients_created = Counter("drs_s3_clients_created", "Number of pooled S3 clients created", ["client"])
+s3_pool_size = Gauge("drs_s3_pool_size", "Maximum number of connections in each pooled S3 client", ["client"])
+s3_pool_in_use = Gauge("drs_s3_pool_in_use", "Number of S3 requests currently holding a pooled connection", ["client"])
+
+# Local disk cache of S3 objects (see S3_CACHE_DIR)
+s3_cache_hits = Counter("drs_s3_cache_hits", "Number of S3 object reads served from the local disk cache")
+s3_cache_misses = Counter("drs_s3_cache_misses", "Number of S3 object reads not found in the local disk cache")
+s3_cache_evictions = Counter("drs_s3_cache_evictions", "Number of objects evicted from the local disk cache")
+s3_cache_bytes_saved = Counter(
+    "drs_s3_cache_bytes_saved", "Bytes served from the local disk cache instead of being fetched from S3"
+)
+
+# In-memory cache of blocks of objects' bytes, for small ranged reads (see DRS_BLOCK_CACHE_SIZE)
+block_cache_hits = Counter("drs_block_cache_hits", "Number of blocks read from the in-memory block cache")
+block_cache_misses = Counter("drs_block_cache_misses", "Number of blocks read from the backend on block cache misses")
+block_cache_bytes = Gauge("drs_block_cache_bytes", "Number of bytes held in the in-memory block cache")
@@ -0,0 +1,51 @@
+"""add object registered in place flag
+
+Revision ID: 6b1f0d7e3c52
+Revises: a41e6c9d2b85
+Create Date: 2026-10-17 21:04:12.581930
+
+"""
+from pathlib import Path
+
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy.sql import expression
+
+
+# revision identifiers, used by Alembic.
+revision = '6b1f0d7e3c52'
+down_revision = 'a41e6c9d2b85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('drs_object', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('registered_in_place', sa.Boolean(), nullable=False, server_default=expression.false()))
+
+    # Until now, whether a file was registered in place was worked out from the configured roots; record it for
+    # existing objects based on the roots configured at the time of the migration. Files in the data directory were
+    # always saved by the service.
+    roots = tuple(Path(r) for r in current_app.config.get('DRS_LOCAL_IN_PLACE_ROOTS', ()))
+    if not roots:
+        return
+
+    data_dir = Path(current_app.config['SERVICE_DATA'])
+    drs_object = sa.table('drs_object', sa.column('id', sa.String), sa.column('location', sa.String),
+                          sa.column('registered_in_place', sa.Boolean))
+
+    conn = op.get_bind()
+    for object_id, location in conn.execute(sa.select(drs_object.c.id, drs_object.c.location)):
+        loc = Path(location)
+        if location.startswith('s3://') or data_dir in loc.parents:
+            continue
+        if any(r == loc or r in loc.parents for r in roots):
+            conn.execute(
+                drs_object.update().where(drs_object.c.id == object_id).values(registered_in_place=True))
+
+
+def downgrade():
+    with op.batch_alter_table('drs_object', schema=None) as batch_op:
+        batch_op.drop_column('registered_in_place')
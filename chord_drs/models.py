@@ -1,6 +1,6 @@
 import os
-from collections.abc import Generator
-from pathlib import Path
+from collections.abc import Callable, Generator
+from pathlib import Path, PurePosixPath
 from typing import Any
 from urllib.parse import urlparse
 from uuid import uuid4
@@ -8,8 +8,8 @@ from uuid import uuid4
 import botocore
 import botocore.exceptions
 from flask import current_app
-from sqlalchemy import Boolean, Column, DateTime, Integer, String
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import JSON, BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 from werkzeug.utils import secure_filename
 
@@ -17,13 +17,17 @@ from chord_drs.backends.exceptions import BackendImproperlyConfigured
 
 from .backend import get_backend
 from .backends.s3 import S3Backend, S3ObjectGenerator
-from .constants import RE_INGESTABLE_MIME_TYPE
+from .constants import INGEST_JOB_QUEUED, RE_INGESTABLE_MIME_TYPE
 from .exceptions import DrsBlobSaveError
-from .utils import drs_file_checksum
+from .utils import drs_file_checksums, run_blocking
 
 __all__ = [
     "Base",
     "DrsBlob",
+    "DrsBlobChecksum",
+    "UploadSession",
+    "UploadChunk",
+    "IngestJob",
 ]
 
 Base = declarative_base()
@@ -36,7 +40,7 @@ class DrsBlob(Base):
     location = Column(String(500), nullable=False)
 
     created = Column(DateTime, server_default=func.now())
-    checksum = Column(String(64), nullable=False)
+    checksum = Column(String(64), nullable=False, index=True)  # SHA-256 checksum
     size = Column(Integer, default=0)
     name = Column(String(250), nullable=True)
     description = Column(String(1000), nullable=True)
@@ -50,6 +54,20 @@ class DrsBlob(Base):
     data_type = Column(String(24), nullable=True)  # NULL if multi-data type or something else
     public = Column(Boolean, default=False, nullable=False)  # If true, the object is accessible by anyone
 
+    # If true, the object's file was registered in place (see DRS_LOCAL_IN_PLACE_ROOTS): it belongs to whoever wrote it,
+    # so it is never deleted by the service, whatever the configured roots are by then.
+    registered_in_place = Column(Boolean, default=False, nullable=False)
+
+    # For objects ingested from a path by the ingest command: the original path and its modification time (in ns) at
+    # ingest, so re-running an ingest can skip files which have already been ingested and haven't changed since.
+    source_path = Column(String(1000), nullable=True, index=True)
+    source_mtime_ns = Column(BigInteger, nullable=True)
+
+    # Checksums for any additional algorithms enabled via DRS_CHECKSUM_ALGORITHMS when the object was created
+    extra_checksums = relationship(
+        "DrsBlobChecksum", cascade="all, delete-orphan", order_by="DrsBlobChecksum.type", lazy="selectin"
+    )
+
     @classmethod
     async def create(cls, *args, **kwargs):
         """
@@ -65,24 +83,52 @@ class DrsBlob(Base):
         # If set, we are overriding the filename to save the file to
         filename: str | None = kwargs.pop("filename", None)
 
+        # If set, the checksum and/or size of the file at the location have already been computed (e.g., while the
+        # file was being uploaded) and do not need to be re-computed by reading the file again.
+        checksum: str | None = kwargs.pop("checksum", None)
+        size: int | None = kwargs.pop("size", None)
+        # Likewise for checksums of any additional algorithms (see DRS_CHECKSUM_ALGORITHMS), keyed by algorithm.
+        extra_checksums: dict[str, str] | None = kwargs.pop("extra_checksums", None)
+
+        # If set, the file at the location is a temporary file which can be moved into the backend rather than copied
+        move: bool = kwargs.pop("move", False)
+
+        # If set, called with the number of bytes saved to the backend as the file is being saved
+        progress: Callable[[int], None] | None = kwargs.pop("progress", None)
+
+        # If set, the file is already stored at its final location (e.g., it was streamed directly into the object
+        # store while being uploaded, or it is a local file being registered in place), so the location is recorded
+        # as-is instead of the file being saved to the backend.
+        in_place: bool = kwargs.pop("in_place", False)
+        # If set (along with in_place), the file at the location was registered in place, and isn't owned by the service
+        registered_in_place: bool = kwargs.pop("registered_in_place", False)
+
         instance = cls(*args, **kwargs)
         instance.id = str(uuid4())
+        instance.registered_in_place = registered_in_place
 
         if object_to_copy:
             instance.name = secure_filename(filename) if filename else object_to_copy.name
             instance.location = object_to_copy.location
             instance.size = object_to_copy.size
             instance.checksum = object_to_copy.checksum
+            instance.set_extra_checksums({c.type: c.checksum for c in object_to_copy.extra_checksums})
             instance.mime_type = object_to_copy.mime_type
+            instance.registered_in_place = object_to_copy.registered_in_place
         else:
             location = kwargs.get("location")
-            try:
-                p = Path(location).resolve(strict=True)
-            except FileNotFoundError:
-                # TODO: we will need to account for URLs at some point
-                raise FileNotFoundError("Provided file path does not exists")
 
-            instance.name = secure_filename(filename or p.name)
+            if in_place:
+                location_name = PurePosixPath(location).name
+            else:
+                try:
+                    p = await run_blocking(Path(location).resolve, strict=True)
+                except FileNotFoundError:
+                    # TODO: we will need to account for URLs at some point
+                    raise FileNotFoundError("Provided file path does not exists")
+                location_name = p.name
+
+            instance.name = secure_filename(filename or location_name)
             new_filename = f"{instance.id[:12]}-{instance.name}"  # TODO: use checksum for filename instead
 
             # MIME type, if set, must be a valid ingestable mime type (not a made up supertype and not, e.g.,
@@ -92,14 +138,44 @@ class DrsBlob(Base):
                 raise ValueError("Invalid MIME type")
             instance.mime_type = mime_type
 
+            algorithms: tuple[str, ...] = current_app.config.get("DRS_CHECKSUM_ALGORITHMS", ())
+
+            if in_place:
+                if checksum is None or size is None:
+                    if location.startswith("s3://"):
+                        raise ValueError("Checksum and size must be provided for S3 objects which are already in place")
+                    # A local file registered in place still gets hashed, in a single streaming pass, but not copied
+                    checksum, extra_checksums = await run_blocking(drs_file_checksums, location, algorithms)
+                    size = await run_blocking(os.path.getsize, location)
+
+                instance.location = location
+                instance.size = size
+                instance.checksum = checksum
+                instance.set_extra_checksums(extra_checksums or {})
+                logger.info(
+                    f"Creating new DRS object in place: name={instance.name}; size={instance.size}; "
+                    f"sha256={instance.checksum}"
+                )
+                return instance
+
             backend = get_backend()
 
             if not backend:
                 raise BackendImproperlyConfigured("The backend for this instance is not properly configured.")
             try:
-                instance.location = await backend.save(location, new_filename)
-                instance.size = os.path.getsize(p)
-                instance.checksum = drs_file_checksum(location)
+                instance.size = await run_blocking(os.path.getsize, p) if size is None else size
+
+                if checksum is None:
+                    # All checksums are computed in a single read of the file
+                    checksum, extra_checksums = await run_blocking(drs_file_checksums, location, algorithms)
+                elif extra_checksums is None and algorithms:
+                    _, extra_checksums = await run_blocking(drs_file_checksums, location, algorithms)
+                instance.checksum = checksum
+                instance.set_extra_checksums(extra_checksums or {})
+
+                instance.location = await backend.save(
+                    location, new_filename, move=move, checksum=instance.checksum, progress=progress
+                )
             except botocore.exceptions.ClientError as err:
                 msg = f"S3 related error during DRS object creation: {err}"
                 logger.error(msg)
@@ -115,6 +191,9 @@ class DrsBlob(Base):
 
         return instance
 
+    def set_extra_checksums(self, extra_checksums: dict[str, str]) -> None:
+        self.extra_checksums = [DrsBlobChecksum(type=t, checksum=c) for t, c in sorted(extra_checksums.items())]
+
     async def return_s3_object(self) -> S3ObjectGenerator | None:
         parsed_url = urlparse(self.location)
 
@@ -128,10 +207,138 @@ class DrsBlob(Base):
 
         return await backend.get_s3_object_dict(self.location)
 
+    async def get_presigned_url(
+        self, expires_in: int, content_disposition: str | None = None, content_type: str | None = None
+    ) -> str:
+        backend = get_backend()
+
+        if not backend or not isinstance(backend, S3Backend):
+            raise BackendImproperlyConfigured("Presigned URLs are only available for objects stored in S3.")
+
+        return await backend.generate_presigned_url(self.location, expires_in, content_disposition, content_type)
+
     async def get_streaming_generator(self, bytes_range: tuple[int, int] | None = None) -> Generator[Any, None, None]:
         backend = get_backend()
-        generator = await backend.get_stream_generator(self.location, bytes_range)
+        generator = await backend.get_stream_generator(self.location, bytes_range, self.checksum, self.size)
         return generator
 
     def __repr__(self):
         return f"<DrsBlob id={self.id} name={self.name}>"
+
+
+class DrsBlobChecksum(Base):
+    """
+    A checksum of a DRS object's bytes for an algorithm other than SHA-256 (which is stored in DrsBlob.checksum.)
+    """
+
+    __tablename__ = "drs_object_checksum"
+
+    object_id = Column(String, ForeignKey("drs_object.id", ondelete="CASCADE"), primary_key=True)
+    type = Column(String(16), primary_key=True)  # DRS checksum type, e.g. md5 - see utils.CHECKSUM_ALGORITHMS
+    checksum = Column(String(128), nullable=False)
+
+    __table_args__ = (Index("ix_drs_object_checksum_checksum", "checksum"),)
+
+    def __repr__(self):
+        return f"<DrsBlobChecksum object_id={self.object_id} type={self.type}>"
+
+
+class UploadSession(Base):
+    """
+    A resumable upload of a single file, which is received in fixed-size chunks (in any order) and then finalized into
+    a DrsBlob. The metadata for the future DRS object is recorded when the session is created.
+    """
+
+    __tablename__ = "upload_session"
+
+    id = Column(String, primary_key=True)
+    created = Column(DateTime, server_default=func.now())
+
+    size = Column(BigInteger, nullable=False)
+    chunk_size = Column(BigInteger, nullable=False)
+
+    # Where the chunks are being assembled: a temporary file path for the local backend, or an S3 location (whose
+    # multipart upload ID is recorded as well.)
+    location = Column(String(500), nullable=False)
+    s3_upload_id = Column(String(1024), nullable=True)
+
+    # Future DRS object properties
+    name = Column(String(250), nullable=True)
+    mime_type = Column(String(128), nullable=True)
+    project_id = Column(String(64), nullable=True)
+    dataset_id = Column(String(64), nullable=True)
+    data_type = Column(String(24), nullable=True)
+    public = Column(Boolean, default=False, nullable=False)
+    deduplicate = Column(Boolean, default=True, nullable=False)
+
+    chunks = relationship(
+        "UploadChunk", cascade="all, delete-orphan", order_by="UploadChunk.offset", back_populates="session"
+    )
+
+    @property
+    def n_chunks(self) -> int:
+        return max((self.size + self.chunk_size - 1) // self.chunk_size, 1)
+
+    def chunk_length(self, offset: int) -> int:
+        return min(self.chunk_size, self.size - offset)
+
+    def __repr__(self):
+        return f"<UploadSession id={self.id} name={self.name} size={self.size}>"
+
+
+class UploadChunk(Base):
+    __tablename__ = "upload_chunk"
+
+    session_id = Column(String, ForeignKey("upload_session.id", ondelete="CASCADE"), primary_key=True)
+    offset = Column(BigInteger, primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    etag = Column(String(128), nullable=True)  # S3 part ETag, needed to complete the multipart upload
+
+    session = relationship("UploadSession", back_populates="chunks")
+
+
+class IngestJob(Base):
+    """
+    An ingest which runs in the background after its request has returned: hashing, deduplication, saving to the
+    backend and creation of the DrsBlob. Jobs are persisted so that they can be picked up again after a restart, and
+    record their progress (updated periodically while running, which also serves as a heartbeat) and outcome.
+    """
+
+    __tablename__ = "ingest_job"
+
+    id = Column(String, primary_key=True)
+    created = Column(DateTime, server_default=func.now())
+    updated = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    status = Column(String(16), nullable=False, default=INGEST_JOB_QUEUED)  # see constants.INGEST_JOB_*
+
+    # What to ingest: a file path, or a location which is already in place (streamed into the object store while being
+    # uploaded, or registered in place.) If owned, the path is a temporary file holding an upload, which the job can
+    # move into the backend and removes once it is done.
+    location = Column(String(1000), nullable=False)
+    owned = Column(Boolean, default=False, nullable=False)
+    in_place = Column(Boolean, default=False, nullable=False)
+    # Known up-front if the file was hashed while being uploaded
+    checksum = Column(String(64), nullable=True)
+    extra_checksums = Column(JSON, nullable=True)
+    size = Column(BigInteger, nullable=False)
+
+    # Future DRS object properties
+    name = Column(String(250), nullable=True)
+    mime_type = Column(String(128), nullable=True)
+    project_id = Column(String(64), nullable=True)
+    dataset_id = Column(String(64), nullable=True)
+    data_type = Column(String(24), nullable=True)
+    public = Column(Boolean, default=False, nullable=False)
+    deduplicate = Column(Boolean, default=True, nullable=False)
+
+    bytes_hashed = Column(BigInteger, default=0, nullable=False)
+    bytes_uploaded = Column(BigInteger, default=0, nullable=False)
+
+    # Outcome: the new (or deduplicated) object, or an error message
+    object_id = Column(String, ForeignKey("drs_object.id", ondelete="SET NULL"), nullable=True)
+    error = Column(String(1000), nullable=True)
+
+    object = relationship("DrsBlob")
+
+    def __repr__(self):
+        return f"<IngestJob id={self.id} name={self.name} status={self.status}>"
@@ -1,11 +1,59 @@
-from tempfile import SpooledTemporaryFile
-from typing import IO
+import os
+import tempfile
+from collections.abc import Iterable
+from contextlib import suppress
+from uuid import uuid4
 
 from flask import Request, current_app
+from werkzeug.utils import secure_filename
 
-__all__ = ["DrsRequest"]
+from .backend import get_backend
+from .backends.s3 import S3Backend, S3UploadStream
+from .utils import IncrementalChecksum
 
-MAX_IN_MEMORY_SIZE = 1024 * 1024 * 10  # 10 MB
+__all__ = [
+    "IngestFileStream",
+    "DrsRequest",
+]
+
+
+class IngestFileStream:
+    """
+    File stream for uploaded files which writes the received bytes once, to a temporary file in the ingest directory,
+    while computing the SHA-256 checksum and size of the upload incrementally. This way, an upload can be handed
+    directly to the storage backend, without being copied to another temporary file or re-read for hashing first.
+    The temporary file is removed when the stream is closed (i.e., when the request is torn down) if it is still there.
+    """
+
+    def __init__(self, tmp_dir: str | None, checksum_algorithms: Iterable[str] = ()):
+        fd, self.path = tempfile.mkstemp(dir=tmp_dir)
+        self._file = os.fdopen(fd, "w+b")
+        self._checksum = IncrementalChecksum(checksum_algorithms)
+
+    @property
+    def checksum(self) -> str:
+        return self._checksum.hexdigest()
+
+    @property
+    def extra_checksums(self) -> dict[str, str]:
+        return self._checksum.extra_hexdigests()
+
+    @property
+    def size(self) -> int:
+        return self._checksum.size
+
+    def write(self, data: bytes) -> int:
+        self._checksum.update(data)
+        return self._file.write(data)
+
+    def close(self) -> None:
+        self._file.close()
+        with suppress(FileNotFoundError):  # File may have been moved into place by the backend already
+            os.remove(self.path)
+
+    def __getattr__(self, name: str):
+        # Everything else (seek, read, flush, ...) is passed through to the underlying temporary file
+        return getattr(self._file, name)
 
 
 class DrsRequest(Request):
@@ -15,5 +63,14 @@ class DrsRequest(Request):
         content_type: str | None,
         filename: str | None = None,
         content_length: int | None = None,
-    ) -> IO[bytes]:
-        return SpooledTemporaryFile(max_size=MAX_IN_MEMORY_SIZE, dir=current_app.config["DRS_INGEST_TMP_DIR"])
+    ) -> IngestFileStream | S3UploadStream:
+        if current_app.config["S3_STREAM_INGEST"] and isinstance(backend := get_backend(), S3Backend):
+            # Skip local disk entirely and pipe the upload straight into the object store
+            return backend.open_upload_stream(
+                f"{str(uuid4())[:12]}-{secure_filename(filename or '') or 'upload'}",
+                # Upper bound for the file's size, used to choose a part size which keeps under the S3 part limit:
+                size=content_length or total_content_length,
+            )
+        return IngestFileStream(
+            current_app.config["DRS_INGEST_TMP_DIR"], current_app.config.get("DRS_CHECKSUM_ALGORITHMS", ())
+        )
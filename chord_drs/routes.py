@@ -1,8 +1,10 @@
 import logging
 import os
 import re
-import tempfile
 import urllib.parse
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from uuid import uuid4
 
 import orjson
 from bento_lib.auth.permissions import P_DELETE_DATA, P_DOWNLOAD_DATA, P_INGEST_DATA, P_QUERY_DATA, Permission
@@ -10,25 +12,56 @@ from bento_lib.auth.resources import RESOURCE_EVERYTHING, build_resource
 from bento_lib.service_info.constants import SERVICE_ORGANIZATION_C3G
 from bento_lib.service_info.helpers import build_service_info
 from bento_lib.streaming.exceptions import StreamingBadRange, StreamingException, StreamingRangeNotSatisfiable
-from bento_lib.streaming.range import parse_range_header
 from flask import (
     Blueprint,
     Request,
     current_app,
     jsonify,
+    redirect,
     request,
+    url_for,
 )
 from sqlalchemy import or_
+from werkzeug.datastructures import FileStorage
 from werkzeug.exceptions import BadRequest, Forbidden, InternalServerError, NotFound, RequestedRangeNotSatisfiable
+from werkzeug.http import http_date, quote_etag
+from werkzeug.utils import secure_filename
 
 from . import __version__
 from .authz import authz_middleware
 from .backend import get_backend
-from .constants import BENTO_SERVICE_KIND, MIME_OCTET_STREAM, SERVICE_NAME, SERVICE_TYPE
+from .backends.s3 import S3UploadStream
+from .byteranges import multipart_byteranges_length, parse_byte_ranges, stream_multipart_byteranges
+from .constants import (
+    ACCESS_ID_S3_PRESIGNED,
+    BENTO_SERVICE_KIND,
+    MIME_OCTET_STREAM,
+    RE_INGESTABLE_MIME_TYPE,
+    SERVICE_NAME,
+    SERVICE_TYPE,
+)
 from .db import db
-from .models import DrsBlob
-from .serialization import build_blob_json
-from .utils import drs_file_checksum
+from .deduplication import find_duplicate_object
+from .exceptions import TooManyRanges
+from .jobs import create_ingest_job, submit_ingest_job
+from .models import DrsBlob, DrsBlobChecksum, IngestJob, UploadSession
+from .request import IngestFileStream
+from .serialization import (
+    build_blob_json,
+    build_ingest_job_json,
+    build_upload_chunk_json,
+    build_upload_session_json,
+    s3_presigned_urls_enabled,
+)
+from .uploads import (
+    complete_upload_session,
+    create_upload_session,
+    discard_upload_session,
+    remove_upload_tmp_file,
+    upload_session_checksum,
+    write_upload_chunk,
+)
+from .utils import drs_file_checksums, run_blocking, sync_generator_stream
 
 RE_STARTING_SLASH = re.compile(r"^/")
 
@@ -71,29 +104,37 @@ def resource_from_object(drs_obj: DrsBlob) -> dict:
     return build_resource(drs_obj.project_id, drs_obj.dataset_id, drs_obj.data_type)
 
 
-def resources_from_objects(drs_objs: list[DrsBlob]) -> tuple[dict[str, int], list[dict]]:
+def deduplicate_resources(resources: Iterable[dict]) -> tuple[list[int], list[dict]]:
     """
-    Constructs a map of DRS ID --> index of resource in returned resource list for fast deduplicated permissions
-    evaluations on multiple DRS objects. Skips any public DRS objects so we don't waste time with lookups we don't need,
-    as public objects are a free-for-all.
+    Deduplicates a sequence of Bento authorization resources, so that permissions are only evaluated once per distinct
+    resource. Returns the index of each resource in the returned list of distinct resources, as well as the list itself.
     """
 
-    id_resource_map: dict[str, int] = {}
+    resource_idxs: list[int] = []
     resource_idx_map: dict[bytes, int] = {}
     resources_dedup: list[dict] = []
 
-    for drs_obj, resource in zip(drs_objs, map(resource_from_object, drs_objs)):
+    for resource in resources:
         rk = orjson.dumps(resource, option=orjson.OPT_SORT_KEYS)
         resource_idx = resource_idx_map.get(rk)
         if resource_idx is None:
-            new_idx = len(resources_dedup)
-            id_resource_map[drs_obj.id] = new_idx
-            resource_idx_map[rk] = new_idx
+            resource_idx = len(resources_dedup)
+            resource_idx_map[rk] = resource_idx
             resources_dedup.append(resource)
-        else:
-            id_resource_map[drs_obj.id] = resource_idx
+        resource_idxs.append(resource_idx)
+
+    return resource_idxs, resources_dedup
+
+
+def resources_from_objects(drs_objs: list[DrsBlob]) -> tuple[dict[str, int], list[dict]]:
+    """
+    Constructs a map of DRS ID --> index of resource in returned resource list for fast deduplicated permissions
+    evaluations on multiple DRS objects. Skips any public DRS objects so we don't waste time with lookups we don't need,
+    as public objects are a free-for-all.
+    """
 
-    return id_resource_map, resources_dedup
+    resource_idxs, resources_dedup = deduplicate_resources(map(resource_from_object, drs_objs))
+    return {drs_obj.id: idx for drs_obj, idx in zip(drs_objs, resource_idxs)}, resources_dedup
 
 
 def check_objects_permission(
@@ -197,14 +238,17 @@ async def delete_drs_object(object_id: str, logger: logging.Logger):
 
     q = DrsBlob.query.filter_by(location=drs_object.location)
     n_using_file = q.count()
-    if n_using_file == 1 and q.first().id == drs_object.id:
+    if drs_object.registered_in_place:
+        # Files registered in place belong to whoever wrote them; only their DRS records are ours to delete.
+        logger.info(f"Not deleting file at {drs_object.location}, since it was registered in place.")
+    elif n_using_file == 1 and q.first().id == drs_object.id:
         # If this object is the only one using the file, delete the file too
         # TODO: this can create a race condition and leave files undeleted... should we have a cleanup on start?
         logger.info(
             f"Deleting file at {drs_object.location}, since {drs_object.id} is the only object referring to it."
         )
         backend = get_backend()
-        await backend.delete(drs_object.location)
+        await backend.delete(drs_object.location, drs_object.checksum)
 
     db.session.delete(drs_object)
     db.session.commit()
@@ -227,22 +271,27 @@ async def object_info(object_id: str):
     # The requester can specify object internal path to be added to the response
     use_internal_path: bool = str_to_bool(request.args.get("internal_path", ""))
 
-    return jsonify(
+    res = jsonify(
         build_blob_json(drs_object, inside_container=use_internal_path, with_bento_properties=with_bento_properties)
     )
+    # The record's JSON depends on the request's parameters and on configuration, so its ETag is a hash of the JSON
+    # rather than the object's checksum. Responses depend on authorization, so they may only be cached privately.
+    res.add_etag()
+    res.cache_control.private = True
+    res.cache_control.no_cache = True
+    return res.make_conditional(request)
 
 
 @drs_service.route("/objects/<string:object_id>/access/<string:access_id>", methods=["GET"])
 @drs_service.route("/ga4gh/drs/v1/objects/<string:object_id>/access/<string:access_id>", methods=["GET"])
-def object_access(object_id: str, access_id: str):
-    fetch_and_check_object_permissions(object_id, P_QUERY_DATA, current_app.logger)
-
-    # We explicitly do not support access_id-based accesses; all of them will be 'not found'
-    # since we don't provide access IDs
+async def object_access(object_id: str, access_id: str):
+    drs_object = fetch_and_check_object_permissions(object_id, P_DOWNLOAD_DATA, current_app.logger)
 
-    # TODO: Eventually generate one-time signed URLs or something?
+    # The only access ID we provide is for presigned S3 URLs, if enabled; all others will be 'not found'
+    if access_id != ACCESS_ID_S3_PRESIGNED or not s3_presigned_urls_enabled():
+        raise NotFound(f"No access ID '{access_id}' exists for object '{object_id}'")
 
-    raise NotFound(f"No access ID '{access_id}' exists for object '{object_id}'")
+    return jsonify({"url": await presigned_url_for_object(drs_object)})
 
 
 @drs_service.route("/search", methods=["GET"])
@@ -252,10 +301,11 @@ def object_search():
     name: str | None = request.args.get("name")
     fuzzy_name: str | None = request.args.get("fuzzy_name")
     search_q: str | None = request.args.get("q")
+    checksum: str | None = request.args.get("checksum")
     internal_path: bool = str_to_bool(request.args.get("internal_path", ""))
     with_bento_properties: bool = str_to_bool(request.args.get("with_bento_properties", ""))
 
-    # search requires: (name XOR fuzzy_name XOR q) | project | dataset (1+) | data_type (1+)
+    # search requires: (name XOR fuzzy_name XOR q) | checksum | project | dataset (1+) | data_type (1+)
 
     project: str | None = request.args.get("project")
     datasets: list[str] = request.args.getlist("dataset")
@@ -269,6 +319,11 @@ def object_search():
         filter_clauses.append(or_(*(DrsBlob.dataset_id == d for d in datasets)))
     if data_types:
         filter_clauses.append(or_(*(DrsBlob.data_type == dt for dt in data_types)))
+    if checksum:
+        # exact match against the SHA-256 checksum or any of the additional checksums (both indexed)
+        filter_clauses.append(
+            or_(DrsBlob.checksum == checksum, DrsBlob.extra_checksums.any(DrsBlobChecksum.checksum == checksum))
+        )
 
     # different branches for different possible searches - we only use one of them.
     if name:
@@ -287,7 +342,9 @@ def object_search():
 
     if not filter_clauses:
         authz_middleware.mark_authz_done(request)
-        raise BadRequest("Missing GET search terms: (name XOR fuzzy_name XOR q) | project | dataset | data_type")
+        raise BadRequest(
+            "Missing GET search terms: (name XOR fuzzy_name XOR q) | checksum | project | dataset | data_type"
+        )
 
     objects = DrsBlob.query.filter(*filter_clauses).all()
 
@@ -304,27 +361,141 @@ def object_search():
     return jsonify(response)
 
 
+# How long public objects may be cached for; their bytes never change, so this is as long as is practical
+PUBLIC_OBJECT_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def object_last_modified(drs_object: DrsBlob) -> datetime:
+    # Timestamps are generated by the database (CURRENT_TIMESTAMP), i.e. in UTC; HTTP dates have a precision of seconds
+    return drs_object.created.replace(tzinfo=UTC, microsecond=0)
+
+
+def object_cache_headers(drs_object: DrsBlob) -> dict[str, str]:
+    """
+    Constructs validator and caching headers for an object's bytes. Objects are immutable, so their SHA-256 checksum
+    is a strong ETag. Public objects may be cached by shared caches (e.g., a CDN or reverse proxy) without revalidation;
+    others may only be cached privately, and must be revalidated (which checks authorization again.)
+    """
+    return {
+        "ETag": quote_etag(drs_object.checksum),
+        "Last-Modified": http_date(object_last_modified(drs_object)),
+        "Cache-Control": (
+            f"public, max-age={PUBLIC_OBJECT_MAX_AGE}, immutable" if drs_object.public else "private, no-cache"
+        ),
+    }
+
+
+def object_not_modified(drs_object: DrsBlob) -> bool:
+    """
+    Evaluates If-None-Match (with weak comparison), or, if absent, If-Modified-Since, against an object's validators.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(drs_object.checksum)
+    if request.if_modified_since is not None:
+        return object_last_modified(drs_object) <= request.if_modified_since
+    return False
+
+
+def object_range_applies(drs_object: DrsBlob) -> bool:
+    """
+    Evaluates If-Range against an object's validators: if the client's copy is not the current one, the Range header
+    must be ignored and the whole object sent instead. Weak ETags never match.
+    """
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return not request.headers["If-Range"].startswith("W/") and if_range.etag == drs_object.checksum
+    if if_range.date is not None:
+        return if_range.date == object_last_modified(drs_object)
+    return True
+
+
+async def presigned_url_for_object(drs_object: DrsBlob) -> str:
+    """
+    Generates a short-lived presigned URL for fetching an object directly from S3, with the same Content-Disposition
+    and Content-Type headers as a download through this service.
+    """
+    return await drs_object.get_presigned_url(
+        current_app.config["S3_PRESIGNED_URL_EXPIRY"],
+        content_disposition=attachment_header(drs_object.name)["Content-Disposition"],
+        content_type=drs_object.mime_type or MIME_OCTET_STREAM,
+    )
+
+
 @drs_service.route("/objects/<string:object_id>/download", methods=["GET", "POST"])
 async def object_download(object_id: str):
     logger = current_app.logger
 
     drs_object = fetch_and_check_object_permissions(object_id, P_DOWNLOAD_DATA, logger)
+
+    if s3_presigned_urls_enabled() and current_app.config["S3_DOWNLOAD_REDIRECT"]:
+        # Let the client fetch the bytes (including any range of them) directly from S3. The URL expires, so the
+        # redirect must not be cached.
+        res = redirect(await presigned_url_for_object(drs_object), code=302)
+        res.headers["Cache-Control"] = "no-store"
+        return res
+
     obj_size = drs_object.size
 
     mime_type: str = drs_object.mime_type or MIME_OCTET_STREAM
-    response_headers = attachment_header(drs_object.name)
+    cache_headers = object_cache_headers(drs_object)
+
+    if request.method in ("GET", "HEAD") and object_not_modified(drs_object):
+        # The client already holds these bytes - no need to touch the backend at all
+        return current_app.response_class(status=304), cache_headers
+
+    response_headers = {**attachment_header(drs_object.name), **cache_headers}
 
-    # Adjust headers and streaming args if a range is provided
-    range_header = request.headers.get("Range")
-    bytes_range = None
+    # Adjust headers and streaming args if a range is provided (and still applies to the client's copy, if conditional)
+    range_header = request.headers.get("Range") if object_range_applies(drs_object) else None
+    byte_ranges: tuple[tuple[int, int], ...] | None = None
     if range_header:
         try:
-            range_intervals = parse_range_header(range_header, obj_size)
+            byte_ranges = parse_byte_ranges(range_header, obj_size, current_app.config["DRS_MAX_RANGES"])
+        except TooManyRanges as e:
+            # Servers may ignore a Range header; rather than assembling a response out of (possibly very many) tiny
+            # parts, send the whole object.
+            logger.warning("ignoring range header: %s", e)
+            range_header = None
         except StreamingBadRange as e:
             raise bad_request_log_mark(str(e), logger)
         except StreamingRangeNotSatisfiable as e:
             raise range_not_satisfiable_log_mark(str(e), obj_size, logger)
-        bytes_range = range_intervals[0]
+
+    backend = get_backend()
+
+    # The reverse proxy handles any Range header itself, so if we chose to ignore it (too many ranges, or If-Range didn't
+    # match), the file is streamed by us instead of being offloaded.
+    range_ignored = range_header is None and "Range" in request.headers
+
+    if not range_ignored and (offload_headers := backend.offload_headers(drs_object.location)) is not None:
+        # The reverse proxy serves the file itself, including the request's range(s) (validated above.) Any body or
+        # Content-Length we send is replaced by the proxy.
+        offload_response = current_app.response_class(status=200, mimetype=mime_type)
+        return offload_response, {**response_headers, **offload_headers}
+
+    if byte_ranges is not None and len(byte_ranges) > 1:
+        # Several (disjoint, after coalescing) ranges: respond with a multipart/byteranges body, with a part per range
+        boundary = uuid4().hex
+        response_headers["Content-Length"] = str(
+            multipart_byteranges_length(byte_ranges, boundary, mime_type, obj_size)
+        )
+        multipart_generator = sync_generator_stream(
+            stream_multipart_byteranges(
+                [backend.stream_cached(drs_object.location, r, drs_object.checksum, obj_size) for r in byte_ranges],
+                byte_ranges,
+                boundary,
+                mime_type,
+                obj_size,
+            ),
+            logger,
+        )
+        multipart_response = current_app.response_class(
+            multipart_generator, status=206, mimetype=f"multipart/byteranges; boundary={boundary}"
+        )
+        return multipart_response, response_headers
+
+    bytes_range = byte_ranges[0] if byte_ranges else None
+    if bytes_range:
         start, end = bytes_range
         response_headers["Content-Length"] = str(end + 1 - start)  # byte range is inclusive, so need to add one
         response_headers["Content-Range"] = f"bytes {start}-{end}/{obj_size}"
@@ -332,17 +503,81 @@ async def object_download(object_id: str):
         response_headers["Accept-Ranges"] = "bytes"
         response_headers["Content-Length"] = obj_size
 
+    status: int = 206 if range_header else 200  # partial/full content based on range
+
+    # Small ranges are served from the block cache if it is enabled, without opening the file at all if they're cached
+    block_cached = backend.block_cache is not None and backend.block_cache.applies(bytes_range)
+
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if (
+        file_wrapper is not None
+        and not block_cached
+        and (fh := await run_blocking(backend.open_file, drs_object.location, bytes_range))
+    ):
+        # Let the WSGI server send the bytes straight from the file, e.g. with sendfile in the case of gunicorn, rather
+        # than reading them through Python. Passed through as-is, so that the server recognizes its own wrapper.
+        file_response = current_app.response_class(
+            file_wrapper(fh, backend.chunk_size(int(response_headers["Content-Length"]))),
+            status=status,
+            mimetype=mime_type,
+            direct_passthrough=True,
+        )
+        return file_response, response_headers
+
     # Get the streaming generator from the backend (local | S3)
     try:
         obj_generator = await drs_object.get_streaming_generator(bytes_range)
     except StreamingException as e:
         raise bad_request_log_mark(str(e), logger)
 
-    status: int = 206 if range_header else 200  # partial/full content based on range
     stream_response = current_app.response_class(obj_generator, status=status, mimetype=mime_type)
     return stream_response, response_headers
 
 
+async def create_ingested_object(logger: logging.Logger, uploaded_location: str | None = None, **kwargs) -> DrsBlob:
+    """
+    Creates a DRS object from ingested bytes and saves it to the database, translating errors into HTTP errors.
+    If uploaded_location is set, the bytes at this location in the backend are removed if creation fails.
+    """
+
+    try:
+        drs_object = await DrsBlob.create(**kwargs)
+        db.session.add(drs_object)
+        db.session.commit()
+        logger.info("added DRS object: %s", drs_object)
+        return drs_object
+    except Exception as e:
+        if uploaded_location:  # Don't leave an object without a DRS record behind in the backend
+            await get_backend().delete(uploaded_location)
+        if isinstance(e, ValueError):
+            raise bad_request_log_mark(str(e), logger)
+        # TODO: More specific handling
+        authz_middleware.mark_authz_done(request)
+        logger.exception("encountered exception during ingest", exc_info=e)
+        raise InternalServerError("Error while creating the object")
+
+
+def receive_uploaded_file(
+    file: FileStorage, logger: logging.Logger
+) -> tuple[str | None, str | None, str, dict[str, str], int]:
+    """
+    Returns (temporary file path, backend location, checksum, additional checksums, size) for an uploaded file; exactly
+    one of the first two is set. The uploaded bytes have already been written to a temporary file or directly to the
+    object store (and hashed) by the request's file stream while the request body was being received - see
+    DrsRequest._get_file_stream.
+    """
+
+    stream: IngestFileStream | S3UploadStream = file.stream
+    if isinstance(stream, S3UploadStream):
+        stream.finish()
+        logger.debug("ingest - received file object: %s (streamed to: %s)", file, stream.location)
+        return None, stream.location, stream.checksum, stream.extra_checksums, stream.size
+
+    stream.flush()
+    logger.debug("ingest - received file object: %s (temporary path: %s)", file, stream.path)
+    return stream.path, None, stream.checksum, stream.extra_checksums, stream.size
+
+
 @drs_service.route("/ingest", methods=["POST"])
 async def object_ingest():
     logger = current_app.logger
@@ -350,6 +585,8 @@ async def object_ingest():
 
     deduplicate: bool = str_to_bool(data.get("deduplicate", "true"))  # Change for v0.9: default to True
     obj_path: str | None = data.get("path")
+    register_in_place: bool = str_to_bool(data.get("register_in_place", "false"))
+    run_async: bool = str_to_bool(data.get("async", "false"))
     project_id: str | None = data.get("project_id") or None  # replace blank strings with None
     dataset_id: str | None = data.get("dataset_id") or None  # "
     data_type: str | None = data.get("data_type") or None  # "
@@ -378,84 +615,613 @@ async def object_ingest():
     if (obj_path is not None and file is not None) or (obj_path is None and file is None):
         raise bad_request_log_mark("Must specify exactly one of path or file contents", logger)
 
+    if register_in_place:
+        if obj_path is None:
+            raise bad_request_log_mark("Only files specified by path can be registered in place", logger)
+        try:
+            obj_path = get_backend().in_place_location(obj_path)
+        except FileNotFoundError:
+            raise bad_request_log_mark(f"File not found at path {obj_path}", logger)
+        except ValueError as e:
+            raise bad_request_log_mark(str(e), logger)
+
     drs_object: DrsBlob | None = None  # either the new object, or the object to fully reuse
     object_to_copy: DrsBlob | None = None
 
-    tfh, t_obj_path = tempfile.mkstemp(dir=current_app.config["DRS_INGEST_TMP_DIR"])
-    try:
-        filename: str | None = None  # no override, use path filename if path is specified instead of a file upload
-        if file is not None:
-            logger.debug("ingest - received file object: %s", file)
-            logger.debug("ingest - writing to temporary path: %s", t_obj_path)
-            file.save(t_obj_path)
-            obj_path = t_obj_path
-            filename = file.filename  # still may be none, in which case the temporary filename will be used
+    filename: str | None = None  # no override, use path filename if path is specified instead of a file upload
+    checksum: str | None = None  # if known up-front, passed through to DrsBlob.create so the file isn't hashed twice
+    extra_checksums: dict[str, str] | None = None  # "
+    size: int | None = None  # "
+    uploaded_location: str | None = None  # set if the upload was streamed directly into the backend
 
-        if deduplicate:
-            # Get checksum of original file, and query database for objects that match
+    if file is not None:
+        obj_path, uploaded_location, checksum, extra_checksums, size = receive_uploaded_file(file, logger)
+        filename = file.filename  # still may be none, in which case the temporary filename will be used
 
+    if run_async:
+        # Return as soon as the bytes have been accepted; everything else is done by a background ingest job
+        if size is None:
             try:
-                checksum = drs_file_checksum(obj_path)
+                size = await run_blocking(os.path.getsize, obj_path)
             except FileNotFoundError:
                 raise bad_request_log_mark(f"File not found at path {obj_path}", logger)
 
-            # Currently, we require exact permissions compatibility for deduplication of IDs.
-            # It might be possible to relax this a bit, but we can't fully relax this for two reasons:
-            #  - we would need to keep track of sets of permissions for each DRS object
-            #  - certain attacks may be performable by creating a second project/dataset in a semi-public instance
-            #    and seeing which files are DRS ID duplicates.
-            # However, we can actually deduplicate the files on the filesystem as these are more opaque.
-
-            candidate_drs_object: DrsBlob | None = DrsBlob.query.filter_by(checksum=checksum).first()
-
-            if candidate_drs_object is not None:
-                c_project_id = candidate_drs_object.project_id
-                c_dataset_id = candidate_drs_object.dataset_id
-                c_data_type = candidate_drs_object.data_type
-                c_public = candidate_drs_object.public
-
-                if (
-                    c_project_id == project_id
-                    and c_dataset_id == dataset_id
-                    and c_data_type == data_type
-                    and c_public == public
-                ):
-                    logger.info(
-                        f"Found duplicate DRS object via checksum (will fully deduplicate): {candidate_drs_object}"
-                    )
-                    drs_object = candidate_drs_object
-                else:
-                    logger.info(
-                        f"Found duplicate DRS object via checksum (will deduplicate JUST bytes; req resource: "
-                        f"({project_id}, {dataset_id}, {data_type}, {public}) vs existing resource: "
-                        f"({c_project_id}, {c_dataset_id}, {c_data_type}, {c_public})): "
-                        f"{candidate_drs_object}"
-                    )
-                    object_to_copy = candidate_drs_object
+        job = await create_ingest_job(
+            uploaded_location or obj_path,
+            current_app.config["DRS_INGEST_JOB_DIR"],
+            owned=file is not None,
+            in_place=uploaded_location is not None or register_in_place,
+            checksum=checksum,
+            extra_checksums=extra_checksums,
+            size=size,
+            name=filename,
+            mime_type=mime_type,
+            project_id=project_id,
+            dataset_id=dataset_id,
+            data_type=data_type,
+            public=public,
+            deduplicate=deduplicate,
+        )
+        db.session.add(job)
+        db.session.commit()
+        submit_ingest_job(job.id)
+
+        logger.info("ingest - created ingest job %s", job.id)
+        return build_ingest_job_json(job), 202, {"Location": url_for("drs_service.ingest_job_info", job_id=job.id)}
+
+    if deduplicate:
+        # Get checksum of original file, and query database for objects that match
+
+        if checksum is None:
+            try:
+                checksum, extra_checksums = await run_blocking(
+                    drs_file_checksums, obj_path, current_app.config["DRS_CHECKSUM_ALGORITHMS"]
+                )
+            except FileNotFoundError:
+                raise bad_request_log_mark(f"File not found at path {obj_path}", logger)
+
+        drs_object, object_to_copy = find_duplicate_object(checksum, project_id, dataset_id, data_type, public, logger)
+
+    if uploaded_location and (drs_object or object_to_copy):
+        # The upload was streamed into the backend before we could know it was a duplicate, so remove the new copy.
+        logger.info("ingest - deleting duplicate upload at %s", uploaded_location)
+        await get_backend().delete(uploaded_location)
+        uploaded_location = None
+
+    if not drs_object:
+        if object_to_copy:
+            create_kwargs = {"object_to_copy": object_to_copy}
+        elif uploaded_location:
+            create_kwargs = {"location": uploaded_location, "in_place": True}
+        elif register_in_place:
+            create_kwargs = {"location": obj_path, "in_place": True, "registered_in_place": True}
+        else:
+            create_kwargs = {"location": obj_path, "move": file is not None}
+        if not object_to_copy:
+            create_kwargs.update(checksum=checksum, extra_checksums=extra_checksums, size=size)
+
+        drs_object = await create_ingested_object(
+            logger,
+            uploaded_location=uploaded_location,
+            **create_kwargs,
+            filename=filename,
+            mime_type=mime_type,
+            project_id=project_id,
+            dataset_id=dataset_id,
+            data_type=data_type,
+            public=public,
+        )
+
+    return build_blob_json(drs_object, with_bento_properties=True), 201
+
+
+@drs_service.route("/ingest/by-checksum", methods=["POST"])
+async def object_ingest_by_checksum():
+    """
+    Pre-upload deduplication: the client sends the SHA-256 checksum and size of a file instead of its bytes, along with
+    the same object properties as /ingest (plus an optional name.) If an existing object has these bytes, the new object
+    is created from it, following the same deduplication rules as /ingest; otherwise, this returns a 404 and the client
+    must upload the file.
+    """
+
+    logger = current_app.logger
+    data = request.form or {}
+
+    checksum: str = (data.get("checksum") or "").strip().lower()
+    deduplicate: bool = str_to_bool(data.get("deduplicate", "true"))
+    project_id: str | None = data.get("project_id") or None  # replace blank strings with None
+    dataset_id: str | None = data.get("dataset_id") or None  # "
+    data_type: str | None = data.get("data_type") or None  # "
+    public: bool = data.get("public", "false").strip().lower() == "true"
+    name: str | None = data.get("name") or None  # "
+    mime_type: str | None = data.get("mime_type") or None  # "
+
+    logger.info(f"Received ingest by checksum request metadata: {data}")
+
+    has_permission: bool = (
+        authz_middleware.evaluate_one(
+            request,
+            build_resource(project_id, dataset_id, data_type),
+            P_INGEST_DATA,
+            mark_authz_done=True,
+        )
+        if authz_enabled()
+        else True
+    )
+
+    if not has_permission:
+        raise Forbidden("Forbidden")
+
+    try:
+        size = int(data["size"])
+    except (KeyError, ValueError):
+        raise bad_request_log_mark("Must specify the file's size", logger)
+
+    if not re.fullmatch(r"[0-9a-f]{64}", checksum):
+        raise bad_request_log_mark("Must specify the file's SHA-256 checksum", logger)
+
+    candidates: list[DrsBlob] = DrsBlob.query.filter_by(checksum=checksum, size=size).all()
+
+    # Unlike having a file, knowing its checksum doesn't prove access to its bytes, so only objects which the requester
+    # can already download are eligible for reuse.
+    candidates = [c for c, p in zip(candidates, check_objects_permission(candidates, P_DOWNLOAD_DATA)) if p]
+
+    if not candidates:
+        authz_middleware.mark_authz_done(request)
+        raise NotFound("No existing object with this checksum and size; the file must be uploaded")
+
+    if deduplicate:
+        drs_object, object_to_copy = find_duplicate_object(
+            checksum, project_id, dataset_id, data_type, public, logger, candidates=candidates
+        )
+    else:  # a new object is always created, but its bytes can still be reused
+        drs_object, object_to_copy = None, candidates[0]
+
+    if not drs_object:
+        drs_object = await create_ingested_object(
+            logger,
+            object_to_copy=object_to_copy,
+            filename=name,
+            mime_type=mime_type,
+            project_id=project_id,
+            dataset_id=dataset_id,
+            data_type=data_type,
+            public=public,
+        )
+
+    return build_blob_json(drs_object, with_bento_properties=True), 201
+
+
+@drs_service.route("/ingest/batch", methods=["POST"])
+async def object_ingest_batch():
+    """
+    Ingests many files at once. The request is either a JSON body, or a multipart form with an items field containing
+    the JSON list of items plus the uploaded files; each item has either a path or a file (the name of the form field
+    with the file's contents), and optionally the same properties as /ingest (project_id, dataset_id, data_type,
+    public, mime_type, deduplicate). Permissions are evaluated once per distinct resource, duplicates are looked up in
+    one query and all new objects are saved in one transaction. Returns a result (status and object or error) per item.
+    """
+
+    logger = current_app.logger
+
+    try:
+        items = request.get_json(silent=True)["items"] if request.is_json else orjson.loads(request.form["items"])
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        raise bad_request_log_mark("Must specify a list of items to ingest", logger)
+
+    logger.info(f"Received batch ingest request with {len(items)} items")
+
+    def _item_prop(item: dict, key: str) -> str | None:
+        return item.get(key) or None  # replace blank strings with None
+
+    def _item_bool(item: dict, key: str, default: bool) -> bool:
+        v = item.get(key, default)
+        return v if isinstance(v, bool) else str_to_bool(str(v))
+
+    resources = [
+        build_resource(*(_item_prop(item, k) for k in ("project_id", "dataset_id", "data_type"))) for item in items
+    ]
+
+    # Evaluate permissions for each distinct resource in a single call. This authz call determines everything, so we
+    # can mark authz as done when the call completes:
+    resource_idxs, resources_dedup = deduplicate_resources(resources)
+    if authz_enabled() and resources_dedup:
+        authz_results = authz_middleware.evaluate(
+            request, resources_dedup, [P_INGEST_DATA], headers_getter=_post_headers_getter, mark_authz_done=True
+        )
+        has_permission = [authz_results[idx][0] for idx in resource_idxs]
+    else:
+        authz_middleware.mark_authz_done(request)
+        has_permission = [True] * len(items)
+
+    results: list[dict | None] = [None] * len(items)
+    to_ingest: list[dict] = []  # prepared items, with the location, checksum and size of their bytes
+
+    for i, (item, permitted) in enumerate(zip(items, has_permission)):
+        if not permitted:
+            results[i] = {"status": 403, "error": "Forbidden"}
+            continue
+
+        obj_path: str | None = _item_prop(item, "path")
+        file_field: str | None = _item_prop(item, "file")
+        file: FileStorage | None = request.files.get(file_field) if file_field else None
+
+        if (obj_path is None) == (file_field is None) or (file_field is not None and file is None):
+            results[i] = {"status": 400, "error": "Must specify exactly one of path or (present) file field"}
+            continue
+
+        register_in_place = _item_bool(item, "register_in_place", False)
+        if register_in_place:
+            try:
+                if obj_path is None:
+                    raise ValueError("Only files specified by path can be registered in place")
+                obj_path = get_backend().in_place_location(obj_path)
+            except FileNotFoundError:
+                results[i] = {"status": 400, "error": f"File not found at path {obj_path}"}
+                continue
+            except ValueError as e:
+                results[i] = {"status": 400, "error": str(e)}
+                continue
+
+        prepared = {
+            "idx": i,
+            "project_id": _item_prop(item, "project_id"),
+            "dataset_id": _item_prop(item, "dataset_id"),
+            "data_type": _item_prop(item, "data_type"),
+            "public": _item_bool(item, "public", False),
+            "mime_type": _item_prop(item, "mime_type"),
+            "deduplicate": _item_bool(item, "deduplicate", True),
+            "filename": None,
+            "uploaded": file is not None,  # if True, path is a temporary file which can be moved into the backend
+            "register_in_place": register_in_place,
+            "path": obj_path,
+            "uploaded_location": None,
+            "checksum": None,
+            "extra_checksums": None,
+            "size": None,
+        }
+
+        if file is not None:
+            (
+                prepared["path"],
+                prepared["uploaded_location"],
+                prepared["checksum"],
+                prepared["extra_checksums"],
+                prepared["size"],
+            ) = receive_uploaded_file(file, logger)
+            prepared["filename"] = file.filename
+        elif prepared["deduplicate"]:
+            try:
+                prepared["checksum"], prepared["extra_checksums"] = await run_blocking(
+                    drs_file_checksums, obj_path, current_app.config["DRS_CHECKSUM_ALGORITHMS"]
+                )
+            except FileNotFoundError:
+                results[i] = {"status": 400, "error": f"File not found at path {obj_path}"}
+                continue
+
+        to_ingest.append(prepared)
+
+    # Look up potential duplicates for all items in a single query
+    candidates: dict[str, list[DrsBlob]] = {}
+    if checksums := {p["checksum"] for p in to_ingest if p["deduplicate"]}:
+        for drs_obj in DrsBlob.query.filter(DrsBlob.checksum.in_(checksums)).all():
+            candidates.setdefault(drs_obj.checksum, []).append(drs_obj)
+
+    new_objects: list[tuple[int, DrsBlob, str | None]] = []
+
+    for p in to_ingest:
+        drs_object: DrsBlob | None = None
+        object_to_copy: DrsBlob | None = None
+        uploaded_location: str | None = p["uploaded_location"]
+
+        if p["deduplicate"]:
+            drs_object, object_to_copy = find_duplicate_object(
+                p["checksum"],
+                p["project_id"],
+                p["dataset_id"],
+                p["data_type"],
+                p["public"],
+                logger,
+                candidates=candidates.get(p["checksum"], []),
+            )
+
+        if uploaded_location and (drs_object or object_to_copy):
+            logger.info("batch ingest - deleting duplicate upload at %s", uploaded_location)
+            await get_backend().delete(uploaded_location)
+            uploaded_location = None
 
         if not drs_object:
+            if object_to_copy:
+                create_kwargs = {"object_to_copy": object_to_copy}
+            else:
+                create_kwargs = {k: p[k] for k in ("checksum", "extra_checksums", "size")}
+                if uploaded_location:
+                    create_kwargs.update(location=uploaded_location, in_place=True)
+                elif p["register_in_place"]:
+                    create_kwargs.update(location=p["path"], in_place=True, registered_in_place=True)
+                else:
+                    create_kwargs.update(location=p["path"], move=p["uploaded"])
+
             try:
                 drs_object = await DrsBlob.create(
-                    **({"object_to_copy": object_to_copy} if object_to_copy else {"location": obj_path}),
-                    filename=filename,
-                    mime_type=mime_type,
-                    project_id=project_id,
-                    dataset_id=dataset_id,
-                    data_type=data_type,
-                    public=public,
+                    **create_kwargs,
+                    filename=p["filename"],
+                    mime_type=p["mime_type"],
+                    project_id=p["project_id"],
+                    dataset_id=p["dataset_id"],
+                    data_type=p["data_type"],
+                    public=p["public"],
                 )
-                db.session.add(drs_object)
-                db.session.commit()
-                logger.info("added DRS object: %s", drs_object)
-            except ValueError as e:
-                raise bad_request_log_mark(str(e), logger)
-            except Exception as e:  # TODO: More specific handling
-                authz_middleware.mark_authz_done(request)
-                logger.exception("encountered exception during ingest", exc_info=e)
-                raise InternalServerError("Error while creating the object")
+            except Exception as e:
+                if uploaded_location:  # Don't leave an object without a DRS record behind in the backend
+                    await get_backend().delete(uploaded_location)
+                if isinstance(e, (ValueError, FileNotFoundError)):
+                    results[p["idx"]] = {"status": 400, "error": str(e)}
+                else:
+                    logger.exception("encountered exception during batch ingest", exc_info=e)
+                    results[p["idx"]] = {"status": 500, "error": "Error while creating the object"}
+                continue
+
+            db.session.add(drs_object)
+            new_objects.append((p["idx"], drs_object, uploaded_location))
+
+            # Later items in the batch with the same bytes can deduplicate with this new object
+            if p["deduplicate"]:
+                candidates.setdefault(drs_object.checksum, []).append(drs_object)
 
-        return build_blob_json(drs_object, with_bento_properties=True), 201
+        results[p["idx"]] = {"status": 201, "object": drs_object}
+
+    # Bytes saved into the backend for the new objects, which must be removed again if the objects cannot be saved
+    new_locations = {
+        location
+        for _, drs_object, uploaded_location in new_objects
+        for location in (None if drs_object.registered_in_place else drs_object.location, uploaded_location)
+        if location
+    }
+
+    # All new objects are inserted in a single transaction
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        backend = get_backend()
+        for location in new_locations:
+            # As in delete_drs_object, files still referred to by existing objects are kept - e.g. a copied object's
+            # file, or a content-addressed file which was already stored.
+            if DrsBlob.query.filter_by(location=location).count() == 0:
+                logger.info("batch ingest - deleting file at %s, since its object could not be saved", location)
+                await backend.delete(location)
+        logger.exception("encountered exception while saving batch ingest", exc_info=e)
+        raise InternalServerError("Error while saving the objects")
 
+    logger.info("batch ingest - added %d DRS objects", len(new_objects))
+
+    return jsonify(
+        [
+            {"status": r["status"], "object": build_blob_json(r["object"], with_bento_properties=True)}
+            if "object" in r
+            else r
+            for r in results
+        ]
+    )
+
+
+def check_ingest_permission(target: UploadSession | IngestJob) -> bool:
+    # Checks whether the requester can ingest data into the resource of a future DRS object
+    return (
+        authz_middleware.evaluate_one(
+            request,
+            build_resource(target.project_id, target.dataset_id, target.data_type),
+            P_INGEST_DATA,
+            mark_authz_done=True,
+        )
+        if authz_enabled()
+        else True
+    )
+
+
+def fetch_and_check_ingest_job(job_id: str, logger: logging.Logger) -> IngestJob:
+    job: IngestJob | None = IngestJob.query.filter_by(id=job_id).first()
+
+    if not job:
+        has_permission_on_everything = check_everything_permission(P_INGEST_DATA)
+        authz_middleware.mark_authz_done(request)
+        if not has_permission_on_everything:  # Don't leak if this job exists
+            logger.error("No ingest job found for the requested ID; masking with 403 to prevent ID discovery")
+            raise forbidden()
+        raise NotFound("No ingest job found for this ID")
+
+    if not check_ingest_permission(job):
+        raise forbidden()
+
+    return job
+
+
+@drs_service.route("/ingest/jobs/<string:job_id>", methods=["GET"])
+def ingest_job_info(job_id: str):
+    """
+    Reports the status and progress of an asynchronous ingest (see the async parameter of /ingest), and its outcome
+    once it is done: the DRS object, or an error.
+    """
+
+    job = fetch_and_check_ingest_job(job_id, current_app.logger)
+    return build_ingest_job_json(job)
+
+
+def fetch_and_check_upload_session(upload_id: str, logger: logging.Logger) -> UploadSession:
+    session: UploadSession | None = UploadSession.query.filter_by(id=upload_id).first()
+
+    if not session:
+        has_permission_on_everything = check_everything_permission(P_INGEST_DATA)
+        authz_middleware.mark_authz_done(request)
+        if not has_permission_on_everything:  # Don't leak if this upload session exists
+            logger.error("No upload session found for the requested ID; masking with 403 to prevent ID discovery")
+            raise forbidden()
+        raise NotFound("No upload session found for this ID")
+
+    if not check_ingest_permission(session):
+        raise forbidden()
+
+    return session
+
+
+@drs_service.route("/ingest/uploads", methods=["POST"])
+async def upload_session_create():
+    """
+    Starts a resumable upload of a file of a given size. The file's chunks (of chunk_size bytes, except for the last
+    one) are then PUT, in any order or in parallel, to /ingest/uploads/<upload_id>/chunks/<offset>, after which the
+    upload is finalized into a DRS object via POST /ingest/uploads/<upload_id>/finalize.
+    """
+
+    logger = current_app.logger
+    data = request.form or {}
+
+    logger.info(f"Received upload session request metadata: {data}")
+
+    session_kwargs = {
+        "name": secure_filename(data.get("name", "")) or None,
+        "mime_type": data.get("mime_type") or None,  # replace blank strings with None
+        "project_id": data.get("project_id") or None,  # "
+        "dataset_id": data.get("dataset_id") or None,  # "
+        "data_type": data.get("data_type") or None,  # "
+        "public": data.get("public", "false").strip().lower() == "true",
+        "deduplicate": str_to_bool(data.get("deduplicate", "true")),
+    }
+
+    if not check_ingest_permission(UploadSession(**session_kwargs)):
+        raise Forbidden("Forbidden")
+
+    try:
+        size = int(data["size"])
+        chunk_size = int(data.get("chunk_size") or current_app.config["DRS_UPLOAD_CHUNK_SIZE"])
+    except (KeyError, ValueError):
+        raise bad_request_log_mark("Must specify an integer size (and optionally, an integer chunk_size)", logger)
+
+    if size < 0 or chunk_size <= 0:
+        raise bad_request_log_mark("Size must be non-negative and chunk size must be positive", logger)
+
+    mime_type = session_kwargs["mime_type"]
+    if mime_type is not None and not RE_INGESTABLE_MIME_TYPE.match(mime_type):
+        raise bad_request_log_mark("Invalid MIME type", logger)
+
+    try:
+        session = await create_upload_session(
+            size,
+            chunk_size,
+            current_app.config["DRS_UPLOAD_MAX_CHUNK_SIZE"],
+            current_app.config["DRS_INGEST_TMP_DIR"],
+            **session_kwargs,
+        )
+    except ValueError as e:
+        raise bad_request_log_mark(str(e), logger)
+    db.session.add(session)
+    db.session.commit()
+    logger.info("created upload session: %s", session)
+
+    return build_upload_session_json(session), 201
+
+
+@drs_service.route("/ingest/uploads/<string:upload_id>", methods=["GET", "DELETE"])
+async def upload_session_info(upload_id: str):
+    logger = current_app.logger
+    session = fetch_and_check_upload_session(upload_id, logger)
+
+    if request.method == "DELETE":
+        logger.info("cancelling upload session: %s", session)
+        await discard_upload_session(session)
+        db.session.delete(session)
+        db.session.commit()
+        return current_app.response_class(status=204)
+
+    return build_upload_session_json(session)
+
+
+@drs_service.route("/ingest/uploads/<string:upload_id>/chunks/<int:offset>", methods=["PUT"])
+async def upload_session_chunk(upload_id: str, offset: int):
+    logger = current_app.logger
+    session = fetch_and_check_upload_session(upload_id, logger)
+
+    if offset % session.chunk_size != 0 or offset >= max(session.size, 1):
+        raise bad_request_log_mark(f"Chunk offset must be a multiple of {session.chunk_size} within the file", logger)
+
+    try:
+        chunk = await write_upload_chunk(session, offset, request.stream)
+    except ValueError as e:
+        raise bad_request_log_mark(str(e), logger)
+
+    # A chunk may be re-sent (e.g., after a dropped connection), in which case it replaces the previous one
+    chunk = db.session.merge(chunk)
+    db.session.commit()
+    logger.debug("upload session %s - received chunk at offset %d", session.id, offset)
+
+    return build_upload_chunk_json(chunk)
+
+
+@drs_service.route("/ingest/uploads/<string:upload_id>/finalize", methods=["POST"])
+async def upload_session_finalize(upload_id: str):
+    logger = current_app.logger
+    session = fetch_and_check_upload_session(upload_id, logger)
+
+    if missing := build_upload_session_json(session)["missing"]:
+        raise bad_request_log_mark(f"Upload is missing chunks at offsets: {missing}", logger)
+
+    await complete_upload_session(session)
+    uploaded_location: str | None = session.location if session.location.startswith("s3://") else None
+
+    checksum, extra_checksums = await upload_session_checksum(session)
+
+    drs_object: DrsBlob | None = None  # either the new object, or the object to fully reuse
+    object_to_copy: DrsBlob | None = None
+
+    if session.deduplicate:
+        drs_object, object_to_copy = find_duplicate_object(
+            checksum, session.project_id, session.dataset_id, session.data_type, session.public, logger
+        )
+
+    if uploaded_location and (drs_object or object_to_copy):
+        logger.info("upload session %s - deleting duplicate upload at %s", session.id, uploaded_location)
+        await get_backend().delete(uploaded_location)
+        uploaded_location = None
+
+    # Whatever is left of the local temporary file (e.g., if it was a duplicate) is removed once we're done. The path
+    # is kept aside, since the session record is deleted along with the creation of the new object.
+    tmp_location: str | None = None if session.location.startswith("s3://") else session.location
+    db.session.delete(session)
+
+    try:
+        if not drs_object:
+            if object_to_copy:
+                create_kwargs = {"object_to_copy": object_to_copy}
+            else:
+                create_kwargs = {"checksum": checksum, "extra_checksums": extra_checksums, "size": session.size}
+                if uploaded_location:
+                    create_kwargs.update(location=uploaded_location, in_place=True)
+                else:
+                    create_kwargs.update(location=session.location, move=True)
+
+            drs_object = await create_ingested_object(
+                logger,
+                uploaded_location=uploaded_location,
+                **create_kwargs,
+                filename=session.name,
+                mime_type=session.mime_type,
+                project_id=session.project_id,
+                dataset_id=session.dataset_id,
+                data_type=session.data_type,
+                public=session.public,
+            )
+        else:
+            db.session.commit()
+    except Exception:
+        # The upload cannot be resumed after its finalization has failed, so get rid of the session entirely
+        db.session.rollback()
+        db.session.delete(session)
+        db.session.commit()
+        raise
     finally:
-        os.close(tfh)
-        os.remove(t_obj_path)
+        if tmp_location:
+            remove_upload_tmp_file(tmp_location)
+
+    return build_blob_json(drs_object, with_bento_properties=True), 201
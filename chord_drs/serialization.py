@@ -3,12 +3,24 @@ from urllib.parse import urlparse
 
 from flask import current_app, url_for
 
+from .constants import ACCESS_ID_S3_PRESIGNED
 from .data_sources import DATA_SOURCE_LOCAL, DATA_SOURCE_S3
-from .models import DrsBlob
-from .types import DRSAccessMethodDict, DRSObjectBentoDict, DRSObjectDict
+from .models import DrsBlob, IngestJob, UploadChunk, UploadSession
+from .types import (
+    DRSAccessMethodDict,
+    DRSObjectBentoDict,
+    DRSObjectDict,
+    IngestJobDict,
+    UploadChunkDict,
+    UploadSessionDict,
+)
 
 __all__ = [
+    "s3_presigned_urls_enabled",
     "build_blob_json",
+    "build_upload_chunk_json",
+    "build_upload_session_json",
+    "build_ingest_job_json",
 ]
 
 
@@ -20,6 +32,10 @@ def create_drs_uri(object_id: str) -> str:
     return f"drs://{get_drs_host()}/{object_id}"
 
 
+def s3_presigned_urls_enabled() -> bool:
+    return current_app.config["SERVICE_DATA_SOURCE"] == DATA_SOURCE_S3 and current_app.config["S3_PRESIGNED_URLS"]
+
+
 def build_bento_object_json(drs_object: DrsBlob) -> DRSObjectBentoDict:
     return {
         "project_id": drs_object.project_id,
@@ -72,6 +88,10 @@ def build_blob_json(
                 "type": "s3",
             }
         )
+        if s3_presigned_urls_enabled():
+            # Exchanged for a short-lived presigned URL (via /objects/<id>/access/<access_id>), which lets clients fetch
+            # the object directly from S3.
+            access_methods.append({"access_id": ACCESS_ID_S3_PRESIGNED, "type": "https"})
 
     return {
         "access_methods": access_methods,
@@ -80,6 +100,7 @@ def build_blob_json(
                 "checksum": drs_blob.checksum,
                 "type": "sha-256",
             },
+            *({"checksum": c.checksum, "type": c.type} for c in drs_blob.extra_checksums),
         ],
         "created_time": f"{drs_blob.created.isoformat('T')}Z",
         "size": drs_blob.size,
@@ -92,3 +113,36 @@ def build_blob_json(
         "self_uri": create_drs_uri(drs_blob.id),
         **({"bento": build_bento_object_json(drs_blob)} if with_bento_properties else {}),
     }
+
+
+def build_upload_chunk_json(chunk: UploadChunk) -> UploadChunkDict:
+    return {
+        "offset": chunk.offset,
+        "size": chunk.size,
+    }
+
+
+def build_upload_session_json(session: UploadSession) -> UploadSessionDict:
+    received = {c.offset for c in session.chunks}
+    offsets = range(0, session.n_chunks * session.chunk_size, session.chunk_size)
+    return {
+        "id": session.id,
+        "size": session.size,
+        "chunk_size": session.chunk_size,
+        "n_chunks": session.n_chunks,
+        "chunks": [build_upload_chunk_json(c) for c in session.chunks],
+        "missing": [o for o in offsets if o not in received],
+    }
+
+
+def build_ingest_job_json(job: IngestJob) -> IngestJobDict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "size": job.size,
+        "bytes_hashed": job.bytes_hashed,
+        "bytes_uploaded": job.bytes_uploaded,
+        # Outcome, once the job is done:
+        **({"object": build_blob_json(job.object, with_bento_properties=True)} if job.object is not None else {}),
+        **({"error": job.error} if job.error is not None else {}),
+    }
@@ -6,6 +6,9 @@ __all__ = [
     "DRSChecksumDict",
     "DRSObjectBentoDict",
     "DRSObjectDict",
+    "UploadChunkDict",
+    "UploadSessionDict",
+    "IngestJobDict",
 ]
 
 
@@ -48,3 +51,27 @@ class DRSObjectDict(TypedDict):
     mime_type: NotRequired[str]
     aliases: NotRequired[list[str]]
     bento: NotRequired[DRSObjectBentoDict]
+
+
+class UploadChunkDict(TypedDict):
+    offset: int
+    size: int
+
+
+class UploadSessionDict(TypedDict):
+    id: str
+    size: int
+    chunk_size: int
+    n_chunks: int
+    chunks: list[UploadChunkDict]  # chunks received so far
+    missing: list[int]  # offsets of chunks which have not been received yet
+
+
+class IngestJobDict(TypedDict):
+    id: str
+    status: str  # queued, running, succeeded or failed
+    size: int
+    bytes_hashed: int
+    bytes_uploaded: int  # bytes saved to the backend, if the file had to be copied or uploaded
+    object: NotRequired[DRSObjectDict]  # if the job succeeded: the new (or deduplicated) DRS object
+    error: NotRequired[str]  # if the job failed
@@ -0,0 +1,240 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from typing import BinaryIO
+from uuid import uuid4
+
+import botocore.exceptions
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from .backend import get_backend
+from .backends.s3 import MAX_MULTIPART_CHUNK_SIZE, MAX_PARTS, S3Backend, multipart_chunk_size
+from .constants import CHUNK_SIZE
+from .db import db
+from .models import UploadChunk, UploadSession
+from .utils import IncrementalChecksum, drs_file_checksums, run_blocking
+
+__all__ = [
+    "create_upload_session",
+    "write_upload_chunk",
+    "upload_session_checksum",
+    "complete_upload_session",
+    "discard_upload_session",
+    "remove_upload_tmp_file",
+    "expire_upload_sessions",
+]
+
+# How often (in seconds) each process looks for expired upload sessions (see DRS_UPLOAD_SESSION_TTL)
+UPLOAD_EXPIRY_INTERVAL = 60 * 60
+
+
+class _RunningChecksums:
+    """
+    Per-process registry of whole-file checksums for upload sessions, advanced as long as chunks arrive in order. When a
+    session is uploaded sequentially (the common case), its whole-file checksum is thus known as soon as the last chunk
+    has been received, and finalization does not have to read the data again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checksums: dict[str, IncrementalChecksum] = {}
+
+    def start(self, session_id: str, algorithms: tuple[str, ...]) -> None:
+        with self._lock:
+            self._checksums[session_id] = IncrementalChecksum(algorithms)
+
+    def update(self, session_id: str, offset: int, data: bytes) -> None:
+        with self._lock:
+            if (checksum := self._checksums.get(session_id)) is not None and checksum.size == offset:
+                checksum.update(data)
+
+    def invalidate(self, session_id: str, offset: int) -> None:
+        # A chunk was (re-)written before the running checksum's position, so it no longer matches the data
+        with self._lock:
+            if (checksum := self._checksums.get(session_id)) is not None and checksum.size > offset:
+                del self._checksums[session_id]
+
+    def pop(self, session_id: str, size: int) -> tuple[str, dict[str, str]] | None:
+        with self._lock:
+            checksum = self._checksums.pop(session_id, None)
+        if checksum is None or checksum.size != size:
+            return None
+        return checksum.hexdigest(), checksum.extra_hexdigests()
+
+
+_running_checksums = _RunningChecksums()
+
+_uploads_expired_at: float | None = None
+_uploads_expiry_lock = threading.Lock()
+
+
+async def create_upload_session(
+    size: int, chunk_size: int, max_chunk_size: int, tmp_dir: str | None, **kwargs
+) -> UploadSession:
+    """
+    Creates a new upload session for a file of the given size, along with the place its chunks will be assembled in:
+    a temporary file of the final size (for the local backend), or an S3 multipart upload. Keyword arguments are the
+    properties of the future DRS object.
+    Raises ValueError if the chunk size needed for the file is larger than max_chunk_size (or S3's part size maximum.)
+    """
+
+    session = UploadSession(id=str(uuid4()), size=size, **kwargs)
+    backend = get_backend()
+
+    if chunk_size > max_chunk_size:
+        raise ValueError(f"Chunk size must be at most {max_chunk_size} bytes")
+
+    if isinstance(backend, S3Backend):
+        # Each chunk is uploaded as one part, so chunks must respect S3's part size minimum and count maximum
+        session.chunk_size = multipart_chunk_size(size, chunk_size)
+        if session.chunk_size > (max_part_size := min(max_chunk_size, MAX_MULTIPART_CHUNK_SIZE)):
+            raise ValueError(f"File is too large to upload in at most {MAX_PARTS} chunks of {max_part_size} bytes")
+        object_key = f"{session.id[:12]}-{secure_filename(session.name or '') or 'upload'}"
+        session.location = backend._build_s3_location(object_key)
+        session.s3_upload_id = await backend.create_multipart_upload(session.location)
+    else:
+        session.chunk_size = chunk_size
+        fd, session.location = await run_blocking(tempfile.mkstemp, dir=tmp_dir, prefix=f"upload-{session.id}-")
+        try:
+            await run_blocking(os.ftruncate, fd, size)  # Chunks are written in place at their offsets
+        finally:
+            os.close(fd)
+
+    _running_checksums.start(session.id, current_app.config["DRS_CHECKSUM_ALGORITHMS"])
+
+    return session
+
+
+async def write_upload_chunk(session: UploadSession, offset: int, stream: BinaryIO) -> UploadChunk:
+    """
+    Reads one chunk of the session's file from the stream, writing it to its place, and feeding it to the session's
+    running checksum if it is the next chunk in order.
+    Raises ValueError if the stream does not contain exactly the expected number of bytes for the chunk.
+    """
+
+    expected_size = session.chunk_length(offset)
+
+    # If this chunk overwrites bytes which have already been fed to the running checksum, it can no longer be used
+    _running_checksums.invalidate(session.id, offset)
+
+    def _read_chunk():
+        received = 0
+        while chunk := stream.read(CHUNK_SIZE):
+            if received + len(chunk) > expected_size:
+                raise ValueError(f"Expected chunk of {expected_size} bytes at offset {offset}")
+            _running_checksums.update(session.id, offset + received, chunk)
+            received += len(chunk)
+            yield chunk
+        if received != expected_size:
+            raise ValueError(f"Expected chunk of {expected_size} bytes at offset {offset}")
+
+    def _write_chunk() -> None:
+        fd = os.open(session.location, os.O_WRONLY)
+        try:
+            pos = offset
+            for chunk in _read_chunk():
+                pos += os.pwrite(fd, chunk, pos)
+        finally:
+            os.close(fd)
+
+    etag: str | None = None
+
+    try:
+        if session.s3_upload_id is not None:
+            # Parts are uploaded in one request, so the chunk is buffered in memory (at most one part's worth of bytes)
+            data = await run_blocking(b"".join, _read_chunk())
+            etag = await get_backend().upload_part(
+                session.location, session.s3_upload_id, offset // session.chunk_size + 1, data
+            )
+        else:
+            await run_blocking(_write_chunk)
+    except Exception:
+        _running_checksums.invalidate(session.id, offset)
+        raise
+
+    return UploadChunk(session_id=session.id, offset=offset, size=expected_size, etag=etag)
+
+
+async def upload_session_checksum(session: UploadSession) -> tuple[str, dict[str, str]]:
+    """
+    Returns the SHA-256 checksum of a completely received (and, on S3, completed) upload, along with its checksums for
+    any additional configured algorithms. These are only computed by reading the assembled file again if the chunks did
+    not all arrive, in order, at this process.
+    """
+
+    if (checksums := _running_checksums.pop(session.id, session.size)) is not None:
+        return checksums
+
+    algorithms: tuple[str, ...] = current_app.config["DRS_CHECKSUM_ALGORITHMS"]
+
+    if not session.location.startswith("s3://"):
+        return await run_blocking(drs_file_checksums, session.location, algorithms)
+
+    # The parts of a multipart upload cannot be read back individually, so hash the completed object instead
+    checksum = IncrementalChecksum(algorithms)
+    async for chunk in get_backend().stream(session.location, size=session.size):
+        checksum.update(chunk)
+    return checksum.hexdigest(), checksum.extra_hexdigests()
+
+
+async def complete_upload_session(session: UploadSession) -> None:
+    """
+    Assembles the received chunks into a complete file at the session's location.
+    For the local backend, chunks were written in place, so there is nothing left to do.
+    """
+
+    if session.s3_upload_id is not None:
+        await get_backend().complete_multipart_upload(
+            session.location, session.s3_upload_id, [c.etag for c in session.chunks]
+        )
+        session.s3_upload_id = None
+
+
+async def discard_upload_session(session: UploadSession) -> None:
+    """
+    Removes anything left over from an upload session which is being cancelled, or which has been finalized.
+    """
+
+    _running_checksums.pop(session.id, session.size)
+
+    if session.s3_upload_id is not None:
+        await get_backend().abort_multipart_upload(session.location, session.s3_upload_id)
+    elif not session.location.startswith("s3://"):
+        remove_upload_tmp_file(session.location)
+
+
+def remove_upload_tmp_file(location: str) -> None:
+    with suppress(FileNotFoundError):  # File may have been moved into place by the backend already
+        os.remove(location)
+
+
+async def expire_upload_sessions() -> None:
+    """
+    Discards upload sessions which were created more than DRS_UPLOAD_SESSION_TTL seconds ago, along with their temporary
+    files or S3 multipart uploads. Run before requests, at most once every UPLOAD_EXPIRY_INTERVAL seconds per process.
+    """
+
+    global _uploads_expired_at
+    now = time.monotonic()
+    with _uploads_expiry_lock:
+        if _uploads_expired_at is not None and now - _uploads_expired_at < UPLOAD_EXPIRY_INTERVAL:
+            return
+        _uploads_expired_at = now
+
+    # Timestamps are generated by the database (CURRENT_TIMESTAMP), i.e. in UTC
+    ttl = timedelta(seconds=current_app.config["DRS_UPLOAD_SESSION_TTL"])
+    expired_before = datetime.now(UTC).replace(tzinfo=None) - ttl
+
+    for session in db.session.query(UploadSession).filter(UploadSession.created < expired_before).all():
+        current_app.logger.info("discarding expired upload session: %s", session)
+        try:
+            await discard_upload_session(session)
+        except botocore.exceptions.ClientError as e:  # e.g., the multipart upload was already aborted elsewhere
+            current_app.logger.warning("could not abort multipart upload for expired session %s: %s", session, e)
+        db.session.delete(session)
+
+    db.session.commit()
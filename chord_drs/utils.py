@@ -1,63 +1,262 @@
 import asyncio
-from collections.abc import AsyncGenerator, Generator
+import hashlib
+import os
+import queue
+import threading
+from collections.abc import AsyncGenerator, Callable, Coroutine, Generator, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from hashlib import sha256
 from logging import Logger
 from typing import Any
 
 __all__ = [
+    "DEFAULT_IO_WORKERS",
+    "ConfigurableExecutor",
+    "CHECKSUM_ALGORITHMS",
+    "validate_checksum_algorithms",
+    "IncrementalChecksum",
     "drs_file_checksum",
+    "drs_file_checksums",
+    "configure_io_executor",
+    "run_blocking",
+    "run_on_stream_loop",
     "sync_generator_stream",
 ]
 
-CHUNK_SIZE = 16 * 1024
+# Buffer size for reading files to hash them; hashing throughput levels off at around 256 KB
+HASH_CHUNK_SIZE = 256 * 1024
 
+DEFAULT_IO_WORKERS = 8
 
-def drs_file_checksum(path: str, chunk_size: int = CHUNK_SIZE) -> str:
-    hash_obj = sha256()
+
+class ConfigurableExecutor:
+    """
+    A process-wide thread pool, created on first use with a default number of threads, which can be re-created with
+    another maximum number of threads (e.g., from configuration.) Any work already submitted to a previous pool is left
+    to finish.
+    """
+
+    def __init__(self, default_workers: int, thread_name_prefix: str):
+        self._default_workers = default_workers
+        self._thread_name_prefix = thread_name_prefix
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers: int) -> None:
+        with self._lock:
+            old_executor = self._executor
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self._thread_name_prefix)
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+
+    def get(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._default_workers, thread_name_prefix=self._thread_name_prefix
+                )
+            return self._executor
+
+
+_io_executor = ConfigurableExecutor(DEFAULT_IO_WORKERS, "drs-io")
+
+
+def configure_io_executor(max_workers: int = DEFAULT_IO_WORKERS) -> None:
+    """
+    (Re-)creates the process-wide thread pool which blocking file work (hashing, copying, stat-ing, ...) is run in, with
+    the given maximum number of threads. Any work already submitted to a previous pool is left to finish.
+    """
+    _io_executor.configure(max_workers)
+
+
+async def run_blocking[T](func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Runs a blocking function in the bounded I/O thread pool and waits for its result without blocking the event loop,
+    so concurrent ingests can overlap. Since the pool is bounded, at most a fixed number of files are hashed or copied
+    at once, however many requests are in flight.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_io_executor.get(), partial(func, *args, **kwargs))
+
+
+class _CRC32C:
+    """
+    hashlib-style wrapper around the optional crc32c package, for CRC32C checksums (as used by, e.g., Google Cloud
+    Storage.) The checksum is represented as 8 hexadecimal digits, like the other algorithms' digests.
+    """
+
+    def __init__(self):
+        import crc32c  # optional dependency; only needed if CRC32C checksums are enabled
+
+        self._crc32c = crc32c.crc32c
+        self._value: int = 0
+
+    def update(self, chunk: bytes) -> None:
+        self._value = self._crc32c(chunk, self._value)
+
+    def hexdigest(self) -> str:
+        return f"{self._value:08x}"
+
+
+# Additional checksum algorithms which can be computed alongside SHA-256, keyed by their name in DRS checksum objects
+# (see https://ga4gh.github.io/data-repository-service-schemas/preview/release/drs-1.4.0/docs/#tag/Checksum)
+CHECKSUM_ALGORITHMS: dict[str, Callable[[], Any]] = {
+    "md5": partial(hashlib.new, "md5", usedforsecurity=False),
+    "sha-1": partial(hashlib.new, "sha1", usedforsecurity=False),
+    "sha-512": hashlib.sha512,
+    "blake2b": hashlib.blake2b,
+    "crc32c": _CRC32C,
+}
+
+
+def validate_checksum_algorithms(algorithms: Iterable[str]) -> None:
+    """
+    Raises ValueError if any of the given additional checksum algorithms is unknown or unavailable.
+    """
+    for algorithm in algorithms:
+        if algorithm not in CHECKSUM_ALGORITHMS:
+            raise ValueError(f"Unsupported checksum algorithm: {algorithm}")
+        try:
+            CHECKSUM_ALGORITHMS[algorithm]()
+        except ImportError as e:
+            raise ValueError(f"Checksum algorithm {algorithm} is unavailable: {e}")
+
+
+class IncrementalChecksum:
+    """
+    Accumulates the SHA-256 checksum and size of a byte stream as chunks pass through it, so that bytes being written
+    somewhere else (e.g., an upload being received) do not have to be read again afterwards to be hashed.
+    Checksums for any additional algorithms (see CHECKSUM_ALGORITHMS) are computed in the same pass.
+    """
+
+    def __init__(self, algorithms: Iterable[str] = ()):
+        self._hash_obj = sha256()
+        self._extra_hash_objs = {a: CHECKSUM_ALGORITHMS[a]() for a in algorithms}
+        self.size: int = 0
+
+    def update(self, chunk: bytes) -> None:
+        self._hash_obj.update(chunk)
+        for hash_obj in self._extra_hash_objs.values():
+            hash_obj.update(chunk)
+        self.size += len(chunk)
+
+    def hexdigest(self) -> str:
+        return self._hash_obj.hexdigest()
+
+    def extra_hexdigests(self) -> dict[str, str]:
+        return {a: hash_obj.hexdigest() for a, hash_obj in self._extra_hash_objs.items()}
+
+
+def _file_checksum(
+    path: str, algorithms: Iterable[str], chunk_size: int, progress: Callable[[int], None] | None = None
+) -> IncrementalChecksum:
+    checksum = IncrementalChecksum(algorithms)
 
     with open(path, "rb") as f:
         while chunk := f.read(chunk_size):
-            hash_obj.update(chunk)
+            checksum.update(chunk)
+            if progress:
+                progress(len(chunk))
 
-    return hash_obj.hexdigest()
+    return checksum
 
 
-def _iter_over_async(async_generator: AsyncGenerator, logger: Logger):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    iterator = async_generator.__aiter__()
+def drs_file_checksum(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    return _file_checksum(path, (), chunk_size).hexdigest()
 
-    async def get_next() -> tuple[bool, Any]:
-        try:
-            obj_ = await iterator.__anext__()
-            return False, obj_
-        except StopAsyncIteration:
-            return True, None
-        except Exception:  # pragma: no cover
-            logger.exception("exception occurred in _iter_over_async")
-            return True, None
 
-    try:
-        while True:
-            done, next_obj = loop.run_until_complete(get_next())
-            if done:
-                break
-            yield next_obj
-    finally:
-        loop.close()
+def drs_file_checksums(
+    path: str,
+    algorithms: Iterable[str] = (),
+    chunk_size: int = HASH_CHUNK_SIZE,
+    progress: Callable[[int], None] | None = None,
+) -> tuple[str, dict[str, str]]:
+    """
+    Computes the SHA-256 checksum of a file, along with checksums for any additional algorithms, in a single read.
+    If passed, progress is called with the number of bytes read after each chunk.
+    """
+    checksum = _file_checksum(path, algorithms, chunk_size, progress)
+    return checksum.hexdigest(), checksum.extra_hexdigests()
+
+
+# Number of chunks which a stream reads ahead of what has been sent to the client
+STREAM_READ_AHEAD = 4
+
+_stream_loop: asyncio.AbstractEventLoop | None = None
+_stream_loop_pid: int | None = None
+_stream_loop_lock = threading.Lock()
 
+_STREAM_END = object()
 
-def sync_generator_stream[T](async_generator: AsyncGenerator[T, None], logger: Logger) -> Generator[T, None, None]:
+
+def _get_stream_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the process-wide event loop which async streams are driven on, running forever in a dedicated thread. It is
+    started on first use, and again in a forked worker process, since the thread running it does not survive a fork.
+    """
+
+    global _stream_loop, _stream_loop_pid
+    with _stream_loop_lock:
+        if _stream_loop is None or _stream_loop_pid != os.getpid():
+            _stream_loop = asyncio.new_event_loop()
+            _stream_loop_pid = os.getpid()
+            threading.Thread(target=_stream_loop.run_forever, name="drs-stream-loop", daemon=True).start()
+        return _stream_loop
+
+
+async def run_on_stream_loop[T](coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Awaits a coroutine on the shared stream loop (see _get_stream_loop) from any event loop. Objects bound to the loop
+    they were created on, such as the pooled S3 clients, can thus be shared by all requests and streams.
+    """
+
+    loop = _get_stream_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def sync_generator_stream[T](
+    async_generator: AsyncGenerator[T, None], logger: Logger, read_ahead: int = STREAM_READ_AHEAD
+) -> Generator[T, None, None]:
     """
     Flask cannot handle async generators for streaming responses on its own.
     This function takes in an AsyncGenerator and returns a sync Generator
     bridge that yields the chunks as they arrive.
 
-    Adopted from: https://medium.com/@mr.murga/streaming-ai-responses-with-flask-a-practical-guide-677c15e82cdd
+    The async generator is driven on a shared, long-lived event loop (see _get_stream_loop) rather than on a new loop
+    per stream, and up to read_ahead chunks are fetched while the previous ones are being sent to the client. Reading
+    only starts once the returned generator is first iterated, and stops if it is closed early (e.g., on disconnect.)
     """
 
-    async def iterator():
-        async for chunk in async_generator:
-            yield chunk
+    loop = _get_stream_loop()
+    chunks: queue.SimpleQueue = queue.SimpleQueue()
+    slots = asyncio.Semaphore(read_ahead)  # bounds the number of chunks read, but not yet taken by the consumer
+
+    async def produce():
+        try:
+            while True:
+                await slots.acquire()
+                try:
+                    chunk = await anext(async_generator)
+                except StopAsyncIteration:
+                    break
+                chunks.put(chunk)
+        except asyncio.CancelledError:
+            await async_generator.aclose()  # release whatever the generator holds (e.g., an S3 connection)
+            raise
+        except Exception:  # pragma: no cover
+            logger.exception("exception occurred in sync_generator_stream")
+        finally:
+            chunks.put(_STREAM_END)
+
+    def consume() -> Generator[T, None, None]:
+        future = asyncio.run_coroutine_threadsafe(produce(), loop)
+        try:
+            while (chunk := chunks.get()) is not _STREAM_END:
+                loop.call_soon_threadsafe(slots.release)
+                yield chunk
+        finally:
+            future.cancel()
 
-    return _iter_over_async(iterator(), logger)
+    return consume()
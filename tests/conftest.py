@@ -14,7 +14,7 @@ from flask.testing import FlaskClient
 from pytest_lazyfixture import lazy_fixture
 
 # Must only be imports that don't import authz/app/config/db
-from chord_drs.backends.s3 import S3Backend
+from chord_drs.backends.s3 import S3Backend, close_s3_clients
 from chord_drs.data_sources import DATA_SOURCE_LOCAL, DATA_SOURCE_S3
 from tests.constants import (
     AUTHZ_URL,
@@ -112,6 +112,8 @@ def s3_session(s3_server):
 
     yield
 
+    # Pooled clients would otherwise outlive the mock server, which is restarted for each test
+    close_s3_clients()
     session.stop()
 
 
@@ -141,7 +143,14 @@ def s3_config() -> dict:
 
 
 @pytest.fixture
-def client_s3(s3_session, drs_base_url, s3_config, test_logger) -> Generator[FlaskClient, None, None]:
+def ingest_job_dir(tmp_path, monkeypatch):
+    from chord_drs.app import application
+
+    monkeypatch.setitem(application.config, "DRS_INGEST_JOB_DIR", str(tmp_path / "ingest_jobs"))
+
+
+@pytest.fixture
+def client_s3(s3_session, drs_base_url, s3_config, ingest_job_dir, test_logger) -> Generator[FlaskClient, None, None]:
     os.environ["BENTO_AUTHZ_SERVICE_URL"] = AUTHZ_URL
 
     import asyncio
@@ -175,7 +184,7 @@ def local_volume():
 
 
 @pytest.fixture
-def client_local(local_volume: pathlib.Path, drs_base_url) -> Generator[FlaskClient, None, None]:
+def client_local(local_volume: pathlib.Path, drs_base_url, ingest_job_dir) -> Generator[FlaskClient, None, None]:
     os.environ["BENTO_AUTHZ_SERVICE_URL"] = AUTHZ_URL
     os.environ["DATA"] = str(local_volume)
 
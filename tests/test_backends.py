@@ -1,9 +1,22 @@
+import asyncio
+import os
 import pathlib
+import time
+from hashlib import sha256
 
 import pytest
+from prometheus_client import REGISTRY
 
+from chord_drs.backend import get_backend
+from chord_drs.backends.block_cache import BlockCache
 from chord_drs.backends.local import LocalBackend
-from chord_drs.backends.s3 import S3Backend
+from chord_drs.backends.s3 import MIN_MULTIPART_CHUNK_SIZE, S3Backend, S3UploadStream, multipart_chunk_size
+from chord_drs.backends.s3_cache import RE_CACHE_ENTRY, S3DiskCache
+from chord_drs.utils import run_on_stream_loop
+
+from .constants import AUTHZ_URL
+
+os.environ["BENTO_AUTHZ_SERVICE_URL"] = AUTHZ_URL  # S3 client fixtures need this set before the app is imported
 
 
 @pytest.mark.asyncio
@@ -19,6 +32,60 @@ async def test_local_backend(local_volume, test_logger):
     assert not (local_volume / "dummy_file.txt").exists()
 
 
+@pytest.mark.asyncio
+async def test_local_backend_move(local_volume, test_logger):
+    backend = LocalBackend({"SERVICE_DATA": str(local_volume)}, test_logger)
+
+    # temporary file on the same filesystem as the backend directory - should be renamed into place, not copied
+    tmp_file = local_volume / "tmp_upload"
+    tmp_file.write_bytes(b"some bytes")
+    tmp_inode = tmp_file.stat().st_ino
+
+    new_location = pathlib.Path(await backend.save(tmp_file, "moved.txt", move=True))
+    assert not tmp_file.exists()
+    assert new_location.read_bytes() == b"some bytes"
+    assert new_location.stat().st_ino == tmp_inode
+
+
+@pytest.mark.asyncio
+async def test_local_backend_hardlink(local_volume, test_logger):
+    backend = LocalBackend({"SERVICE_DATA": str(local_volume), "DRS_LOCAL_HARDLINK_INGEST": True}, test_logger)
+
+    src_file = local_volume / "src.txt"
+    src_file.write_bytes(b"some bytes")
+
+    new_location = pathlib.Path(await backend.save(src_file, "linked.txt"))
+    assert src_file.exists()  # not moved, since the source file must be kept
+    assert new_location.read_bytes() == b"some bytes"
+    # either reflinked (separate inode) or hard-linked, depending on the filesystem the tests run on
+    assert new_location.stat().st_ino != src_file.stat().st_ino or src_file.stat().st_nlink == 2
+
+
+@pytest.mark.asyncio
+async def test_local_backend_content_addressed(local_volume, test_logger):
+    from chord_drs.utils import drs_file_checksum
+
+    backend = LocalBackend({"SERVICE_DATA": str(local_volume), "DRS_LOCAL_CONTENT_ADDRESSED": True}, test_logger)
+
+    file_to_ingest = pathlib.Path(__file__).parent / "dummy_file.txt"
+    checksum = drs_file_checksum(str(file_to_ingest))
+
+    loc_1 = await backend.save(file_to_ingest, "dummy_file.txt", checksum=checksum)
+    assert loc_1 == str(local_volume / "sha256" / checksum[:2] / checksum[2:4] / checksum)
+    assert pathlib.Path(loc_1).read_bytes() == file_to_ingest.read_bytes()
+
+    # same bytes, different name --> same location
+    loc_2 = await backend.save(file_to_ingest, "dummy_file_2.txt", checksum=checksum)
+    assert loc_1 == loc_2
+    assert len(list(pathlib.Path(loc_1).parent.iterdir())) == 1  # no leftover temporary files
+
+    await backend.delete(loc_1)
+    assert not pathlib.Path(loc_1).exists()
+
+    with pytest.raises(ValueError):  # content-addressed layout needs a checksum
+        await backend.save(file_to_ingest, "dummy_file.txt")
+
+
 @pytest.mark.asyncio
 async def test_local_backend_raises(local_volume, test_logger):
     backend = LocalBackend({"SERVICE_DATA": str(local_volume)}, test_logger)
@@ -28,6 +95,41 @@ async def test_local_backend_raises(local_volume, test_logger):
         await backend.delete("/tmp/does_not_exist.txt")
 
 
+def test_local_backend_offload_headers(local_volume, tmp_path, test_logger):
+    config = {"SERVICE_DATA": str(local_volume), "DRS_LOCAL_OFFLOAD": "x-accel-redirect"}
+    backend = LocalBackend(config, test_logger)
+
+    assert backend.offload_headers(str(local_volume / "sha256" / "a b")) == {
+        "X-Accel-Redirect": "/drs-data/sha256/a%20b"
+    }
+    assert backend.offload_headers(str(tmp_path / "in_place.txt")) is None  # not under the mapped data directory
+
+    backend = LocalBackend({**config, "DRS_LOCAL_OFFLOAD": "x-sendfile"}, test_logger)
+    assert backend.offload_headers(str(tmp_path / "in_place.txt")) == {"X-Sendfile": str(tmp_path / "in_place.txt")}
+
+    assert LocalBackend({"SERVICE_DATA": str(local_volume)}, test_logger).offload_headers(str(tmp_path)) is None
+    with pytest.raises(ValueError):
+        LocalBackend({**config, "DRS_LOCAL_OFFLOAD": "sendfile"}, test_logger)
+
+
+def test_file_range(tmp_path):
+    from chord_drs.backends.local import FileRange
+
+    fp = tmp_path / "file.bin"
+    fp.write_bytes(bytes(range(100)))
+
+    fr = FileRange(fp, 10, 20)
+    assert os.lseek(fr.fileno(), 0, os.SEEK_CUR) == 10  # sendfile-based servers start from the file's offset
+    assert fr.read(4) == bytes(range(10, 14))
+    assert fr.read() == bytes(range(14, 20))
+    assert fr.read() == b""
+    fr.close()
+
+    fr = FileRange(fp)
+    assert fr.read() == bytes(range(100))
+    fr.close()
+
+
 def test_s3_backend_location_handling(s3_config, test_logger):
     backend = S3Backend(s3_config, test_logger)
 
@@ -45,3 +147,305 @@ def test_s3_backend_location_handling(s3_config, test_logger):
     invalid_location = "some-blob"
     with pytest.raises(ValueError):
         backend._location_to_object_key(invalid_location)
+
+
+@pytest.mark.parametrize(
+    "file_size,chunk_size,expected",
+    [
+        (None, 16 * 1024**2, 16 * 1024**2),  # unknown size --> configured chunk size
+        (1024, 16 * 1024**2, 16 * 1024**2),
+        (1024, 1024, MIN_MULTIPART_CHUNK_SIZE),  # chunk size below the S3 minimum
+        (100 * 1024**3, 5 * 1024**2, 11 * 1024**2),  # 100 GB would be 20,480 parts at 5 MB --> 11 MB parts
+        (100 * 1024**3, 64 * 1024**2, 64 * 1024**2),  # 1,600 parts
+    ],
+)
+def test_s3_multipart_chunk_size(file_size, chunk_size, expected):
+    size = multipart_chunk_size(file_size, chunk_size)
+    assert size == expected
+    assert file_size is None or size * 10000 >= file_size
+
+
+def test_s3_upload_stream_multipart(client_s3):
+    from flask import g
+
+    backend: S3Backend = g.backend
+    s3 = backend.get_sync_s3_client()
+
+    parts_before = REGISTRY.get_sample_value("drs_s3_upload_parts_sum") or 0
+
+    data = b"0123456789abcdef" * 768 * 1024  # 12 MB --> 3 parts
+    stream = S3UploadStream(backend, "streamed-object", part_size=MIN_MULTIPART_CHUNK_SIZE, max_concurrency=2)
+    for i in range(0, len(data), 64 * 1024):
+        stream.write(data[i : i + 64 * 1024])
+    stream.finish()
+    stream.close()
+
+    assert stream.size == len(data)
+    assert stream.checksum == sha256(data).hexdigest()
+    assert stream.location == f"s3://{backend.bucket_name}/streamed-object"
+    assert s3.get_object(Bucket=backend.bucket_name, Key="streamed-object")["Body"].read() == data
+    assert REGISTRY.get_sample_value("drs_s3_upload_parts_sum") == parts_before + 3
+
+
+def test_s3_upload_stream_abort(client_s3):
+    from flask import g
+
+    backend: S3Backend = g.backend
+    s3 = backend.get_sync_s3_client()
+
+    stream = S3UploadStream(backend, "aborted-object", part_size=MIN_MULTIPART_CHUNK_SIZE)
+    stream.write(b"a" * (6 * 1024 * 1024))  # more than one part, so a multipart upload is started
+    stream.close()  # never finished
+
+    assert not s3.list_multipart_uploads(Bucket=backend.bucket_name).get("Uploads")
+    assert not s3.list_objects_v2(Bucket=backend.bucket_name).get("Contents")
+
+
+def test_s3_pooled_clients(client_s3, test_logger):
+    from flask import current_app, g
+
+    backend: S3Backend = g.backend
+    other_backend = S3Backend(current_app.config, test_logger)
+
+    created_before = REGISTRY.get_sample_value("drs_s3_clients_created_total", {"client": "async"})
+
+    # Backend instances share one client (created by the fixture), whichever event loop they're used from
+    client = asyncio.run(run_on_stream_loop(backend._get_s3_client()))
+    assert asyncio.run(run_on_stream_loop(other_backend._get_s3_client())) is client
+    assert backend.get_sync_s3_client() is other_backend.get_sync_s3_client()
+
+    assert REGISTRY.get_sample_value("drs_s3_clients_created_total", {"client": "async"}) == created_before
+    assert REGISTRY.get_sample_value("drs_s3_pool_size", {"client": "async"}) == backend.max_pool_connections
+
+    # A download holds a pooled connection until it is read in full or closed
+    backend.get_sync_s3_client().put_object(Bucket=backend.bucket_name, Key="pooled", Body=b"a" * (4 * 1024 * 1024))
+    stream = asyncio.run(backend.get_stream_generator(f"s3://{backend.bucket_name}/pooled"))
+    assert len(next(stream)) > 0
+    assert REGISTRY.get_sample_value("drs_s3_pool_in_use", {"client": "async"}) == 1
+    stream.close()
+    for _ in range(50):  # the stream is closed on the shared loop
+        if REGISTRY.get_sample_value("drs_s3_pool_in_use", {"client": "async"}) == 0:
+            break
+        time.sleep(0.02)
+    assert REGISTRY.get_sample_value("drs_s3_pool_in_use", {"client": "async"}) == 0
+
+    # ... including when the stream of an object dict is closed before it is read at all
+    async def close_unread():
+        obj = await backend.get_s3_object_dict(f"s3://{backend.bucket_name}/pooled")
+        assert obj["headers"]["Content-Length"] == str(4 * 1024 * 1024)
+        assert REGISTRY.get_sample_value("drs_s3_pool_in_use", {"client": "async"}) == 1
+        await obj["generator"].aclose()
+        await obj["generator"].aclose()  # closing twice only releases the connection once
+
+    asyncio.run(close_unread())
+    assert REGISTRY.get_sample_value("drs_s3_pool_in_use", {"client": "async"}) == 0
+
+    async def read_all():
+        obj = await backend.get_s3_object_dict(f"s3://{backend.bucket_name}/pooled")
+        return b"".join([chunk async for chunk in obj["generator"]])
+
+    assert len(asyncio.run(read_all())) == 4 * 1024 * 1024
+    assert REGISTRY.get_sample_value("drs_s3_pool_in_use", {"client": "async"}) == 0
+
+
+def _cache_sample(name: str) -> float:
+    return REGISTRY.get_sample_value(f"drs_s3_cache_{name}_total") or 0.0
+
+
+@pytest.mark.asyncio
+async def test_s3_disk_cache(tmp_path, test_logger):
+    data = os.urandom(300 * 1024)
+    checksum = sha256(data).hexdigest()
+    fetched: list[tuple[int, int] | None] = []
+
+    async def fetch(bytes_range: tuple[int, int] | None):
+        fetched.append(bytes_range)
+        body = data if bytes_range is None else data[bytes_range[0] : bytes_range[1] + 1]
+        for i in range(0, len(body), 64 * 1024):
+            yield body[i : i + 64 * 1024]
+
+    async def read(c: S3DiskCache, location: str, r: tuple[int, int] | None = None, cs: str = checksum) -> bytes:
+        return b"".join([chunk async for chunk in c.stream(location, cs, r, fetch)])
+
+    cache = S3DiskCache(tmp_path / "cache", 1024 * 1024, test_logger)
+    hits, misses, evictions, saved = (_cache_sample(n) for n in ("hits", "misses", "evictions", "bytes_saved"))
+
+    # A ranged miss is passed through, without filling the cache
+    assert await read(cache, "s3://bucket/a", (10, 99)) == data[10:100]
+    assert fetched == [(10, 99)]
+    assert not any((tmp_path / "cache").iterdir())
+
+    # A full read fills the cache, and later (full or ranged) reads are served from it
+    assert await read(cache, "s3://bucket/a") == data
+    assert await read(cache, "s3://bucket/a") == data
+    assert await read(cache, "s3://bucket/a", (1000, 1999)) == data[1000:2000]
+    assert fetched == [(10, 99), None]
+    assert _cache_sample("hits") == hits + 2
+    assert _cache_sample("misses") == misses + 2
+    assert _cache_sample("bytes_saved") == saved + len(data) + 1000
+
+    # Entries are keyed by checksum too, and are only kept if the bytes match it
+    assert await read(cache, "s3://bucket/a", cs="0" * 64) == data
+    assert await read(cache, "s3://bucket/a", cs="0" * 64) == data
+    assert fetched == [(10, 99), None, None, None]
+    assert len(list((tmp_path / "cache").glob("[0-9a-f]*"))) == 1
+
+    # Past the maximum size, the least recently used entries are evicted
+    await read(cache, "s3://bucket/b")
+    await read(cache, "s3://bucket/c")
+    os.utime(cache._entry_path("s3://bucket/b", checksum), (0, 0))  # b is the least recently used
+    await read(cache, "s3://bucket/d")
+    assert _cache_sample("evictions") == evictions + 1
+    assert not cache._entry_path("s3://bucket/b", checksum).exists()
+    assert cache._entry_path("s3://bucket/a", checksum).exists()
+
+    # Objects too large for the cache are still streamed, but not cached
+    small_cache = S3DiskCache(tmp_path / "small", 100 * 1024, test_logger)
+    assert await read(small_cache, "s3://bucket/a") == data
+    assert not any((tmp_path / "small").iterdir())
+
+
+def test_s3_backend_disk_cache(client_s3, tmp_path, monkeypatch):
+    from flask import current_app, g
+
+    monkeypatch.setitem(current_app.config, "S3_CACHE_DIR", str(tmp_path / "cache"))
+    g.pop("backend", None)
+
+    backend: S3Backend = get_backend()
+    assert backend.cache is not None
+
+    data = os.urandom(200 * 1024)
+    location = f"s3://{backend.bucket_name}/cached"
+    backend.get_sync_s3_client().put_object(Bucket=backend.bucket_name, Key="cached", Body=data)
+
+    # Without a checksum, reads bypass the cache
+    assert b"".join(asyncio.run(backend.get_stream_generator(location))) == data
+    assert not any((tmp_path / "cache").iterdir())
+
+    checksum = sha256(data).hexdigest()
+    assert b"".join(asyncio.run(backend.get_stream_generator(location, None, checksum))) == data
+
+    # Once cached, the object is read from disk, even if it is gone from the bucket
+    backend.get_sync_s3_client().delete_object(Bucket=backend.bucket_name, Key="cached")
+    assert b"".join(asyncio.run(backend.get_stream_generator(location, None, checksum))) == data
+    assert b"".join(asyncio.run(backend.get_stream_generator(location, (5, 9), checksum))) == data[5:10]
+
+    # Deleting the object removes its cached copy too
+    asyncio.run(backend.delete(location, checksum))
+    assert not any(RE_CACHE_ENTRY.match(p.name) for p in (tmp_path / "cache").iterdir())
+
+
+@pytest.mark.asyncio
+async def test_block_cache():
+    data = os.urandom(990)
+    fetched: list[tuple[int, int]] = []
+
+    async def fetch(bytes_range: tuple[int, int]):
+        fetched.append(bytes_range)
+        for i in range(bytes_range[0], bytes_range[1] + 1, 30):  # chunks not aligned to blocks
+            yield data[i : min(i + 30, bytes_range[1] + 1)]
+
+    async def read(c: BlockCache, location: str, r: tuple[int, int]) -> bytes:
+        return b"".join([chunk async for chunk in c.stream(location, "checksum", len(data), r, fetch)])
+
+    cache = BlockCache(100, 400, 300)
+    assert cache.applies((0, 299))
+    assert not cache.applies((0, 300))
+    assert not cache.applies(None)
+
+    assert await read(cache, "a", (150, 249)) == data[150:250]
+    assert fetched == [(100, 299)]
+
+    # Runs of missing blocks around cached ones are fetched as one range each
+    assert await read(cache, "a", (0, 450)) == data[:451]
+    assert fetched == [(100, 299), (0, 99), (300, 499)]
+
+    # The least recently used blocks are evicted past the capacity; a short last block is cached as-is
+    assert await read(cache, "a", (980, 989)) == data[980:]
+    assert fetched[-1] == (900, 989)
+    assert await read(cache, "a", (0, 99)) == data[:100]
+    assert fetched[-1] == (0, 99)
+    assert await read(cache, "a", (300, 499)) == data[300:500]
+    assert fetched[-1] == (0, 99)
+
+    # Blocks of other objects are kept separately
+    assert await read(cache, "b", (300, 301)) == data[300:302]
+    assert fetched[-1] == (300, 399)
+
+
+def test_s3_parallel_read_ahead(client_s3, test_logger):
+    from flask import current_app
+
+    backend = S3Backend(
+        {**current_app.config, "S3_DOWNLOAD_CONCURRENCY": 3, "S3_DOWNLOAD_PART_SIZE": 1024 * 1024}, test_logger
+    )
+
+    data = os.urandom(5 * 1024 * 1024 + 123)
+    location = f"s3://{backend.bucket_name}/parts"
+    backend.get_sync_s3_client().put_object(Bucket=backend.bucket_name, Key="parts", Body=data)
+
+    s3_ranges = []
+    s3_client = asyncio.run(run_on_stream_loop(backend._get_s3_client()))
+    s3_client.meta.events.register(
+        "before-call.s3.GetObject", lambda params, **_kwargs: s3_ranges.append(params.get("headers", {}).get("Range"))
+    )
+
+    def read(r: tuple[int, int] | None = None, size: int | None = len(data)) -> bytes:
+        return b"".join(asyncio.run(backend.get_stream_generator(location, r, size=size)))
+
+    # Reads larger than a part are fetched in parts, and reassembled in order
+    assert read() == data
+    assert len(s3_ranges) == 6
+    assert s3_ranges[-1] == f"bytes={5 * 1024 * 1024}-{len(data) - 1}"
+
+    s3_ranges.clear()
+    assert read((1000, 2 * 1024 * 1024 + 999)) == data[1000 : 2 * 1024 * 1024 + 1000]
+    assert s3_ranges == ["bytes=1000-1049575", "bytes=1049576-2098151"]
+
+    # Small reads, and reads of unknown length, are a single GET
+    s3_ranges.clear()
+    assert read((0, 99)) == data[:100]
+    assert read(size=None) == data
+    assert s3_ranges == ["bytes=0-99", None]
+
+    # Closing a download early cancels any parts in flight, releasing their connections
+    stream = asyncio.run(backend.get_stream_generator(location, size=len(data)))
+    chunk = next(stream)
+    assert chunk == data[: len(chunk)]
+    stream.close()
+    for _ in range(50):
+        if REGISTRY.get_sample_value("drs_s3_pool_in_use", {"client": "async"}) == 0:
+            break
+        time.sleep(0.02)
+    assert REGISTRY.get_sample_value("drs_s3_pool_in_use", {"client": "async"}) == 0
+
+
+@pytest.mark.parametrize(
+    "length, expected",
+    (
+        (None, 1024 * 1024),  # unknown length: the maximum
+        (0, 1),
+        (100, 100),  # never more than the transfer itself
+        (100 * 1024, 64 * 1024),  # at least the minimum
+        (3 * 1024 * 1024, 256 * 1024),  # 1/16 of the transfer, rounded up to a power of two
+        (50 * 1024 * 1024 * 1024, 1024 * 1024),  # at most the maximum
+    ),
+)
+def test_backend_chunk_size(local_volume, test_logger, length, expected):
+    backend = LocalBackend({"SERVICE_DATA": str(local_volume)}, test_logger)
+    assert backend.chunk_size(length) == expected
+
+
+def test_local_backend_stream_chunk_sizes(local_volume, tmp_path, test_logger):
+    backend = LocalBackend(
+        {"SERVICE_DATA": str(local_volume), "DRS_STREAM_MIN_CHUNK_SIZE": 1024, "DRS_LOCAL_STREAM_MAX_CHUNK_SIZE": 4096},
+        test_logger,
+    )
+    path = tmp_path / "chunked"
+    path.write_bytes(os.urandom(100 * 1024))
+
+    chunks = list(asyncio.run(backend.get_stream_generator(str(path), size=100 * 1024)))
+    assert {len(c) for c in chunks} == {4096}
+
+    chunks = list(asyncio.run(backend.get_stream_generator(str(path), (0, 16 * 1024 - 1))))
+    assert {len(c) for c in chunks} == {1024}
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from bento_lib.streaming.exceptions import StreamingBadRange, StreamingRangeNotSatisfiable
+
+from chord_drs.byteranges import multipart_byteranges_length, parse_byte_ranges, stream_multipart_byteranges
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        ("bytes=0-4", ((0, 4),)),
+        ("bytes=10-19, 0-4", ((0, 4), (10, 19))),
+        ("bytes=0-4,5-9", ((0, 9),)),  # adjacent
+        ("bytes=0-9, 5-14, 12-13", ((0, 14),)),  # overlapping
+        ("bytes=90-, -5", ((90, 99),)),
+        ("bytes=0-0, 50-59, -10", ((0, 0), (50, 59), (90, 99))),
+    ],
+)
+def test_parse_byte_ranges(header, expected):
+    assert parse_byte_ranges(header, 100) == expected
+
+
+@pytest.mark.parametrize(
+    "header,exc",
+    [
+        ("bites=0-4", StreamingBadRange),
+        ("bytes=", StreamingBadRange),
+        ("bytes=0-4, a-b", StreamingBadRange),
+        ("bytes=0-4, 100-", StreamingRangeNotSatisfiable),
+        ("bytes=4-0", StreamingRangeNotSatisfiable),
+    ],
+)
+def test_parse_byte_ranges_invalid(header, exc):
+    with pytest.raises(exc):
+        parse_byte_ranges(header, 100)
+
+
+def test_stream_multipart_byteranges():
+    data = bytes(range(100))
+    intervals = ((0, 4), (50, 59), (90, 99))
+    opened = []
+    closed = []
+
+    async def _stream(start, end):
+        opened.append(start)
+        try:
+            for i in range(start, end + 1, 3):  # in chunks of (at most) 3 bytes
+                yield data[i : min(i + 3, end + 1)]
+        finally:
+            closed.append(start)
+
+    async def _collect(stream_generator, n=None):
+        chunks = []
+        async for chunk in stream_generator:
+            chunks.append(chunk)
+            if len(chunks) == n:
+                break
+        await stream_generator.aclose()
+        return b"".join(chunks)
+
+    body = asyncio.run(
+        _collect(
+            stream_multipart_byteranges([_stream(*iv) for iv in intervals], intervals, "b0undary", "text/plain", 100)
+        )
+    )
+
+    assert len(body) == multipart_byteranges_length(intervals, "b0undary", "text/plain", 100)
+    assert body.endswith(b"\r\n--b0undary--\r\n")
+    parts = body.removesuffix(b"\r\n--b0undary--\r\n").split(b"\r\n--b0undary\r\n")[1:]
+    for part, (start, end) in zip(parts, intervals, strict=True):
+        headers, part_data = part.split(b"\r\n\r\n", 1)
+        assert headers == f"Content-Type: text/plain\r\nContent-Range: bytes {start}-{end}/100".encode()
+        assert part_data == data[start : end + 1]
+    assert sorted(closed) == [0, 50, 90]
+
+    # streams are closed if the body isn't read in full, e.g. if the client disconnects
+    opened.clear()
+    closed.clear()
+    asyncio.run(
+        _collect(
+            stream_multipart_byteranges([_stream(*iv) for iv in intervals], intervals, "b0undary", "text/plain", 100),
+            n=3,
+        )
+    )
+    assert 0 in opened
+    assert sorted(closed) == sorted(opened)
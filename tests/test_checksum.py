@@ -1,6 +1,19 @@
+import asyncio
+import hashlib
 import os
+import threading
+import time
 
-from chord_drs.utils import drs_file_checksum
+import pytest
+
+from chord_drs.utils import (
+    IncrementalChecksum,
+    configure_io_executor,
+    drs_file_checksum,
+    drs_file_checksums,
+    run_blocking,
+    validate_checksum_algorithms,
+)
 
 from .conftest import AUTHZ_URL, dummy_file_path, empty_file_path
 
@@ -15,3 +28,60 @@ def test_sha256_checksum_dummy():
     os.environ["BENTO_AUTHZ_SERVICE_URL"] = AUTHZ_URL
     # file with content
     assert drs_file_checksum(dummy_file_path()) == "ca5170c51e4d4e68d4c39832489ea9ad8e275c9f46e0c195c86aaf61ee2ce3d8"
+
+
+def test_incremental_checksum():
+    with open(dummy_file_path(), "rb") as fh:
+        contents = fh.read()
+
+    checksum = IncrementalChecksum()
+    for i in range(0, len(contents), 100):
+        checksum.update(contents[i : i + 100])
+
+    assert checksum.hexdigest() == drs_file_checksum(dummy_file_path())
+    assert checksum.size == len(contents)
+
+
+@pytest.mark.asyncio
+async def test_run_blocking():
+    configure_io_executor(2)
+
+    assert await run_blocking(drs_file_checksum, dummy_file_path()) == drs_file_checksum(dummy_file_path())
+
+    # blocking work runs outside the event loop's thread, and concurrent calls overlap
+    def _work():
+        time.sleep(0.2)
+        return threading.current_thread().name
+
+    start = time.perf_counter()
+    names = await asyncio.gather(run_blocking(_work), run_blocking(_work))
+    assert time.perf_counter() - start < 0.4
+    assert all(n.startswith("drs-io") for n in names)
+
+
+def test_extra_checksums():
+    with open(dummy_file_path(), "rb") as fh:
+        contents = fh.read()
+
+    expected = {
+        "md5": hashlib.md5(contents).hexdigest(),
+        "sha-512": hashlib.sha512(contents).hexdigest(),
+        "blake2b": hashlib.blake2b(contents).hexdigest(),
+    }
+
+    checksum = IncrementalChecksum(list(expected))
+    for i in range(0, len(contents), 100):
+        checksum.update(contents[i : i + 100])
+
+    assert checksum.hexdigest() == drs_file_checksum(dummy_file_path())
+    assert checksum.extra_hexdigests() == expected
+
+    # all checksums are computed in the same read of the file
+    assert drs_file_checksums(dummy_file_path(), list(expected)) == (checksum.hexdigest(), expected)
+    assert drs_file_checksums(dummy_file_path()) == (checksum.hexdigest(), {})
+
+
+def test_validate_checksum_algorithms():
+    validate_checksum_algorithms(["md5", "sha-1"])
+    with pytest.raises(ValueError):
+        validate_checksum_algorithms(["md4"])
@@ -3,7 +3,6 @@ from click.testing import CliRunner
 from chord_drs.commands import ingest
 from chord_drs.models import DrsBlob
 from tests.conftest import (
-    dummy_directory_path,
     dummy_file_path,
     non_existant_dummy_file_path,
 )
@@ -18,15 +17,6 @@ def test_ingest_fail(client):
     assert result.exit_code == 1
 
 
-def test_ingest_fail_dir(client):
-    # cannot ingest directory
-
-    runner = CliRunner()
-    result = runner.invoke(ingest, [str(dummy_directory_path())])
-
-    assert result.exit_code == 1
-
-
 def test_ingest(client):
     dummy_file = dummy_file_path()
 
@@ -39,3 +29,58 @@ def test_ingest(client):
     assert result.exit_code == 0
     assert obj.name == filename
     assert obj.location
+
+
+def test_ingest_dir(client, tmp_path):
+    (tmp_path / "run1").mkdir()
+    (tmp_path / "run1" / "a.vcf.gz").write_bytes(b"a")
+    (tmp_path / "run1" / "a.vcf.gz.tbi").write_bytes(b"a index")
+    (tmp_path / "run1" / "b.vcf.gz").write_bytes(b"b")
+    (tmp_path / "c.vcf.gz").write_bytes(b"c")
+    (tmp_path / "notes.txt").write_bytes(b"notes")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        ingest, [str(tmp_path), "--include", "*.vcf.gz*", "--exclude", "*.tbi", "--workers", "2", "--batch-size", "2"]
+    )
+    assert result.exit_code == 0
+
+    objs = DrsBlob.query.all()
+    assert sorted(o.name for o in objs) == ["a.vcf.gz", "b.vcf.gz", "c.vcf.gz"]
+    assert sorted(o.source_path for o in objs) == [
+        str(tmp_path / "c.vcf.gz"),
+        str(tmp_path / "run1" / "a.vcf.gz"),
+        str(tmp_path / "run1" / "b.vcf.gz"),
+    ]
+
+    # re-running the ingest skips files which were already ingested and haven't changed since
+    (tmp_path / "c.vcf.gz").write_bytes(b"c, modified")
+    result = runner.invoke(ingest, [str(tmp_path), "--include", "*.vcf.gz", "--workers", "2"])
+    assert result.exit_code == 0
+
+    objs = DrsBlob.query.filter_by(name="c.vcf.gz").all()
+    assert len(objs) == 2
+    assert DrsBlob.query.count() == 4
+
+
+def test_ingest_in_place(client_local, tmp_path, monkeypatch):
+    from flask import current_app
+
+    (tmp_path / "a.vcf.gz").write_bytes(b"a")
+
+    runner = CliRunner()
+
+    # files can only be registered in place from allowed roots
+    result = runner.invoke(ingest, [str(tmp_path), "--in-place"])
+    assert result.exit_code == 1
+    assert DrsBlob.query.count() == 0
+
+    monkeypatch.setitem(current_app.config, "DRS_LOCAL_IN_PLACE_ROOTS", (str(tmp_path.resolve()),))
+
+    result = runner.invoke(ingest, [str(tmp_path), "--in-place"])
+    assert result.exit_code == 0
+
+    obj = DrsBlob.query.one()
+    assert obj.location == str((tmp_path / "a.vcf.gz").resolve())
+    assert obj.size == 1
+    assert obj.registered_in_place
@@ -1,7 +1,11 @@
+import asyncio
 import json
 import os.path
 import tempfile
+import time
+import urllib.request
 import uuid
+from pathlib import Path
 
 import bento_lib
 import pytest
@@ -9,7 +13,9 @@ import responses
 from flask import current_app
 from jsonschema import validate
 
+from chord_drs.constants import ACCESS_ID_S3_PRESIGNED
 from chord_drs.data_sources import DATA_SOURCE_LOCAL, DATA_SOURCE_S3
+from chord_drs.utils import run_on_stream_loop
 from tests.conftest import AUTHZ_URL, dummy_file_path, non_existant_dummy_file_path
 from tests.constants import DUMMY_DATASET_ID_1, DUMMY_DATASET_ID_2, DUMMY_PROJECT_ID
 
@@ -228,10 +234,74 @@ def test_object_and_download_s3_range(client_s3, drs_object_s3):
     res = client_s3.get(f"/objects/{drs_object_s3.id}")
     data = res.get_json()
 
+    from flask import g
+
+    s3_operations = []
+    s3_client = asyncio.run(run_on_stream_loop(g.backend._get_s3_client()))
+    s3_client.meta.events.register("before-call.s3", lambda model, **_kwargs: s3_operations.append(model.name))
+
     res = client_s3.get(data["access_methods"][0]["access_url"]["url"], headers=(("Range", "bytes=0-4"),))
     assert res.status_code == 206
     assert res.get_data() == b"# CHO"  # first five bytes (0-4 inclusive) of dummy_file.txt
 
+    # Only the ranged GET is sent to S3 - size and type come from the DRS record rather than a HEAD request
+    assert s3_operations == ["GetObject"]
+
+
+def _fetch_direct(url: str, headers: dict[str, str] | None = None) -> tuple[int, bytes]:
+    # Fetch a presigned URL from the S3 mock directly, bypassing both proxies and the responses mock
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    with opener.open(urllib.request.Request(url, headers=headers or {})) as res:
+        return res.status, res.read()
+
+
+@responses.activate
+def test_object_access_s3_presigned(client_s3, drs_object_s3, monkeypatch):
+    monkeypatch.setitem(current_app.config, "S3_PRESIGNED_URLS", True)
+
+    authz_everything_true()
+    data = client_s3.get(f"/objects/{drs_object_s3.id}").get_json()
+    access_ids = [m["access_id"] for m in data["access_methods"] if "access_id" in m]
+    assert access_ids == [ACCESS_ID_S3_PRESIGNED]
+
+    res = client_s3.get(f"/objects/{drs_object_s3.id}/access/{ACCESS_ID_S3_PRESIGNED}")
+    assert res.status_code == 200
+    status, body = _fetch_direct(res.get_json()["url"], {"Range": "bytes=0-4"})
+    assert status == 206
+    assert body == b"# CHO"
+
+
+@responses.activate
+def test_object_access_s3_presigned_disabled(client, drs_object):
+    authz_everything_true()
+    res = client.get(f"/objects/{drs_object.id}/access/{ACCESS_ID_S3_PRESIGNED}")
+    assert res.status_code == 404
+
+
+@responses.activate
+def test_object_access_s3_presigned_forbidden(client_s3, drs_object_s3, monkeypatch):
+    monkeypatch.setitem(current_app.config, "S3_PRESIGNED_URLS", True)
+
+    authz_everything_false()
+    res = client_s3.get(f"/objects/{drs_object_s3.id}/access/{ACCESS_ID_S3_PRESIGNED}")
+    assert res.status_code == 403
+
+
+@responses.activate
+def test_object_download_s3_redirect(client_s3, drs_object_s3, monkeypatch):
+    monkeypatch.setitem(current_app.config, "S3_PRESIGNED_URLS", True)
+    monkeypatch.setitem(current_app.config, "S3_DOWNLOAD_REDIRECT", True)
+
+    authz_everything_true()
+    res = client_s3.get(f"/objects/{drs_object_s3.id}/download")
+    assert res.status_code == 302
+    assert res.headers["Cache-Control"] == "no-store"
+
+    status, body = _fetch_direct(res.headers["Location"])
+    assert status == 200
+    with open(dummy_file_path(), "rb") as fh:
+        assert body == fh.read()
+
 
 @responses.activate
 def test_object_and_download_s3_specific_perms(client_s3, drs_object_s3):
@@ -260,6 +330,263 @@ def test_object_and_download_with_ranges(client_local, drs_object):
     _test_object_and_download(client_local, drs_object, test_range=True)
 
 
+@responses.activate
+def test_object_download_offload(client_local, drs_object, monkeypatch):
+    from flask import g
+
+    authz_everything_true()
+    streamed = client_local.get(f"/objects/{drs_object.id}/download")  # for comparison, before offloading
+    assert streamed.status_code == 200
+
+    monkeypatch.setitem(current_app.config, "DRS_LOCAL_OFFLOAD", "x-accel-redirect")
+    monkeypatch.setitem(current_app.config, "DRS_LOCAL_OFFLOAD_PREFIX", "/internal/drs/")
+    g.pop("backend", None)  # re-create the backend with the new configuration
+
+    # the proxy serves the file (and handles the range) instead; headers are otherwise the same as when streaming
+    res = client_local.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-4"),))
+    assert res.status_code == 200
+    assert res.get_data() == b""
+    rel_path = os.path.relpath(drs_object.location, current_app.config["SERVICE_DATA"])
+    assert res.headers["X-Accel-Redirect"] == f"/internal/drs/{rel_path}"
+    assert res.headers["Content-Disposition"] == streamed.headers["Content-Disposition"]
+    assert res.headers["Content-Type"] == streamed.headers["Content-Type"]
+    assert "Content-Range" not in res.headers
+
+    # ranges are still validated before offloading
+    res = client_local.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=4-0"),))
+    assert res.status_code == 416
+
+    # a Range header which we ignore isn't passed on to the proxy either: the whole file is streamed instead
+    monkeypatch.setitem(current_app.config, "DRS_MAX_RANGES", 2)
+    res = client_local.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-0, 2-2, 4-4"),))
+    assert res.status_code == 200
+    assert "X-Accel-Redirect" not in res.headers
+    assert res.get_data() == streamed.get_data()
+
+    res = client_local.get(
+        f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-4"), ("If-Range", '"outdated"'))
+    )
+    assert res.status_code == 200
+    assert "X-Accel-Redirect" not in res.headers
+    assert res.get_data() == streamed.get_data()
+
+    monkeypatch.setitem(current_app.config, "DRS_LOCAL_OFFLOAD", "x-sendfile")
+    g.pop("backend", None)
+    res = client_local.get(f"/objects/{drs_object.id}/download")
+    assert res.status_code == 200
+    assert res.headers["X-Sendfile"] == drs_object.location
+
+
+@responses.activate
+def test_object_download_file_wrapper(client, drs_object):
+    from wsgiref.util import FileWrapper
+
+    wrapped = []
+
+    class RecordingFileWrapper(FileWrapper):
+        def __init__(self, filelike, blksize=8192):
+            super().__init__(filelike, blksize)
+            wrapped.append(filelike)
+
+    authz_everything_true()
+
+    with open(dummy_file_path(), "rb") as fh:
+        contents = fh.read()
+
+    # with a server which provides wsgi.file_wrapper, local files are handed to it instead of being streamed
+    environ = {"wsgi.file_wrapper": RecordingFileWrapper}
+    res = client.get(f"/objects/{drs_object.id}/download", environ_base=environ)
+    assert res.status_code == 200
+    assert len(wrapped) == (1 if current_app.config["SERVICE_DATA_SOURCE"] == DATA_SOURCE_LOCAL else 0)
+    assert res.content_length == len(contents)
+    assert res.get_data() == contents
+
+    res = client.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=2-6"),), environ_base=environ)
+    assert res.status_code == 206
+    assert res.headers["Content-Range"] == f"bytes 2-6/{len(contents)}"
+    assert res.get_data() == contents[2:7]
+
+
+@responses.activate
+def test_object_download_block_cache(client, drs_object, monkeypatch):
+    from flask import g
+    from prometheus_client import REGISTRY
+
+    from chord_drs.backends.block_cache import get_block_cache
+
+    authz_everything_true()
+
+    with open(dummy_file_path(), "rb") as fh:
+        contents = fh.read()
+
+    monkeypatch.setitem(current_app.config, "DRS_BLOCK_CACHE_SIZE", 1024)
+    monkeypatch.setitem(current_app.config, "DRS_BLOCK_CACHE_BLOCK_SIZE", 64)
+    monkeypatch.setitem(current_app.config, "DRS_BLOCK_CACHE_MAX_RANGE", 512)
+    g.pop("backend", None)
+
+    def blocks(kind: str) -> float:
+        return REGISTRY.get_sample_value(f"drs_block_cache_{kind}_total")
+
+    get_block_cache(current_app.config).clear()
+    hits, misses = blocks("hits"), blocks("misses")
+
+    # Small ranges are read from the backend in whole blocks (two, here) the first time, and from the cache after
+    # that - even with a server which provides wsgi.file_wrapper
+    for _ in range(2):
+        res = client.get(
+            f"/objects/{drs_object.id}/download",
+            headers=(("Range", "bytes=60-99"),),
+            environ_base={"wsgi.file_wrapper": lambda *_args: pytest.fail("block-cached range sent as a file")},
+        )
+        assert res.status_code == 206
+        assert res.headers["Content-Range"] == f"bytes 60-99/{len(contents)}"
+        assert res.get_data() == contents[60:100]
+    assert (blocks("hits"), blocks("misses")) == (hits + 2, misses + 2)
+
+    # Only missing blocks are fetched, including the short last block; this includes each multipart part
+    res = client.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-9, 100-149, 2400-"),))
+    assert res.status_code == 206
+    assert contents[:10] in res.get_data() and contents[100:150] in res.get_data()
+    assert contents[2400:] in res.get_data()
+    assert (blocks("hits"), blocks("misses")) == (hits + 4, misses + 5)
+
+    # Larger ranges bypass the cache
+    res = client.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-1023"),))
+    assert res.get_data() == contents[:1024]
+    assert (blocks("hits"), blocks("misses")) == (hits + 4, misses + 5)
+
+
+@responses.activate
+def test_object_download_multiple_ranges(client, drs_object):
+    authz_everything_true()
+
+    with open(dummy_file_path(), "rb") as fh:
+        contents = fh.read()
+
+    # overlapping and adjacent ranges are coalesced
+    res = client.get(
+        f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=2000-, 10-14, 0-4, 12-20, 21-30"),)
+    )
+    assert res.status_code == 206
+    assert res.mimetype == "multipart/byteranges"
+    boundary = res.mimetype_params["boundary"]
+    assert res.headers["Content-Disposition"] == "attachment; filename*=UTF-8''dummy_file.txt"
+
+    body = res.get_data()
+    assert res.content_length == len(body)
+    assert body.endswith(f"\r\n--{boundary}--\r\n".encode())
+    parts = body.removesuffix(f"\r\n--{boundary}--\r\n".encode()).split(f"\r\n--{boundary}\r\n".encode())[1:]
+    assert len(parts) == 3
+    for part, (start, end) in zip(parts, ((0, 4), (10, 30), (2000, len(contents) - 1)), strict=True):
+        headers, data = part.split(b"\r\n\r\n", 1)
+        assert f"Content-Range: bytes {start}-{end}/{len(contents)}".encode() in headers
+        assert data == contents[start : end + 1]
+
+    # ranges which coalesce into one are served as a single part
+    res = client.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-4, 5-9"),))
+    assert res.status_code == 206
+    assert res.headers["Content-Range"] == f"bytes 0-9/{len(contents)}"
+    assert res.get_data() == contents[:10]
+
+    # all ranges must be satisfiable
+    res = client.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-4, 10000-"),))
+    assert res.status_code == 416
+
+
+@responses.activate
+def test_object_download_too_many_ranges(client, drs_object, monkeypatch):
+    authz_everything_true()
+
+    with open(dummy_file_path(), "rb") as fh:
+        contents = fh.read()
+
+    monkeypatch.setitem(current_app.config, "DRS_MAX_RANGES", 3)
+
+    # at most DRS_MAX_RANGES ranges are served...
+    res = client.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-0, 2-2, 4-4"),))
+    assert res.status_code == 206
+    assert res.mimetype == "multipart/byteranges"
+
+    # ... and a header with more (even if they would coalesce) is ignored, in favour of the whole object
+    res = client.get(f"/objects/{drs_object.id}/download", headers=(("Range", "bytes=0-0, 1-1, 2-2, 3-3"),))
+    assert res.status_code == 200
+    assert "Content-Range" not in res.headers
+    assert res.get_data() == contents
+
+
+@responses.activate
+def test_object_download_conditional(client, drs_object):
+    from chord_drs.app import db
+
+    authz_everything_true()
+    url = f"/objects/{drs_object.id}/download"
+    etag = f'"{drs_object.checksum}"'
+
+    with open(dummy_file_path(), "rb") as fh:
+        contents = fh.read()
+
+    res = client.get(url)
+    assert res.status_code == 200
+    assert res.headers["ETag"] == etag
+    assert res.headers["Cache-Control"] == "private, no-cache"
+    last_modified = res.headers["Last-Modified"]
+
+    # not modified: the object's bytes aren't sent (or even read)
+    for headers in (
+        {"If-None-Match": etag},
+        {"If-None-Match": f'"other", W/{etag}'},
+        {"If-None-Match": "*"},
+        {"If-Modified-Since": last_modified},
+        {"If-Modified-Since": last_modified, "Range": "bytes=0-4"},
+    ):
+        res = client.get(url, headers=headers)
+        assert res.status_code == 304
+        assert res.get_data() == b""
+        assert res.headers["ETag"] == etag
+
+    # If-None-Match takes precedence over If-Modified-Since
+    res = client.get(url, headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+    assert res.status_code == 200
+    res = client.get(url, headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert res.status_code == 200
+
+    # If-Range: the range only applies if the client's copy is (strongly) current; otherwise, everything is sent
+    for if_range, status, data in (
+        (etag, 206, contents[:5]),
+        (last_modified, 206, contents[:5]),
+        ('"other"', 200, contents),
+        (f"W/{etag}", 200, contents),
+        ("Mon, 01 Jan 2001 00:00:00 GMT", 200, contents),
+    ):
+        res = client.get(url, headers={"Range": "bytes=0-4", "If-Range": if_range})
+        assert res.status_code == status
+        assert res.get_data() == data
+
+    # public objects can be cached by anyone, for as long as possible
+    drs_object.public = True
+    db.session.commit()
+    res = client.get(url)
+    assert "immutable" in res.headers["Cache-Control"]
+    assert "public" in res.headers["Cache-Control"]
+
+
+@responses.activate
+def test_object_info_conditional(client, drs_object):
+    authz_everything_true()
+
+    res = client.get(f"/objects/{drs_object.id}")
+    assert res.status_code == 200
+    etag = res.headers["ETag"]
+
+    res = client.get(f"/objects/{drs_object.id}", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+
+    # a different representation has a different ETag
+    res = client.get(f"/objects/{drs_object.id}?with_bento_properties=true", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+
+
 @responses.activate
 def test_object_with_internal_path(client, drs_object):
     authz_everything_true()
@@ -520,6 +847,318 @@ def test_object_ingest_no_deduplicate(client):
     assert json.dumps(data_1, sort_keys=True) != json.dumps(data_2, sort_keys=True)
 
 
+@responses.activate
+def test_object_ingest_content_addressed(client_local, monkeypatch):
+    from chord_drs.models import DrsBlob
+
+    monkeypatch.setitem(current_app.config, "DRS_LOCAL_CONTENT_ADDRESSED", True)
+
+    authz_everything_true()
+    data_1 = _ingest_one(client_local, params={"deduplicate": False})
+    authz_everything_true()
+    data_2 = _ingest_one(client_local, params={"deduplicate": False})
+
+    # two different objects, but the bytes are only stored once
+    assert data_1["id"] != data_2["id"]
+    b1 = DrsBlob.query.filter_by(id=data_1["id"]).first()
+    b2 = DrsBlob.query.filter_by(id=data_2["id"]).first()
+    assert b1.location == b2.location
+    assert b1.location.endswith(f"/sha256/{b1.checksum[:2]}/{b1.checksum[2:4]}/{b1.checksum}")
+
+
+@responses.activate
+def test_object_ingest_extra_checksums(client, monkeypatch):
+    import hashlib
+
+    from chord_drs.utils import drs_file_checksum
+
+    monkeypatch.setitem(current_app.config, "DRS_CHECKSUM_ALGORITHMS", ("md5", "sha-512"))
+
+    fp = dummy_file_path()
+    with open(fp, "rb") as fh:
+        contents = fh.read()
+    md5 = hashlib.md5(contents).hexdigest()
+
+    # checksums are computed both for files ingested from a path and for uploaded files
+    authz_everything_true()
+    data_1 = _ingest_one(client, params={"deduplicate": False})
+    authz_everything_true()
+    with open(fp, "rb") as fh:
+        res = client.post(
+            "/ingest",
+            data={"file": (fh, "dummy_file.txt"), "deduplicate": False},
+            content_type="multipart/form-data",
+        )
+    assert res.status_code == 201
+    data_2 = res.get_json()
+
+    for data in (data_1, data_2):
+        assert data["checksums"] == [
+            {"checksum": drs_file_checksum(fp), "type": "sha-256"},
+            {"checksum": md5, "type": "md5"},
+            {"checksum": hashlib.sha512(contents).hexdigest(), "type": "sha-512"},
+        ]
+
+    # objects can be looked up by any of their checksums
+    authz_everything_true()
+    res = client.get(f"/search?checksum={md5}")
+    assert res.status_code == 200
+    assert sorted(o["id"] for o in res.get_json()) == sorted((data_1["id"], data_2["id"]))
+
+
+@responses.activate
+def test_object_ingest_register_in_place(client_local, tmp_path, monkeypatch):
+    from chord_drs.models import DrsBlob
+    from chord_drs.utils import drs_file_checksum
+
+    monkeypatch.setitem(current_app.config, "DRS_LOCAL_IN_PLACE_ROOTS", (str((tmp_path / "outputs").resolve()),))
+
+    fp = tmp_path / "outputs" / "dummy_file.txt"
+    fp.parent.mkdir()
+    fp.write_bytes(b"workflow output")
+
+    # files outside the configured roots cannot be registered in place
+    (tmp_path / "other.txt").write_bytes(b"other")
+    authz_everything_true()
+    res = client_local.post("/ingest", data={"path": str(tmp_path / "other.txt"), "register_in_place": "true"})
+    assert res.status_code == 400
+
+    authz_everything_true()
+    data = _ingest_one(client_local, params={"path": str(fp), "register_in_place": "true", "deduplicate": False})
+    assert data["checksums"][0]["checksum"] == drs_file_checksum(str(fp))
+    assert data["size"] == fp.stat().st_size
+
+    # the file is recorded where it is, without being copied
+    obj = DrsBlob.query.filter_by(id=data["id"]).first()
+    assert obj.location == str(fp.resolve())
+    assert obj.registered_in_place
+
+    # only files can be registered in place
+    authz_everything_true()
+    res = client_local.post("/ingest", data={"path": str(fp.parent), "register_in_place": "true"})
+    assert res.status_code == 400
+
+    # the file isn't owned by the service, so deleting the object leaves it in place, even once its directory is no
+    # longer allowed for in-place registration
+    monkeypatch.setitem(current_app.config, "DRS_LOCAL_IN_PLACE_ROOTS", ())
+    authz_everything_true()
+    res = client_local.delete(f"/objects/{data['id']}")
+    assert res.status_code == 204
+    assert fp.exists()
+
+
+@responses.activate
+def test_object_delete_under_in_place_root(client_local, monkeypatch):
+    from chord_drs.models import DrsBlob
+
+    # files saved by the service are its own to delete, even if the data directory is inside an in-place root
+    monkeypatch.setitem(
+        current_app.config, "DRS_LOCAL_IN_PLACE_ROOTS", (str(Path(current_app.config["SERVICE_DATA"]).resolve()),)
+    )
+
+    authz_everything_true()
+    data = _ingest_one(client_local, params={"path": dummy_file_path(), "deduplicate": False})
+    obj = DrsBlob.query.filter_by(id=data["id"]).first()
+    assert not obj.registered_in_place
+    assert os.path.exists(obj.location)
+
+    authz_everything_true()
+    res = client_local.delete(f"/objects/{data['id']}")
+    assert res.status_code == 204
+    assert not os.path.exists(obj.location)
+
+
+@responses.activate
+def test_object_ingest_register_in_place_s3(client_s3):
+    authz_everything_true()
+    res = client_s3.post("/ingest", data={"path": dummy_file_path(), "register_in_place": "true"})
+    assert res.status_code == 400
+
+
+@responses.activate
+def test_object_ingest_by_checksum(client):
+    authz_everything_true()
+    data_1 = _ingest_one(client)
+    checksum = data_1["checksums"][0]["checksum"]
+
+    # same resource: the existing object is fully reused
+    authz_everything_true(count=2)  # ingest permission + download permission on the candidate objects
+    res = client.post("/ingest/by-checksum", data={"checksum": checksum, "size": data_1["size"]})
+    assert res.status_code == 201
+    assert res.get_json()["id"] == data_1["id"]
+
+    # different resource: a new object is created, reusing the existing bytes
+    authz_everything_true(count=2)
+    res = client.post(
+        "/ingest/by-checksum",
+        data={"checksum": checksum, "size": data_1["size"], "project_id": "project1", "name": "renamed.txt"},
+    )
+    assert res.status_code == 201
+    data_2 = res.get_json()
+    validate_object_fields(data_2, with_bento_properties=True)
+    assert data_2["id"] != data_1["id"]
+    assert data_2["name"] == "renamed.txt"
+    assert data_2["checksums"] == data_1["checksums"]
+    assert data_2["bento"]["project_id"] == "project1"
+
+    # the bytes can be downloaded through the new object
+    authz_everything_true()
+    res = client.get(f"/objects/{data_2['id']}/download")
+    assert res.status_code == 200
+    with open(dummy_file_path(), "rb") as fh:
+        assert res.get_data() == fh.read()
+
+    # unknown bytes must be uploaded
+    authz_everything_true()
+    res = client.post("/ingest/by-checksum", data={"checksum": checksum, "size": data_1["size"] + 1})
+    assert res.status_code == 404
+
+    # knowing a checksum isn't enough to reuse bytes which the requester cannot download
+    authz_everything_true()
+    authz_everything_false(count=2)  # two candidate objects, from two different resources
+    res = client.post("/ingest/by-checksum", data={"checksum": checksum, "size": data_1["size"]})
+    assert res.status_code == 404
+
+
+@responses.activate
+@pytest.mark.parametrize(
+    "data",
+    (
+        {"checksum": "abc", "size": "10"},
+        {"checksum": "a" * 64},
+        {"checksum": "a" * 64, "size": "big"},
+    ),
+)
+def test_object_ingest_by_checksum_bad_req(client, data):
+    authz_everything_true()
+    res = client.post("/ingest/by-checksum", data=data)
+    assert res.status_code == 400
+
+
+@responses.activate
+def test_object_ingest_by_checksum_forbidden(client):
+    authz_everything_false()
+    res = client.post("/ingest/by-checksum", data={"checksum": "a" * 64, "size": "10"})
+    assert res.status_code == 403
+
+
+def _wait_for_ingest_job(client, job_id: str) -> dict:
+    from chord_drs.app import db
+
+    for _ in range(100):
+        # The test client shares the fixture's database session, which would otherwise keep returning a stale job
+        db.session.expire_all()
+        authz_everything_true()
+        res = client.get(f"/ingest/jobs/{job_id}")
+        assert res.status_code == 200
+        data = res.get_json()
+        if data["status"] in ("succeeded", "failed"):
+            return data
+        time.sleep(0.05)
+    raise TimeoutError(f"ingest job {job_id} did not finish")
+
+
+@responses.activate
+def test_object_ingest_async(client):
+    from chord_drs.models import IngestJob
+    from chord_drs.utils import drs_file_checksum
+
+    fp = dummy_file_path()
+    size = os.path.getsize(fp)
+
+    # ingest from a path: the job does the hashing
+    authz_everything_true()
+    res = client.post("/ingest", data={"path": fp, "async": "true"})
+    assert res.status_code == 202
+    job = res.get_json()
+    assert job["status"] in ("queued", "running", "succeeded")
+    assert job["size"] == size
+    assert res.headers["Location"].endswith(f"/ingest/jobs/{job['id']}")
+
+    job = _wait_for_ingest_job(client, job["id"])
+    assert job["status"] == "succeeded"
+    assert job["bytes_hashed"] == size
+    assert job["bytes_uploaded"] == size
+    assert "error" not in job
+    validate_object_fields(job["object"], with_bento_properties=True)
+    assert job["object"]["checksums"][0]["checksum"] == drs_file_checksum(fp)
+
+    # ingest an upload: it is deduplicated with the first object by the job
+    authz_everything_true()
+    with open(fp, "rb") as fh:
+        res = client.post(
+            "/ingest", data={"file": (fh, "dummy_file.txt"), "async": "true"}, content_type="multipart/form-data"
+        )
+    assert res.status_code == 202
+
+    job_2 = _wait_for_ingest_job(client, res.get_json()["id"])
+    assert job_2["status"] == "succeeded"
+    assert job_2["object"]["id"] == job["object"]["id"]
+
+    # unless it was streamed straight into the object store, the upload was kept in the (persistent) job directory,
+    # and removed once it turned out to be a duplicate
+    job_row = IngestJob.query.filter_by(id=job_2["id"]).one()
+    if not job_row.in_place:
+        assert os.path.dirname(job_row.location) == current_app.config["DRS_INGEST_JOB_DIR"]
+        assert not os.path.exists(job_row.location)
+
+
+@responses.activate
+def test_object_ingest_async_failed(client):
+    authz_everything_true()
+    res = client.post("/ingest", data={"path": dummy_file_path(), "async": "true", "mime_type": "image/*"})
+    assert res.status_code == 202
+
+    job = _wait_for_ingest_job(client, res.get_json()["id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "Invalid MIME type"
+    assert "object" not in job
+
+    # missing files are caught before a job is created
+    authz_everything_true()
+    res = client.post("/ingest", data={"path": non_existant_dummy_file_path(), "async": "true"})
+    assert res.status_code == 400
+
+
+@responses.activate
+def test_ingest_job_resume_stale(client_local, monkeypatch):
+    from datetime import datetime, timedelta
+
+    from chord_drs import jobs
+    from chord_drs.app import db
+    from chord_drs.models import IngestJob
+
+    # a job whose heartbeat stopped long ago, e.g. because the service was restarted while it ran
+    fp = dummy_file_path()
+    job = IngestJob(id=str(uuid.uuid4()), status="running", location=fp, size=os.path.getsize(fp), deduplicate=False)
+    job.updated = datetime.now() - timedelta(seconds=jobs.JOB_STALE_AFTER * 10)
+    db.session.add(job)
+    db.session.commit()
+
+    # polling the job's status doesn't change it...
+    monkeypatch.setattr(jobs, "_jobs_swept_at", time.monotonic())
+    authz_everything_true()
+    res = client_local.get(f"/ingest/jobs/{job.id}")
+    assert res.status_code == 200
+    assert res.get_json()["status"] == "running"
+
+    # ... but the next periodic sweep picks the job up again
+    monkeypatch.setattr(jobs, "_jobs_swept_at", time.monotonic() - jobs.JOB_SWEEP_INTERVAL - 1)
+    jobs.resume_ingest_jobs()
+    assert _wait_for_ingest_job(client_local, job.id)["status"] == "succeeded"
+
+
+@responses.activate
+def test_ingest_job_not_found(client):
+    authz_everything_true()
+    res = client.get(f"/ingest/jobs/{NON_EXISTENT_ID}")
+    assert res.status_code == 404
+
+    authz_everything_false()
+    res = client.get(f"/ingest/jobs/{NON_EXISTENT_ID}")
+    assert res.status_code == 403
+
+
 @responses.activate
 def test_object_ingest_bad_req(client):
     authz_everything_true()
@@ -535,11 +1174,355 @@ def test_object_ingest_forbidden(client):
 
 
 @responses.activate
-def test_object_ingest_post_file(client):
+def test_object_ingest_post_file(client, tmp_path, monkeypatch):
+    from chord_drs.utils import drs_file_checksum
+
+    monkeypatch.setitem(current_app.config, "DRS_INGEST_TMP_DIR", str(tmp_path))
+
     # actual bytes of file in request
     fp = dummy_file_path()
     authz_everything_true()
     with open(fp, "rb") as fh:
         res = client.post("/ingest", data={"file": (fh, "dummy_file.txt")}, content_type="multipart/form-data")
     assert res.status_code == 201
-    validate_object_fields(res.get_json(), with_bento_properties=True)
+    data = res.get_json()
+    validate_object_fields(data, with_bento_properties=True)
+
+    # checksum + size are computed while the upload is being received
+    assert data["checksums"][0]["checksum"] == drs_file_checksum(fp)
+    assert data["size"] == os.path.getsize(fp)
+
+    # temporary upload file is cleaned up once the request is done
+    assert not list(tmp_path.iterdir())
+
+
+@responses.activate
+def test_object_ingest_post_file_s3_stream(client_s3, monkeypatch):
+    from chord_drs.backend import get_backend
+    from chord_drs.utils import drs_file_checksum
+
+    monkeypatch.setitem(current_app.config, "S3_STREAM_INGEST", True)
+
+    fp = dummy_file_path()
+    with open(fp, "rb") as fh:
+        contents = fh.read()
+
+    authz_everything_true()
+    with open(fp, "rb") as fh:
+        res = client_s3.post("/ingest", data={"file": (fh, "dummy_file.txt")}, content_type="multipart/form-data")
+    assert res.status_code == 201
+    data_1 = res.get_json()
+    validate_object_fields(data_1, with_bento_properties=True)
+    assert data_1["checksums"][0]["checksum"] == drs_file_checksum(fp)
+    assert data_1["size"] == len(contents)
+
+    authz_everything_true()
+    res = client_s3.get(f"/objects/{data_1['id']}/download")
+    assert res.status_code == 200
+    assert res.get_data() == contents
+
+    # uploading the same bytes again deduplicates after the fact, removing the second streamed copy
+    authz_everything_true()
+    with open(fp, "rb") as fh:
+        res = client_s3.post("/ingest", data={"file": (fh, "dummy_file.txt")}, content_type="multipart/form-data")
+    assert res.status_code == 201
+    assert res.get_json()["id"] == data_1["id"]
+
+    backend = get_backend()
+    s3_objects = backend.get_sync_s3_client().list_objects_v2(Bucket=backend.bucket_name)["Contents"]
+    assert len(s3_objects) == 1
+
+
+def _create_upload_session(client, size: int) -> dict:
+    res = client.post("/ingest/uploads", data={"size": size, "chunk_size": 1000, "name": "dummy_file.txt"})
+    assert res.status_code == 201
+    return res.get_json()
+
+
+@responses.activate
+def test_upload_session(client, tmp_path, monkeypatch):
+    from chord_drs.utils import drs_file_checksum
+
+    monkeypatch.setitem(current_app.config, "DRS_INGEST_TMP_DIR", str(tmp_path))
+
+    fp = dummy_file_path()
+    with open(fp, "rb") as fh:
+        contents = fh.read()
+
+    authz_everything_true()
+    session = _create_upload_session(client, len(contents))
+    chunk_size = session["chunk_size"]  # bumped up to the minimum multipart part size with S3
+    offsets = list(range(0, len(contents), chunk_size))
+    assert session["n_chunks"] == len(offsets)
+    assert session["chunks"] == []
+    assert session["missing"] == offsets
+
+    # chunks can be sent in any order
+    for offset in reversed(offsets):
+        authz_everything_true()
+        res = client.put(f"/ingest/uploads/{session['id']}/chunks/{offset}", data=contents[offset:][:chunk_size])
+        assert res.status_code == 200
+        assert res.get_json()["offset"] == offset
+
+    # ... and re-sent, replacing the previous copy
+    authz_everything_true()
+    res = client.put(f"/ingest/uploads/{session['id']}/chunks/0", data=contents[:chunk_size])
+    assert res.status_code == 200
+
+    authz_everything_true()
+    res = client.get(f"/ingest/uploads/{session['id']}")
+    assert res.status_code == 200
+    data = res.get_json()
+    assert [c["offset"] for c in data["chunks"]] == offsets
+    assert data["missing"] == []
+
+    authz_everything_true()
+    res = client.post(f"/ingest/uploads/{session['id']}/finalize")
+    assert res.status_code == 201
+    data = res.get_json()
+    validate_object_fields(data, with_bento_properties=True)
+    assert data["name"] == "dummy_file.txt"
+    assert data["checksums"][0]["checksum"] == drs_file_checksum(fp)
+    assert data["size"] == len(contents)
+
+    authz_everything_true()
+    res = client.get(f"/objects/{data['id']}/download")
+    assert res.status_code == 200
+    assert res.get_data() == contents
+
+    # the session is gone once finalized, along with its temporary file
+    authz_everything_true()
+    res = client.get(f"/ingest/uploads/{session['id']}")
+    assert res.status_code == 404
+    assert not list(tmp_path.iterdir())
+
+    # a second upload of the same bytes deduplicates with the first object
+    authz_everything_true()
+    session = _create_upload_session(client, len(contents))
+    for offset in offsets:
+        authz_everything_true()
+        res = client.put(f"/ingest/uploads/{session['id']}/chunks/{offset}", data=contents[offset:][:chunk_size])
+        assert res.status_code == 200
+    authz_everything_true()
+    res = client.post(f"/ingest/uploads/{session['id']}/finalize")
+    assert res.status_code == 201
+    assert res.get_json()["id"] == data["id"]
+
+
+@responses.activate
+def test_upload_session_bad_chunks(client_local, tmp_path, monkeypatch):
+    monkeypatch.setitem(current_app.config, "DRS_INGEST_TMP_DIR", str(tmp_path))
+
+    authz_everything_true()
+    session = _create_upload_session(client_local, 2500)
+    url = f"/ingest/uploads/{session['id']}"
+
+    authz_everything_true()
+    assert client_local.put(f"{url}/chunks/10", data=b"a" * 1000).status_code == 400  # misaligned offset
+    authz_everything_true()
+    assert client_local.put(f"{url}/chunks/3000", data=b"a" * 1000).status_code == 400  # offset past the end
+    authz_everything_true()
+    assert client_local.put(f"{url}/chunks/0", data=b"a" * 999).status_code == 400  # too short
+    authz_everything_true()
+    assert client_local.put(f"{url}/chunks/2000", data=b"a" * 501).status_code == 400  # last chunk too long
+    authz_everything_true()
+    assert client_local.put(f"{url}/chunks/2000", data=b"a" * 500).status_code == 200
+
+    # can't finalize with missing chunks
+    authz_everything_true()
+    res = client_local.post(f"{url}/finalize")
+    assert res.status_code == 400
+
+    authz_everything_true()
+    assert client_local.delete(url).status_code == 204
+    assert not list(tmp_path.iterdir())
+
+
+@responses.activate
+def test_upload_session_expiry(client, tmp_path, monkeypatch):
+    from datetime import datetime
+
+    from chord_drs import uploads
+    from chord_drs.backend import get_backend
+    from chord_drs.db import db
+    from chord_drs.models import UploadSession
+
+    monkeypatch.setitem(current_app.config, "DRS_INGEST_TMP_DIR", str(tmp_path))
+
+    authz_everything_true()
+    expired = _create_upload_session(client, 2500)
+    authz_everything_true()
+    fresh = _create_upload_session(client, 2500)
+
+    db.session.get(UploadSession, expired["id"]).created = datetime(2000, 1, 1)
+    db.session.commit()
+
+    # the check has already run in this process; force it to run again on the next request
+    uploads._uploads_expired_at = None
+
+    authz_everything_true()
+    assert client.get(f"/ingest/uploads/{expired['id']}").status_code == 404
+    authz_everything_true()
+    assert client.get(f"/ingest/uploads/{fresh['id']}").status_code == 200
+
+    # the expired session's temporary file or multipart upload is gone, but not the fresh session's
+    fresh_location = db.session.get(UploadSession, fresh["id"]).location
+    if current_app.config["SERVICE_DATA_SOURCE"] == DATA_SOURCE_LOCAL:
+        assert [str(p) for p in tmp_path.iterdir()] == [fresh_location]
+    else:
+        backend = get_backend()
+        s3_uploads = backend.get_sync_s3_client().list_multipart_uploads(Bucket=backend.bucket_name)["Uploads"]
+        assert [u["Key"] for u in s3_uploads] == [fresh_location.split("/")[-1]]
+
+
+@responses.activate
+def test_upload_session_bad_req(client):
+    authz_everything_true()
+    assert client.post("/ingest/uploads", data={}).status_code == 400
+    authz_everything_true()
+    assert client.post("/ingest/uploads", data={"size": "abc"}).status_code == 400
+    authz_everything_true()
+    assert client.post("/ingest/uploads", data={"size": 10, "mime_type": "image/*"}).status_code == 400
+
+    # chunks are buffered in memory with S3, so their size is capped - as are the chunks S3 would need for the file
+    max_chunk_size = current_app.config["DRS_UPLOAD_MAX_CHUNK_SIZE"]
+    authz_everything_true()
+    res = client.post("/ingest/uploads", data={"size": 10, "chunk_size": max_chunk_size + 1})
+    assert res.status_code == 400
+    if current_app.config["SERVICE_DATA_SOURCE"] == DATA_SOURCE_S3:
+        authz_everything_true()
+        res = client.post("/ingest/uploads", data={"size": max_chunk_size * 10001, "chunk_size": max_chunk_size})
+        assert res.status_code == 400
+
+
+@responses.activate
+def test_upload_session_forbidden(client):
+    authz_everything_false()
+    assert client.post("/ingest/uploads", data={"size": 10}).status_code == 403
+    authz_everything_false()
+    assert client.get(f"/ingest/uploads/{NON_EXISTENT_ID}").status_code == 403
+
+
+@responses.activate
+def test_object_ingest_batch(client):
+    from chord_drs.models import DrsBlob
+
+    fp = dummy_file_path()
+    items = [
+        {"path": fp, "project_id": DUMMY_PROJECT_ID, "dataset_id": DUMMY_DATASET_ID_1},
+        {"path": fp, "project_id": DUMMY_PROJECT_ID, "dataset_id": DUMMY_DATASET_ID_1},  # same bytes + resource
+        {"path": fp, "project_id": DUMMY_PROJECT_ID, "dataset_id": DUMMY_DATASET_ID_2},  # same bytes only
+        {"path": fp, "project_id": DUMMY_PROJECT_ID, "dataset_id": DUMMY_DATASET_ID_2, "deduplicate": False},
+        {"path": non_existant_dummy_file_path(), "project_id": DUMMY_PROJECT_ID},
+        {"path": fp, "file": "file", "project_id": DUMMY_PROJECT_ID},
+    ]
+
+    # one permissions evaluation for all distinct resources - one for each dataset + one project-only
+    responses.post(f"{AUTHZ_URL}/policy/evaluate", json={"result": [[True], [True], [True]]})
+    res = client.post("/ingest/batch", json={"items": items})
+    assert res.status_code == 200
+    data = res.get_json()
+    assert len(responses.calls) == 1
+
+    assert [r["status"] for r in data] == [201, 201, 201, 201, 400, 400]
+    for r in data[:4]:
+        validate_object_fields(r["object"], with_bento_properties=True)
+
+    objs = [r["object"] for r in data[:4]]
+    assert objs[0]["id"] == objs[1]["id"]  # fully deduplicated within the batch
+    assert len({o["id"] for o in objs}) == 3
+    assert len({o["checksums"][0]["checksum"] for o in objs}) == 1
+
+    # bytes are re-used for the object with another resource, but not if deduplication is disabled
+    locations = {o["id"]: DrsBlob.query.filter_by(id=o["id"]).first().location for o in objs}
+    assert locations[objs[0]["id"]] == locations[objs[2]["id"]]
+    assert locations[objs[0]["id"]] != locations[objs[3]["id"]]
+
+
+@responses.activate
+def test_object_ingest_batch_commit_failure(client_local, tmp_path, monkeypatch):
+    from chord_drs.db import db
+    from chord_drs.models import DrsBlob
+
+    monkeypatch.setitem(current_app.config, "DRS_LOCAL_CONTENT_ADDRESSED", True)
+
+    authz_everything_true()
+    existing = DrsBlob.query.filter_by(id=_ingest_one(client_local, params={"deduplicate": False})["id"]).first()
+
+    other_file = tmp_path / "other.txt"
+    other_file.write_bytes(b"other bytes")
+    items = [
+        {"path": dummy_file_path(), "deduplicate": False},  # new object sharing the existing object's file
+        {"path": str(other_file)},  # new object with a new file
+    ]
+
+    def fail_commit():
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db.session, "commit", fail_commit)
+
+    authz_everything_true()
+    res = client_local.post("/ingest/batch", json={"items": items})
+    assert res.status_code == 500
+
+    monkeypatch.undo()
+
+    # the new file is removed, but not the one which the existing object still refers to
+    assert DrsBlob.query.count() == 1
+    assert os.path.exists(existing.location)
+    assert sorted(os.path.basename(p) for _, _, fs in os.walk(current_app.config["SERVICE_DATA"]) for p in fs) == [
+        existing.checksum
+    ]
+
+
+@responses.activate
+def test_object_ingest_batch_post_files(client, tmp_path, monkeypatch):
+    monkeypatch.setitem(current_app.config, "DRS_INGEST_TMP_DIR", str(tmp_path))
+
+    fp = dummy_file_path()
+    items = [{"file": "file1"}, {"file": "file2", "project_id": "project1"}]
+
+    authz_everything_true(2)
+    with open(fp, "rb") as fh1, open(fp, "rb") as fh2:
+        res = client.post(
+            "/ingest/batch",
+            data={"items": json.dumps(items), "file1": (fh1, "dummy_file.txt"), "file2": (fh2, "dummy_file_2.txt")},
+            content_type="multipart/form-data",
+        )
+    assert res.status_code == 200
+    data = res.get_json()
+    assert [r["status"] for r in data] == [201, 201]
+    assert data[0]["object"]["name"] == "dummy_file.txt"
+    assert data[1]["object"]["name"] == "dummy_file_2.txt"
+    assert data[1]["object"]["bento"]["project_id"] == "project1"
+
+    authz_everything_true()
+    res = client.get(f"/objects/{data[1]['object']['id']}/download")
+    assert res.status_code == 200
+    with open(fp, "rb") as fh:
+        assert res.get_data() == fh.read()
+
+    assert not list(tmp_path.iterdir())
+
+
+@responses.activate
+def test_object_ingest_batch_forbidden(client):
+    fp = dummy_file_path()
+    items = [{"path": fp, "project_id": "project1"}, {"path": fp, "project_id": "project2"}]
+
+    responses.post(f"{AUTHZ_URL}/policy/evaluate", json={"result": [[False], [True]]})
+    res = client.post("/ingest/batch", json={"items": items})
+    assert res.status_code == 200
+    data = res.get_json()
+    assert data[0] == {"status": 403, "error": "Forbidden"}
+    assert data[1]["status"] == 201
+
+
+@responses.activate
+def test_object_ingest_batch_bad_req(client):
+    authz_everything_true()
+    assert client.post("/ingest/batch", json={}).status_code == 400
+    authz_everything_true()
+    assert client.post("/ingest/batch", json={"items": ["a"]}).status_code == 400
+    authz_everything_true()
+    assert client.post("/ingest/batch", data={"items": "not json"}).status_code == 400
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+import threading
+
+from chord_drs.utils import sync_generator_stream
+
+logger = logging.getLogger(__name__)
+
+
+def test_sync_generator_stream():
+    async def _gen():
+        for i in range(100):
+            await asyncio.sleep(0)
+            yield i
+
+    assert list(sync_generator_stream(_gen(), logger)) == list(range(100))
+
+    # streams share one event loop, running in its own thread
+    loop_threads = set()
+
+    async def _gen_thread():
+        loop_threads.add(threading.current_thread().name)
+        yield 1
+
+    for _ in range(3):
+        assert list(sync_generator_stream(_gen_thread(), logger)) == [1]
+    assert loop_threads == {"drs-stream-loop"}
+
+
+def test_sync_generator_stream_read_ahead():
+    n_read = 0
+    closed = threading.Event()
+
+    async def _gen():
+        nonlocal n_read
+        try:
+            for i in range(100):
+                n_read += 1
+                yield i
+        finally:
+            closed.set()
+
+    stream = sync_generator_stream(_gen(), logger, read_ahead=4)
+    assert n_read == 0  # nothing is read until the stream is iterated
+
+    assert next(stream) == 0
+    assert closed.wait(0.1) is False
+    assert n_read <= 5  # at most read_ahead chunks are read ahead of the consumer
+
+    # closing the stream early (e.g., if the client disconnects) closes the async generator
+    stream.close()
+    assert closed.wait(1)
+    assert n_read <= 6